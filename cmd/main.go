@@ -4,6 +4,7 @@ import (
 	"jaunt/scripts/dedup"
 	"jaunt/scripts/seed"
 	"log"
+	"os"
 )
 
 func main() {
@@ -19,6 +20,11 @@ func main() {
 	// 	fmt.Printf("Title: %s\nSubtitle: %s\nDescription: %s\nLatitude: %f\nLongitude: %f\n\n",
 	// 		location.Title, location.Subtitle, location.Description, location.Latitude, location.Longitude)
 	// }
+	// INCREMENTAL_SEED=true keeps the existing tables and only upserts and re-compares locations whose source row changed
+	if os.Getenv("INCREMENTAL_SEED") == "true" {
+		seedIncrementally("data/locations.db", []string{"data/t_content_202501021703_new.jsonl", "data/t_content_rawdata_202412011408.jsonl"})
+		return
+	}
 	err := seed.CreateLocationsTableInDuckDB("data/locations.db")
 	if err != nil {
 		log.Fatalf("Error creating locations table in DuckDB: %s", err)
@@ -120,3 +126,28 @@ func main() {
 	// }
 
 }
+
+// Seed only the new and changed locations from each JSON file, then compare them and rerun the dedup step
+func seedIncrementally(dbFilePath string, jsonFilePaths []string) {
+	err := seed.CreateTablesIfNotExistInDuckDB(dbFilePath)
+	if err != nil {
+		log.Fatalf("Error creating tables in DuckDB: %s", err)
+	}
+	// The files are staged together in the order the full seed inserts them, so the later file wins for overlapping rows
+	err = seed.UpsertChangedLocationsFromJSON(dbFilePath, jsonFilePaths)
+	if err != nil {
+		log.Printf("Error upserting changed locations from JSON into DuckDB: %s", err)
+	}
+	err = seed.UpdateLocationsWithH3Index(dbFilePath)
+	if err != nil {
+		log.Fatalf("Error updating locations with H3 index: %s", err)
+	}
+	err = seed.CompareChangedLocations(dbFilePath)
+	if err != nil {
+		log.Printf("Error inserting into location comparison for the changed locations: %s", err)
+	}
+	err = dedup.ArchiveAndRemoveDuplicateLocations(dbFilePath)
+	if err != nil {
+		log.Fatalf("Error archiving and removing duplicate locations: %s", err)
+	}
+}
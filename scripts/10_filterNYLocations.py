@@ -8,31 +8,12 @@ import pandas as pd
 from transformers import AutoModelForCausalLM, AutoTokenizer
 import torch
 import json
-import requests
 from shapely.geometry import shape, Point
+from boundary_filter import filter_dataframe_within
+from boundary_store import load_nyc_boundary, load_nyc_neighbourhood_boundaries
 
 # Connect to DuckDB, query the locations table, and load the data into a Pandas DataFrame, for each location latitude and longitude identify if its within the ny city boundary
 # Obtain the ny city boundary in json from  - https://github.com/generalpiston/geojson-us-city-boundaries/blob/master/cities/ny/new-york.json and write a python method to identify if it falls within this boundart
-# Load NYC boundary from GeoJSON
-def load_nyc_boundary():
-    url = "https://raw.githubusercontent.com/generalpiston/geojson-us-city-boundaries/master/cities/ny/new-york.json"
-    response = requests.get(url)
-    nyc_boundary_geojson = response.json()
-    nyc_boundary = shape(nyc_boundary_geojson['features'][0]['geometry'])
-    return nyc_boundary
-
-def load_nyc_neighbourhood_boundaries():
-    url = "https://gist.githubusercontent.com/ix4/ff7603f48283cf06fc4fb3dfb6a0635c/raw/3eae4056c9d4de99f0040b6bedbd9ba547e8d215/nyc.geojson"
-    response = requests.get(url)
-    try:
-        load_nyc_neighbourhood_boundaries_geojsons = response.json()
-        print(f"Loaded {len(load_nyc_neighbourhood_boundaries_geojsons['features'])} neighbourhood boundaries.")
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-        return []
-    return load_nyc_neighbourhood_boundaries_geojsons["features"]
-
-
 # Check if a point is within the NYC boundary
 def is_within_nyc_boundary(lat, lon, nyc_boundary):
     point = Point(lon, lat)
@@ -52,10 +33,7 @@ def load_locations_from_db(db_path):
 
 # Filter locations within NYC boundary
 def filter_locations_within_nyc(locations_df, nyc_boundary):
-    def check_boundary(row):
-        return is_within_nyc_boundary(row['latitude'], row['longitude'], nyc_boundary)
-    
-    return locations_df[locations_df.apply(check_boundary, axis=1)]
+    return filter_dataframe_within(locations_df, nyc_boundary, 'latitude', 'longitude')
 def update_city_column_in_db(db_path, nyc_locations_df):
     conn = duckdb.connect(db_path)
     # content_ids = tuple(nyc_locations_df['contentid'].tolist())
@@ -236,6 +214,18 @@ def fetch_all_location_comparison_rows(filtered_locations_content_ids):
     location_comparison_df = conn.execute(query).fetchdf()
     conn.close()
     return location_comparison_df
+# Non-canonical members of the duplicate clusters with their cluster, canonical location and the tag of the rule that matched them
+def fetch_clustered_duplicates(db_path):
+    conn = duckdb.connect(db_path)
+    query = """
+    SELECT * REPLACE (TRUE AS is_title_duplicate)
+    FROM duplicate_locations
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ORDER BY cluster_id;
+    """
+    duplicates_df = conn.execute(query).fetchdf()
+    conn.close()
+    return duplicates_df
 def csv_to_jsonl(input_file, output_file):
     df = pd.read_csv(input_file)
     with open(output_file, 'w', encoding='ISO-8859-1') as file:
@@ -310,96 +300,14 @@ def main():
     # conn.close()
     # conn = duckdb.connect(db_path)
 
-    # # Query the locations table
-    # # query1 = """
-    # # SELECT title, city, latitude, longitude, TRUE AS is_title_duplicate, tag
-    # # FROM duplicate_locations
-    # # WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND tag='red';
-    # # """
-    # # Query to get all locations + duplicates in the same dataframe with default tag as blue for locations and tag for duplicates and duplicates should not be repeated in the final dataframe
-    # query1 = """
-    # SELECT DISTINCT ON (contentid) *
-    # FROM duplicate_locations
-    # WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND tag='red';
-    # """
-    # duplicates_df1 = conn.execute(query1).fetchdf()
-    # # Close the connection
-    # conn.close()
-    # conn = duckdb.connect(db_path)
-
-    # Query the locations table
-    # query2 = """
-    # SELECT title, city, latitude, longitude, TRUE AS is_title_duplicate, tag
-    # FROM duplicate_locations
-    # WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND tag='lightred';
-    # """
-    # query2 = """
-    # SELECT DISTINCT ON (contentid) *
-    # FROM duplicate_locations
-    # WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND tag='lightred';
-    # """
-    # duplicates_df2 = conn.execute(query2).fetchdf()
-    # conn.close()
-    # conn = duckdb.connect(db_path)
-
-    # # Query the locations table
-    # # query3 = """
-    # # SELECT title, city, latitude, longitude, TRUE AS is_title_duplicate, tag
-    # # FROM duplicate_locations
-    # # WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND tag='darkred';
-    # # """
-    # query3 = """
-    # SELECT DISTINCT ON (contentid) *
-    # FROM duplicate_locations
-    # WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND tag='darkred';
-    # """
-    # duplicates_df3 = conn.execute(query3).fetchdf()
-    # conn.close()
-
-    # conn = duckdb.connect(db_path)
-
-    # Query the locations table
-    # query4 = """
-    # SELECT title, city, latitude, longitude, TRUE AS is_title_duplicate, tag
-    # FROM duplicate_locations
-    # WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND tag='pink';
-    # """
-    # query4 = """
-    # SELECT DISTINCT ON (contentid) *
-    # FROM duplicate_locations
-    # WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND tag='pink';
-    # """
-    # duplicates_df4 = conn.execute(query4).fetchdf()
-    # conn.close()
-
-    # conn = duckdb.connect(db_path)
-
-    # # Query the locations table
-    # query5 = """
-    # SELECT DISTINCT ON (contentid) *
-    # FROM duplicate_locations
-    # WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND tag='purple';
-    # """
-    # duplicates_df5 = conn.execute(query5).fetchdf()
-    # conn.close()
+    # # Duplicates of every cluster built by dedup/7_clusterDuplicateLocations.py, one query instead of one per scenario tag
+    # duplicates_df = fetch_clustered_duplicates(db_path)
 
 
     # Filter locations for resolutions 8 and 9
     # for resolution in [8]:
-    #     filtered_duplicates1 = filter_locations_by_lat_lon(
-    #         duplicates_df1, "latitude", "longitude", 40.7128, -74.0060, resolution, RADIUS
-    #     )
-    #     filtered_duplicates2 = filter_locations_by_lat_lon(
-    #         duplicates_df2, "latitude", "longitude", 40.7128, -74.0060, resolution, RADIUS
-    #     )
-    #     filtered_duplicates3 = filter_locations_by_lat_lon(
-    #         duplicates_df3, "latitude", "longitude", 40.7128, -74.0060, resolution, RADIUS
-    #     )
-    #     filtered_duplicates4 = filter_locations_by_lat_lon(
-    #         duplicates_df4, "latitude", "longitude", 40.7128, -74.0060, resolution, RADIUS
-    #     )
-    #     filtered_duplicates5 = filter_locations_by_lat_lon(
-    #         duplicates_df5, "latitude", "longitude", 40.7128, -74.0060, resolution, RADIUS
+    #     filtered_duplicates = filter_locations_by_lat_lon(
+    #         duplicates_df, "latitude", "longitude", 40.7128, -74.0060, resolution, RADIUS
     #     )
     #     filtered_locations = filter_locations_by_lat_lon(
     #         locations_df, "latitude", "longitude", 40.7128, -74.0060, resolution, RADIUS
@@ -420,20 +328,13 @@ def main():
     #     # Print the number of filtered locations
     #     print(f"Total filtered locations for resolution {resolution}: {len(all_filtered_locations_ny)}")
     #     print(f"Total filtered duplicate ny locations(all scenarios) for resolution {resolution}: {len(filtered_locations)}")
-    #     print(f"Total filtered duplicates with ny locations scenario1 for resolution {resolution}: {len(filtered_duplicates1)}")
-    #     print(f"Total filtered duplicates with ny locations scenario2 for resolution {resolution}: {len(filtered_duplicates2)}")
-    #     print(f"Total filtered duplicates with ny locations scenario3 for resolution {resolution}: {len(filtered_duplicates3)}")
-    #     print(f"Total filtered duplicates with ny locations scenario4 for resolution {resolution}: {len(filtered_duplicates4)}")
-    #     print(f"Total filtered duplicates with ny locations scenario5 for resolution {resolution}: {len(filtered_duplicates5)}")
+    #     print(f"Total filtered clustered duplicates with ny locations for resolution {resolution}: {len(filtered_duplicates)}")
+    #     print(filtered_duplicates["tag"].value_counts())
     #     print(f"Total filtered locations and duplicates for resolution {resolution}: {len(all_filtered_locations_ny_and_duplicates)}")
 
     #     # Create the map
     #     output_file = f"ny-data/nyc_filtered_locations_resolution_{resolution}.html"
-    #     output_file_duplicates1 = f"ny-data/nyc_filtered_duplicates_with_ny_locations_new_scenario1_resolution_{resolution}.html"
-    #     output_file_duplicates2 = f"ny-data/nyc_filtered_duplicates_with_ny_locations_new_scenario2_resolution_{resolution}.html"
-    #     output_file_duplicates3 = f"ny-data/nyc_filtered_duplicates_with_ny_locations_new_scenario3_resolution_{resolution}.html"
-    #     output_file_duplicates4 = f"ny-data/nyc_filtered_duplicates_with_ny_locations_new_scenario4_resolution_{resolution}.html"
-    #     output_file_duplicates5 = f"ny-data/nyc_filtered_duplicates_with_ny_locations_new_scenario5_resolution_{resolution}.html"
+    #     output_file_duplicates = f"ny-data/nyc_filtered_duplicates_with_ny_locations_clustered_resolution_{resolution}.html"
     #     output_file_including_duplicates = f"ny-data/nyc_filtered_including_duplicates_resolution_{resolution}.html"
     #     # create_h3_map(all_filtered_locations_ny_and_duplicates, "latitude", "longitude", output_file_including_duplicates)
     #     # output_file_including_duplicates = f"ny-data/nyc_filtered_including_duplicates_resolution_{resolution}.html"
@@ -441,20 +342,12 @@ def main():
     #     # store_filtered_locations(filtered_locations, f"ny-data/nyc_filtered_locations_resolution_{resolution}.json")
     #     # store_filtered_locations(filtered_duplicates, f"ny-data/nyc_filtered_duplicates_resolution_{resolution}.json", duplicate=True)
     #     # create_h3_map(filtered_locations, "latitude", "longitude", output_file)
-    #     # create_h3_map(filtered_duplicates1, "latitude", "longitude", output_file_duplicates1)
-    #     # create_h3_map(filtered_duplicates2, "latitude", "longitude", output_file_duplicates2)
-    #     # create_h3_map(filtered_duplicates3, "latitude", "longitude", output_file_duplicates3)
-    #     # create_h3_map(filtered_duplicates4, "latitude", "longitude", output_file_duplicates4)
-    #     # create_h3_map(filtered_duplicates5, "latitude", "longitude", output_file_duplicates5)
+    #     # create_h3_map(filtered_duplicates, "latitude", "longitude", output_file_duplicates)
     #     # store_filtered_locations_to_csv(filtered_locations, f"ny-data/csv/nyc_filtered_locations_resolution_{resolution}.csv")
     #     # store_filtered_locations_to_csv(all_filtered_locations_ny_and_duplicates, f"ny-data/csv/nyc_filtered_locations_and_duplicates_resolution_{resolution}.csv")
     #     # delete_all_locations_except_filtered_locations(all_filtered_locations_ny_and_duplicates["contentid"].astype(str).tolist())
     #     # delete_all_location_comparisons_except_filtered_locations(all_filtered_locations_ny_and_duplicates["contentid"].astype(str).tolist())
-    #     # store_filtered_locations_to_csv(filtered_duplicates1, f"ny-data/csv/nyc_filtered_duplicates_with_ny_locations_new_scenario1_resolution_{resolution}.csv")
-    #     # store_filtered_locations_to_csv(filtered_duplicates2, f"ny-data/csv/nyc_filtered_duplicates_with_ny_locations_new_scenario2_resolution_{resolution}.csv")
-    #     # store_filtered_locations_to_csv(filtered_duplicates3, f"ny-data/csv/nyc_filtered_duplicates_with_ny_locations_new_scenario3_resolution_{resolution}.csv")
-    #     # store_filtered_locations_to_csv(filtered_duplicates4, f"ny-data/csv/nyc_filtered_duplicates_with_ny_locations_new_scenario4_resolution_{resolution}.csv")
-    #     # store_filtered_locations_to_csv(filtered_duplicates5, f"ny-data/csv/nyc_filtered_duplicates_with_ny_locations_new_scenario5_resolution_{resolution}.csv")
+    #     # store_filtered_locations_to_csv(filtered_duplicates, f"ny-data/csv/nyc_filtered_duplicates_with_ny_locations_clustered_resolution_{resolution}.csv")
     #     # create_h5_map(filtered_locations+filtered_duplicates, "latitude", "longitude", output_file_including_duplicates)
     create_h3_map_for_boundary_locations()
     # nyc_boundary = load_nyc_boundary()
@@ -1,6 +1,7 @@
 import folium
 import duckdb
 from shapely.geometry import Point, Polygon
+from boundary_filter import filter_dataframe_within
 
 # Define NYC boundary as a polygon (simplified example; use a more accurate boundary for precision)
 NYC_BOUNDARY_COORDS = [
@@ -18,10 +19,9 @@ def is_within_nyc(lat, lon):
     return NYC_BOUNDARY_POLYGON.contains(point)
 
 # Function to filter locations within NYC
+# The boundary is a rectangle, so the bbox test alone is the whole filter
 def filter_locations_by_nyc(locations_df, lat_column, lon_column):
-    return locations_df[
-        locations_df.apply(lambda row: is_within_nyc(row[lat_column], row[lon_column]), axis=1)
-    ]
+    return filter_dataframe_within(locations_df, NYC_BOUNDARY_POLYGON, lat_column, lon_column, bbox_only=True)
 
 # Function to create a map for filtered locations
 def create_nyc_map(dataframe, lat_column, lon_column, output_file):
@@ -1,20 +1,12 @@
-import json
-import requests
-from shapely.geometry import shape, Point
+from shapely.geometry import Point
+from boundary_filter import filter_dataframe_within
+from boundary_store import load_nyc_boundary
 import duckdb
 from folium.plugins import MarkerCluster
 import folium
 
 # Connect to DuckDB, query the locations table, and load the data into a Pandas DataFrame, for each location latitude and longitude identify if its within the ny city boundary
 # Obtain the ny city boundary in json from  - https://github.com/generalpiston/geojson-us-city-boundaries/blob/master/cities/ny/new-york.json and write a python method to identify if it falls within this boundart
-# Load NYC boundary from GeoJSON
-def load_nyc_boundary():
-    url = "https://raw.githubusercontent.com/generalpiston/geojson-us-city-boundaries/master/cities/ny/new-york.json"
-    response = requests.get(url)
-    nyc_boundary_geojson = response.json()
-    nyc_boundary = shape(nyc_boundary_geojson['features'][0]['geometry'])
-    return nyc_boundary
-
 # Check if a point is within the NYC boundary
 def is_within_nyc_boundary(lat, lon, nyc_boundary):
     point = Point(lon, lat)
@@ -34,10 +26,7 @@ def load_locations_from_db(db_path):
 
 # Filter locations within NYC boundary
 def filter_locations_within_nyc(locations_df, nyc_boundary):
-    def check_boundary(row):
-        return is_within_nyc_boundary(row['latitude'], row['longitude'], nyc_boundary)
-    
-    return locations_df[locations_df.apply(check_boundary, axis=1)]
+    return filter_dataframe_within(locations_df, nyc_boundary, 'latitude', 'longitude')
 def create_h3_map(dataframe, lat_column, lon_column, output_file):
     # Create a Folium map centered at NYC
     nyc_map = folium.Map(location=[40.7826, -73.9656], tiles = 'cartodbpositron', zoom_start=11, control_scale=True)
@@ -0,0 +1,48 @@
+import duckdb
+import os
+import time
+from boundary_store import load_nyc_boundary, load_nyc_neighbourhood_geometries
+from boundary_h3_index import build_boundary_cells, classify_locations, load_boundary_cells, location_h3_column, save_boundary_cells, save_location_memberships
+
+# Polyfill the NYC boundary and every neighbourhood boundary into H3 cells, persist them in boundary_h3_cells and
+# classify each location from its existing h3 index into location_boundary_membership(contentid, boundary_name).
+# Only locations in cells that straddle a boundary line get an exact point-in-polygon test.
+DATABASE_PATH = 'data/locations.db'
+BOUNDARY_H3_RESOLUTION = int(os.getenv("BOUNDARY_H3_RESOLUTION", 8))  # Finest polyfill resolution, at most 12
+REBUILD_BOUNDARY_H3_INDEX = os.environ.get("REBUILD_BOUNDARY_H3_INDEX") == 'true'
+NYC_BOUNDARY_NAME = 'New York City'
+
+# Boundary name -> geometry for the city and each neighbourhood, neighbourhoods without a name get their index
+def load_boundaries():
+    boundaries = {NYC_BOUNDARY_NAME: load_nyc_boundary()}
+    for index, (properties, geometry) in enumerate(load_nyc_neighbourhood_geometries()):
+        name = properties.get("neighborhood") or properties.get("name") or f"neighbourhood_{index}"
+        boundaries[name if name not in boundaries else f"{name}_{index}"] = geometry
+    return boundaries
+
+def build_boundary_h3_index(db_file_path, resolution):
+    h3_column = location_h3_column(resolution)
+    boundaries = load_boundaries()
+    conn = duckdb.connect(database=db_file_path)
+
+    started = time.perf_counter()
+    table_exists = conn.execute("SELECT count(*) FROM information_schema.tables WHERE table_name = 'boundary_h3_cells'").fetchone()[0] > 0
+    if REBUILD_BOUNDARY_H3_INDEX or not table_exists:
+        boundary_cells = build_boundary_cells(boundaries, resolution)
+        save_boundary_cells(conn, boundary_cells)
+        print(f"Polyfilled {len(boundaries)} boundaries into {len(boundary_cells)} cells ({int(boundary_cells['is_border'].sum())} border cells) in {time.perf_counter() - started:.1f}s")
+    else:
+        boundary_cells = load_boundary_cells(conn)
+        print(f"Loaded {len(boundary_cells)} boundary cells from boundary_h3_cells")
+
+    started = time.perf_counter()
+    located = conn.execute('SELECT count(*) FROM locations WHERE latitude IS NOT NULL AND longitude IS NOT NULL').fetchone()[0]
+    memberships, exact_tests = classify_locations(conn, boundaries, h3_column)
+    save_location_memberships(conn, memberships)
+    in_nyc = int((memberships['boundary_name'] == NYC_BOUNDARY_NAME).sum())
+    print(f"Classified {located} locations in {time.perf_counter() - started:.1f}s, {in_nyc} within NYC, {exact_tests} exact polygon tests")
+
+    conn.close()
+
+if __name__ == "__main__":
+    build_boundary_h3_index(DATABASE_PATH, BOUNDARY_H3_RESOLUTION)
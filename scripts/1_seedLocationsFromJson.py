@@ -1,6 +1,9 @@
 # FILEPATH: Untitled-19.py
 import duckdb
 import json
+import os
+import time
+import pandas as pd
 
 # 1. Create the base location table in DuckDB
 def create_locations_table_in_duckdb(db_file_path):
@@ -43,38 +46,63 @@ def create_locations_table_in_duckdb(db_file_path):
 	conn.commit()
 	conn.close()
 
+# Columns of the locations table filled from a t_content record, in insert order
+LOCATION_COLUMNS = [
+	'contentid', 'source_id', 'title', 'subtitle', 'breadcrumb', 'category', 'subcategory',
+	'description', 'short_description', 'keywords', 'source_url', 'address',
+	'address_detailed', 'zipcode', 'phone', 'latitude', 'longitude', 'running_hours',
+	'featured_image_url', 'image_urls', 'additional_info', 'primary_data', 'city', 'country', 'state'
+]
+RECORD_BATCH_SIZE = int(os.getenv("SEED_RECORD_BATCH_SIZE", 10000))  # Records held in memory and inserted per statement
+
+# Map a t_content record onto the locations columns
+def location_values(data):
+	values = [data.get(column) for column in LOCATION_COLUMNS]
+	values[LOCATION_COLUMNS.index('image_urls')] = ','.join(data.get('image_urls') or [])
+	values[LOCATION_COLUMNS.index('additional_info')] = json.dumps(data.get('additional_info'))
+	if data.get('primary_data') is not None:
+		values[LOCATION_COLUMNS.index('primary_data')] = int(data['primary_data'])
+	return values
+
+# Stream a JSONL file and yield fixed-size batches of location rows, so memory stays flat regardless of the dump size
+def read_location_batches(json_file_path, batch_size=RECORD_BATCH_SIZE):
+	batch = []
+	skipped = 0
+	with open(json_file_path, encoding='utf-8') as file:
+		for line in file:
+			line = line.strip()
+			if not line:
+				continue
+			try:
+				batch.append(location_values(json.loads(line)))
+			except json.JSONDecodeError:
+				skipped += 1
+				continue
+			if len(batch) >= batch_size:
+				yield batch
+				batch = []
+	if batch:
+		yield batch
+	if skipped:
+		print(f"Skipped {skipped} malformed lines in {json_file_path}")
+
 # 2. Insert into the locations table in DuckDB from a t_content raw data JSON file in data/ folder
 def insert_json_into_locations_table_in_duckdb(db_file_path, json_file_path):
 	# Connect to the DuckDB database
-	conn = duckdb.connect(database='data/locations.db')
-	# cursor = conn.cursor()
-
-	# Read the JSON file
-	with open(json_file_path) as file:
-		json_data = json.load(file)
-
-	# Insert JSON data into the locations table
-	for data in json_data:
-		query = '''
-			INSERT INTO locations (
-				contentid, source_id, title, subtitle, breadcrumb, category, subcategory,
-				description, short_description, keywords, source_url, address,
-				address_detailed, zipcode, phone, latitude, longitude, running_hours,
-				featured_image_url, image_urls, additional_info, primary_data, city, country, state
-			)
-			VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-		'''
-		values = (
-			data['contentid'], data['source_id'], data['title'], data['subtitle'], data['breadcrumb'],
-			data['category'], data['subcategory'], data['description'], data['short_description'],
-			data['keywords'], data['source_url'], data['address'], data['address_detailed'],
-			data['zipcode'], data['phone'], data['latitude'], data['longitude'], data['running_hours'],
-			data['featured_image_url'], ','.join(data['image_urls']), json.dumps(data['additional_info']),
-			int(data['primary_data']), data['city'], data['country'], data['state']
-		)
-		conn.execute(query, values)
-
-	# conn.commit()
+	conn = duckdb.connect(database=db_file_path)
+
+	# Insert each batch of records with a single bulk insert from a DataFrame
+	started = time.perf_counter()
+	total_rows = 0
+	columns = ', '.join(LOCATION_COLUMNS)
+	for batch in read_location_batches(json_file_path):
+		location_batch = pd.DataFrame.from_records(batch, columns=LOCATION_COLUMNS)
+		conn.register('location_batch', location_batch)
+		conn.execute(f'INSERT INTO locations ({columns}) SELECT {columns} FROM location_batch')
+		conn.unregister('location_batch')
+		total_rows += len(batch)
+		print(f"Inserted {total_rows} rows from {json_file_path} at {total_rows / (time.perf_counter() - started):.1f} rows/sec")
+
 	conn.close()
 
 # 3. Describe the schema of the locations table
@@ -0,0 +1,31 @@
+import numpy as np
+import shapely
+
+# Vectorized point-in-polygon filtering: whole latitude/longitude arrays are tested against a prepared polygon
+# in one call to shapely.contains_xy instead of building a shapely Point per row inside DataFrame.apply
+
+# Boolean mask of the points inside the (min_lon, min_lat, max_lon, max_lat) box, edges included
+def points_within_bbox(latitudes, longitudes, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    return (longitudes >= min_lon) & (longitudes <= max_lon) & (latitudes >= min_lat) & (latitudes <= max_lat)
+
+# Boolean mask of the points contained by the polygon. The polygon is prepared once (cached on the geometry),
+# and only points passing the bbox prefilter (the polygon bounds unless one is given) reach the exact test.
+# With bbox_only the exact test is skipped entirely. Missing coordinates are never inside.
+def points_within(polygon, latitudes, longitudes, bbox=None, bbox_only=False):
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    mask = points_within_bbox(latitudes, longitudes, polygon.bounds if bbox is None else bbox)
+    if bbox_only or not mask.any():
+        return mask
+    shapely.prepare(polygon)
+    candidates = np.flatnonzero(mask)
+    mask[candidates] = shapely.contains_xy(polygon, longitudes[candidates], latitudes[candidates])
+    return mask
+
+# Rows of the DataFrame whose coordinates fall inside the polygon
+def filter_dataframe_within(locations_df, polygon, lat_column='latitude', lon_column='longitude', bbox=None, bbox_only=False):
+    mask = points_within(polygon, locations_df[lat_column].to_numpy(dtype=np.float64, na_value=np.nan), locations_df[lon_column].to_numpy(dtype=np.float64, na_value=np.nan), bbox=bbox, bbox_only=bbox_only)
+    return locations_df[mask]
@@ -0,0 +1,125 @@
+import h3
+import numpy as np
+import pandas as pd
+import shapely
+from boundary_filter import points_within
+
+# H3 polyfill of boundary polygons. Every cell touching a boundary is classified as interior (the whole hexagon is
+# inside) or border (the hexagon crosses the boundary line). Interior cells are compacted, border cells stay at the
+# chosen resolution. A location is then classified from the h3 index it already has by a join in DuckDB: interior means
+# inside, no cell means outside, and only locations in border cells need an exact point-in-polygon test.
+BOUNDARY_H3_TABLE = 'boundary_h3_cells'
+LOCATION_BOUNDARY_TABLE = 'location_boundary_membership'
+
+# Existing locations column holding an index at or finer than the resolution
+def location_h3_column(resolution):
+    if resolution <= 8:
+        return 'h3_index_8'
+    if resolution <= 12:
+        return 'h3_index_12'
+    raise ValueError(f"H3 resolution {resolution} is finer than the stored h3_index_12")
+
+# Hexagon of each cell as a shapely polygon (lng, lat order)
+def cell_polygons(cells):
+    return shapely.polygons([[(lng, lat) for lat, lng in h3.cell_to_boundary(cell)] for cell in cells])
+
+def polygon_parts(geometry):
+    return list(geometry.geoms) if hasattr(geometry, 'geoms') else [geometry]
+
+# Polyfill one (multi)polygon at the resolution and return (compacted interior cells, border cells) as h3 strings
+def polyfill_boundary(geometry, resolution):
+    candidates = set()
+    for part in polygon_parts(geometry):
+        candidates.update(h3.geo_to_cells(part, resolution))
+        # Parts thinner than a cell have no cell centroid inside them, their vertices still land in the right cells
+        for ring in [part.exterior, *part.interiors]:
+            candidates.update(h3.latlng_to_cell(lat, lng, resolution) for lng, lat in ring.coords)
+    # Cells whose centroid is just outside can still overlap the boundary, one ring around the polyfill catches them
+    candidates.update(neighbour for cell in list(candidates) for neighbour in h3.grid_disk(cell, 1))
+    candidates = sorted(candidates)
+    hexagons = cell_polygons(candidates)
+    shapely.prepare(geometry)
+    contained = shapely.contains(geometry, hexagons)
+    intersecting = shapely.intersects(geometry, hexagons)
+    interior = [cell for cell, inside in zip(candidates, contained) if inside]
+    border = [cell for cell, inside, touches in zip(candidates, contained, intersecting) if touches and not inside]
+    return h3.compact_cells(interior), border
+
+# Rows of the boundary_h3_cells table for a dict of boundary name -> geometry
+def build_boundary_cells(boundaries, resolution):
+    frames = []
+    for boundary_name, geometry in boundaries.items():
+        interior, border = polyfill_boundary(geometry, resolution)
+        frames.append(pd.DataFrame({
+            "boundary_name": boundary_name,
+            "h3_cell": np.array([h3.str_to_int(cell) for cell in interior + border], dtype=np.uint64),
+            "resolution": np.array([h3.get_resolution(cell) for cell in interior + border], dtype=np.int32),
+            "is_border": np.array([False] * len(interior) + [True] * len(border), dtype=bool)
+        }))
+    if not frames:
+        return pd.DataFrame({"boundary_name": [], "h3_cell": np.array([], dtype=np.uint64), "resolution": np.array([], dtype=np.int32), "is_border": np.array([], dtype=bool)})
+    return pd.concat(frames, ignore_index=True)
+
+def save_boundary_cells(conn, boundary_cells):
+    conn.register('boundary_h3_cells_df', boundary_cells)
+    conn.execute(f'''
+        CREATE OR REPLACE TABLE {BOUNDARY_H3_TABLE} AS
+        SELECT boundary_name, CAST(h3_cell AS UBIGINT) AS h3_cell, resolution, is_border FROM boundary_h3_cells_df
+    ''')
+    conn.unregister('boundary_h3_cells_df')
+
+def load_boundary_cells(conn):
+    return conn.execute(f'SELECT boundary_name, h3_cell, resolution, is_border FROM {BOUNDARY_H3_TABLE}').fetchdf()
+
+# Every (location, boundary, is_border) whose location cell lies in an interior or border cell of the boundary, joined
+# in DuckDB. Each distinct location cell is expanded to its parent at every resolution present in the compacted
+# boundary_h3_cells, an H3 index encodes its resolution so the parents join on h3_cell alone.
+def match_location_cells(conn, h3_column):
+    conn.execute('INSTALL h3; LOAD h3;')
+    return conn.execute(f'''
+        WITH location_cells AS (
+            SELECT DISTINCT {h3_column} AS cell
+            FROM locations
+            WHERE {h3_column} IS NOT NULL
+        ),
+        boundary_resolutions AS (
+            SELECT DISTINCT resolution FROM {BOUNDARY_H3_TABLE}
+        ),
+        cell_parents AS (
+            SELECT c.cell, h3_cell_to_parent(c.cell, r.resolution) AS parent
+            FROM location_cells c, boundary_resolutions r
+            WHERE r.resolution <= h3_get_resolution(c.cell)
+        )
+        SELECT l.contentid, l.latitude, l.longitude, b.boundary_name, b.is_border
+        FROM cell_parents p
+        JOIN {BOUNDARY_H3_TABLE} b ON b.h3_cell = p.parent
+        JOIN locations l ON l.{h3_column} = p.cell
+        WHERE l.latitude IS NOT NULL AND l.longitude IS NOT NULL
+    ''').fetchdf()
+
+# DataFrame of (contentid, boundary_name) for every location inside each boundary, plus the number of exact tests run.
+# Reads the locations table and the boundary_h3_cells saved by save_boundary_cells, interior matches are members
+# outright and only border matches get a point-in-polygon test.
+def classify_locations(conn, boundaries, h3_column):
+    matched = match_location_cells(conn, h3_column)
+    memberships = []
+    exact_tests = 0
+    for boundary_name, rows in matched.groupby('boundary_name', sort=False):
+        if boundary_name not in boundaries:
+            continue
+        inside = ~rows['is_border'].to_numpy(dtype=bool)
+        border = np.flatnonzero(~inside)
+        exact_tests += len(border)
+        inside[border] = points_within(boundaries[boundary_name], rows['latitude'].to_numpy()[border], rows['longitude'].to_numpy()[border])
+        memberships.append(pd.DataFrame({"contentid": rows['contentid'].to_numpy()[inside], "boundary_name": boundary_name}))
+    if not memberships:
+        return pd.DataFrame({"contentid": [], "boundary_name": []}), exact_tests
+    return pd.concat(memberships, ignore_index=True), exact_tests
+
+def save_location_memberships(conn, memberships):
+    conn.register('location_boundary_membership_df', memberships)
+    conn.execute(f'''
+        CREATE OR REPLACE TABLE {LOCATION_BOUNDARY_TABLE} AS
+        SELECT CAST(contentid AS UUID) AS contentid, boundary_name FROM location_boundary_membership_df
+    ''')
+    conn.unregister('location_boundary_membership_df')
@@ -0,0 +1,121 @@
+import duckdb
+import json
+import os
+import requests
+from functools import lru_cache
+import shapely
+from shapely.geometry import mapping, shape
+
+# Versioned on-disk cache of the boundary GeoJSON sources. Each feature is parsed once and stored as WKB plus its
+# properties in data/boundaries.db, so after the first fetch boundaries load from disk and the pipeline works offline.
+# Bump a source's version (or its url) to fetch it again.
+BOUNDARY_STORE_PATH = os.getenv("BOUNDARY_STORE_PATH", 'data/boundaries.db')
+BOUNDARY_FETCH_TIMEOUT = 30  # Seconds
+BOUNDARY_SOURCES = {
+    "nyc": {
+        "url": "https://raw.githubusercontent.com/generalpiston/geojson-us-city-boundaries/master/cities/ny/new-york.json",
+        "version": 1
+    },
+    "nyc_neighbourhoods": {
+        "url": "https://gist.githubusercontent.com/ix4/ff7603f48283cf06fc4fb3dfb6a0635c/raw/3eae4056c9d4de99f0040b6bedbd9ba547e8d215/nyc.geojson",
+        "version": 1
+    }
+}
+
+def ensure_boundary_store_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS boundary_store (
+            source_name TEXT,
+            version INT,
+            url TEXT,
+            feature_index INT,
+            properties JSON,
+            geometry_wkb BLOB,
+            fetched_at TIMESTAMP DEFAULT current_timestamp,
+            PRIMARY KEY (source_name, version, feature_index)
+        )
+    ''')
+
+# Download a GeoJSON source and store every feature of it under its version, features without a geometry keep a NULL WKB
+def fetch_boundary_source(conn, source_name, url, version):
+    response = requests.get(url, timeout=BOUNDARY_FETCH_TIMEOUT)
+    response.raise_for_status()
+    features = response.json()["features"]
+    rows = [
+        (source_name, version, url, index, json.dumps(feature.get("properties") or {}),
+         shapely.to_wkb(shape(feature["geometry"])) if feature.get("geometry") else None)
+        for index, feature in enumerate(features)
+    ]
+    # Replace the stored version in one transaction, a failed insert leaves the previous copy in place
+    conn.execute('BEGIN TRANSACTION')
+    try:
+        conn.execute('DELETE FROM boundary_store WHERE source_name = ? AND version = ?', (source_name, version))
+        conn.executemany('''
+            INSERT INTO boundary_store (source_name, version, url, feature_index, properties, geometry_wkb)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    print(f"Fetched {len(rows)} features of {source_name} v{version} into {BOUNDARY_STORE_PATH}")
+
+def read_boundary_source(conn, source_name, url, version):
+    return conn.execute('''
+        SELECT properties, geometry_wkb FROM boundary_store
+        WHERE source_name = ? AND version = ? AND url = ?
+        ORDER BY feature_index
+    ''', (source_name, version, url)).fetchall()
+
+# Newest stored version of a source, used when the configured version can't be fetched
+def read_latest_boundary_source(conn, source_name):
+    return conn.execute('''
+        SELECT properties, geometry_wkb FROM boundary_store
+        WHERE source_name = ? AND version = (SELECT max(version) FROM boundary_store WHERE source_name = ?)
+        ORDER BY feature_index
+    ''', (source_name, source_name)).fetchall()
+
+# Return [(properties dict, shapely geometry or None)] for a configured source, from disk when this version is stored
+@lru_cache(maxsize=None)
+def load_boundary_features(source_name):
+    source = BOUNDARY_SOURCES[source_name]
+    os.makedirs(os.path.dirname(BOUNDARY_STORE_PATH) or '.', exist_ok=True)
+    conn = duckdb.connect(BOUNDARY_STORE_PATH)
+    try:
+        ensure_boundary_store_table(conn)
+        rows = read_boundary_source(conn, source_name, source["url"], source["version"])
+        if not rows:
+            try:
+                fetch_boundary_source(conn, source_name, source["url"], source["version"])
+                rows = read_boundary_source(conn, source_name, source["url"], source["version"])
+            except (requests.RequestException, ValueError, KeyError) as e:
+                rows = read_latest_boundary_source(conn, source_name)
+                if not rows:
+                    raise
+                print(f"Error fetching {source_name} v{source['version']}: {e}, using the newest stored version")
+    finally:
+        conn.close()
+    features = []
+    for properties, geometry_wkb in rows:
+        geometry = shapely.from_wkb(geometry_wkb) if geometry_wkb is not None else None
+        if geometry is not None:
+            shapely.prepare(geometry)
+        features.append((json.loads(properties), geometry))
+    return features
+
+# Load NYC boundary as a prepared shapely geometry
+def load_nyc_boundary():
+    return load_boundary_features("nyc")[0][1]
+
+# Neighbourhood boundaries as GeoJSON features, the same shape as the downloaded file
+def load_nyc_neighbourhood_boundaries():
+    features = [
+        {"type": "Feature", "properties": properties, "geometry": mapping(geometry) if geometry is not None else None}
+        for properties, geometry in load_boundary_features("nyc_neighbourhoods")
+    ]
+    print(f"Loaded {len(features)} neighbourhood boundaries.")
+    return features
+
+# Neighbourhood boundaries as (properties, prepared shapely geometry), features without a geometry are skipped
+def load_nyc_neighbourhood_geometries():
+    return [(properties, geometry) for properties, geometry in load_boundary_features("nyc_neighbourhoods") if geometry is not None]
@@ -0,0 +1,60 @@
+import duckdb
+import os
+import time
+import numpy as np
+import pyarrow as pa
+from duplicate_classifier import DUPLICATE_CLASSIFIER_PATH, FEATURE_COLUMNS, DuplicateClassifier, feature_matrix
+
+# Batch inference of the duplicate classifier trained by 9_trainDuplicateClassifier.py over every location_comparison
+# pair with features, written back as dup_probability. DUPLICATE_RULE_SET=classifier in 7_clusterDuplicateLocations.py
+# then clusters on it.
+# input: location db file with pair features (8_scorePairFeatures.py) and DUPLICATE_CLASSIFIER_PATH
+# output: location_comparison.dup_probability and the duplicate / review / distinct counts printed to stdout
+DATABASE_PATH = 'data/locations.db'
+DUP_CHUNK_SIZE = int(os.getenv("DUP_CHUNK_SIZE", 500000))  # Pairs scored and written back per chunk
+
+# Write a chunk of probabilities back with one statement through a temp table keyed on duplicateid
+def write_dup_probabilities(conn, duplicateids, probabilities):
+    conn.register('dup_probability_batch_arrow', pa.table({
+        "duplicateid": pa.array(duplicateids, type=pa.string()),
+        "dup_probability": pa.array(probabilities, type=pa.float32())
+    }))
+    conn.execute('CREATE OR REPLACE TEMP TABLE dup_probability_batch AS SELECT * FROM dup_probability_batch_arrow')
+    conn.unregister('dup_probability_batch_arrow')
+    conn.execute('''
+        UPDATE location_comparison
+        SET dup_probability = dup_probability_batch.dup_probability
+        FROM dup_probability_batch
+        WHERE location_comparison.duplicateid = dup_probability_batch.duplicateid
+    ''')
+
+def score_duplicate_probability(db_file_path):
+    started = time.perf_counter()
+    model = DuplicateClassifier.load(DUPLICATE_CLASSIFIER_PATH)
+    print(f"Loaded duplicate classifier from {DUPLICATE_CLASSIFIER_PATH} in {(time.perf_counter() - started) * 1000:.1f} ms "
+          f"(duplicate at {model.threshold:.3f}, review from {model.review_threshold:.3f})")
+
+    conn = duckdb.connect(database=db_file_path)
+    conn.execute('ALTER TABLE location_comparison ADD COLUMN IF NOT EXISTS dup_probability FLOAT')
+    columns = conn.execute(f'''
+        SELECT duplicateid, {', '.join(FEATURE_COLUMNS)}
+        FROM location_comparison
+        WHERE similarity_score IS NOT NULL
+    ''').fetchnumpy()
+
+    started = time.perf_counter()
+    counts = np.zeros(3, dtype=np.int64)
+    total = len(columns['duplicateid'])
+    for start in range(0, total, DUP_CHUNK_SIZE):
+        chunk = {name: values[start:start + DUP_CHUNK_SIZE] for name, values in columns.items()}
+        probabilities = model.predict_proba(feature_matrix(chunk))
+        write_dup_probabilities(conn, chunk['duplicateid'].tolist(), probabilities)
+        counts += np.bincount(np.digitize(probabilities, [model.review_threshold, model.threshold]), minlength=3)
+        scored = min(start + DUP_CHUNK_SIZE, total)
+        print(f"Scored {scored}/{total} pairs at {scored / (time.perf_counter() - started):.1f} pairs/sec")
+    print(f"Duplicates: {counts[2]}, for manual review: {counts[1]}, distinct: {counts[0]}")
+
+    conn.close()
+
+if __name__ == "__main__":
+    score_duplicate_probability(DATABASE_PATH)
@@ -0,0 +1,71 @@
+import duckdb
+import os
+from duplicate_classifier import DUPLICATE_CLASSIFIER_PATH, LABEL_COLUMN, DuplicateClassifier
+
+# Labelling path for location_comparison.is_duplicate_label, the training labels of 9_trainDuplicateClassifier.py.
+# DUP_LABEL_EXPORT=true writes unlabelled pairs to DUP_LABEL_CSV for review, spread evenly over similarity_score so the
+# sample holds clear duplicates, clear distinct pairs and the ambiguous middle alike. Once dup_probability has been
+# scored, pairs in the classifier's review band are exported first. A reviewer fills is_duplicate with true or false
+# (blank rows are skipped) and running the script without DUP_LABEL_EXPORT imports the filled rows.
+# input: location db file with a scored location_comparison table, and DUP_LABEL_CSV filled in for an import
+# output: DUP_LABEL_CSV for an export, location_comparison.is_duplicate_label for an import
+DATABASE_PATH = 'data/locations.db'
+DUP_LABEL_CSV = os.getenv("DUP_LABEL_CSV", 'data/duplicate_label_review.csv')
+DUP_LABEL_EXPORT = os.environ.get("DUP_LABEL_EXPORT") == 'true'
+DUP_LABEL_SAMPLE_SIZE = int(os.getenv("DUP_LABEL_SAMPLE_SIZE", 1000))  # Pairs written per export
+DUP_LABEL_MAX_DISTANCE_M = float(os.getenv("DUP_LABEL_MAX_DISTANCE_M", 500))  # Pairs further apart are obviously distinct
+SIMILARITY_BUCKETS = 10
+
+def comparison_columns(conn):
+    return {row[0] for row in conn.execute("SELECT column_name FROM duckdb_columns() WHERE table_name = 'location_comparison'").fetchall()}
+
+def export_pairs_for_review(conn, csv_path):
+    columns = comparison_columns(conn)
+    # Pairs the classifier could not decide come first, then an even share of every similarity_score bucket
+    in_review_band = "false"
+    if "dup_probability" in columns and os.path.exists(DUPLICATE_CLASSIFIER_PATH):
+        model = DuplicateClassifier.load(DUPLICATE_CLASSIFIER_PATH)
+        in_review_band = f"COALESCE(dup_probability >= {model.review_threshold} AND dup_probability < {model.threshold}, false)"
+    sentence_similarity = "sentence_similarity_score" if "sentence_similarity_score" in columns else "CAST(NULL AS FLOAT)"
+    exported = conn.execute(f'''
+        COPY (
+            SELECT duplicateid, titles[1] AS title1, titles[2] AS title2, descriptions[1] AS description1, descriptions[2] AS description2,
+                round(distance_in_meters, 1) AS distance_in_meters, round(similarity_score, 3) AS similarity_score,
+                round({sentence_similarity}, 3) AS sentence_similarity_score, CAST(NULL AS BOOLEAN) AS is_duplicate
+            FROM location_comparison
+            WHERE {LABEL_COLUMN} IS NULL AND similarity_score IS NOT NULL AND distance_in_meters <= {DUP_LABEL_MAX_DISTANCE_M}
+            QUALIFY row_number() OVER (
+                    PARTITION BY {in_review_band}, least(floor(similarity_score * {SIMILARITY_BUCKETS}), {SIMILARITY_BUCKETS - 1})
+                    ORDER BY random()
+                ) <= {max(DUP_LABEL_SAMPLE_SIZE // SIMILARITY_BUCKETS, 1)}
+            ORDER BY {in_review_band} DESC, random()
+            LIMIT {DUP_LABEL_SAMPLE_SIZE}
+        ) TO '{csv_path}' (HEADER, DELIMITER ',')
+    ''').fetchone()[0]
+    print(f"Exported {exported} unlabelled pairs to {csv_path}, fill is_duplicate with true or false and run again without DUP_LABEL_EXPORT")
+
+def import_labels(conn, csv_path):
+    labelled = conn.execute(f'''
+        UPDATE location_comparison
+        SET {LABEL_COLUMN} = reviewed.is_duplicate
+        FROM (
+            SELECT CAST(duplicateid AS VARCHAR) AS duplicateid, CAST(is_duplicate AS BOOLEAN) AS is_duplicate
+            FROM read_csv('{csv_path}', header = true, all_varchar = true)
+            WHERE trim(COALESCE(is_duplicate, '')) <> ''
+        ) reviewed
+        WHERE location_comparison.duplicateid = reviewed.duplicateid
+    ''').fetchone()[0]
+    counts = conn.execute(f'SELECT {LABEL_COLUMN}, count(*) FROM location_comparison WHERE {LABEL_COLUMN} IS NOT NULL GROUP BY ALL ORDER BY ALL').fetchall()
+    print(f"Imported {labelled} labels from {csv_path}, labelled pairs: " + ", ".join(f"{'duplicate' if label else 'distinct'} {count}" for label, count in counts))
+
+def label_duplicate_pairs(db_file_path):
+    conn = duckdb.connect(database=db_file_path)
+    conn.execute(f'ALTER TABLE location_comparison ADD COLUMN IF NOT EXISTS {LABEL_COLUMN} BOOLEAN')
+    if DUP_LABEL_EXPORT:
+        export_pairs_for_review(conn, DUP_LABEL_CSV)
+    else:
+        import_labels(conn, DUP_LABEL_CSV)
+    conn.close()
+
+if __name__ == "__main__":
+    label_duplicate_pairs(DATABASE_PATH)
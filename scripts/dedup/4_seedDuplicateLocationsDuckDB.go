@@ -7,6 +7,7 @@ import (
 
 // 1. Method that uses the location_comparison table to remove duplicate location entries in the locations table with condition being the title similarity_score > 0.85 and distance_in_meters <= 50
 // update the description of the location to be a combination of the the two values in descriptions array in location_comparison table and then delete the second entry
+// The scenarios below are also expressed as rule sets in duplicate_clustering.py, 7_clusterDuplicateLocations.py clusters them transitively in one pass
 func ArchiveAndRemoveDuplicateLocations(dbFilePath string) error {
 	// Open the DuckDB database
 	db, err := sql.Open("duckdb", dbFilePath)
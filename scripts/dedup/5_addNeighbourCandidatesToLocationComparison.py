@@ -0,0 +1,91 @@
+import duckdb
+import os
+import time
+import pyarrow as pa
+from candidate_generation import neighbour_candidate_pairs
+from title_blocking import BLOCKING_Q, blocked_candidate_pairs
+
+# Add nearby pairs from the same or nearby H3 cells to location_comparison. Unlike
+# sql/4_insert_into_location_comparison.sql, venues straddling a cell edge are compared and pairs further apart than
+# CANDIDATE_MAX_DISTANCE_M are never scored.
+# input: location db file with latitude and longitude populated
+# output: new location_comparison rows scored the same way as sql/4_insert_into_location_comparison.sql
+DATABASE_PATH = 'data/locations.db'
+CANDIDATE_H3_RESOLUTION = int(os.getenv("CANDIDATE_H3_RESOLUTION", 8))  # Bucket size, the grid_disk ring grows with the radius
+CANDIDATE_MAX_DISTANCE_M = float(os.getenv("CANDIDATE_MAX_DISTANCE_M", 150))  # Pairs further apart are dropped
+CANDIDATE_BLOCKING = os.getenv("CANDIDATE_BLOCKING")  # token or qgram, only pairs sharing title keys are scored
+BLOCKING_MIN_SHARED = int(os.getenv("BLOCKING_MIN_SHARED", 1))
+
+def insert_neighbour_candidates(db_file_path):
+    conn = duckdb.connect(database=db_file_path)
+
+    started = time.perf_counter()
+    locations = conn.execute('''
+        SELECT CAST(contentid AS VARCHAR) AS contentid, title, latitude, longitude FROM locations
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ''').fetchnumpy()
+    if CANDIDATE_BLOCKING:
+        contentids1, contentids2, meters, shared = blocked_candidate_pairs(
+            locations['contentid'], locations['title'].tolist(), locations['latitude'], locations['longitude'],
+            mode=CANDIDATE_BLOCKING, q=BLOCKING_Q, min_shared=BLOCKING_MIN_SHARED,
+            resolution=CANDIDATE_H3_RESOLUTION, max_distance_m=CANDIDATE_MAX_DISTANCE_M
+        )
+        print(f"Found {len(contentids1)} candidate pairs within {CANDIDATE_MAX_DISTANCE_M} m sharing at least {BLOCKING_MIN_SHARED} title {CANDIDATE_BLOCKING} "
+              f"among {len(locations['contentid'])} locations in {time.perf_counter() - started:.1f}s")
+    else:
+        contentids1, contentids2, meters, cross_cell = neighbour_candidate_pairs(
+            locations['contentid'], locations['latitude'], locations['longitude'],
+            resolution=CANDIDATE_H3_RESOLUTION, max_distance_m=CANDIDATE_MAX_DISTANCE_M
+        )
+        print(f"Found {len(contentids1)} candidate pairs within {CANDIDATE_MAX_DISTANCE_M} m among {len(locations['contentid'])} locations "
+              f"({int(cross_cell.sum())} across cell borders) in {time.perf_counter() - started:.1f}s")
+
+    conn.register('neighbour_candidate_pairs_arrow', pa.table({
+        "contentid1": pa.array(contentids1.tolist(), type=pa.string()),
+        "contentid2": pa.array(contentids2.tolist(), type=pa.string())
+    }))
+    conn.execute('CREATE OR REPLACE TEMP TABLE neighbour_candidate_pairs AS SELECT * FROM neighbour_candidate_pairs_arrow')
+    conn.unregister('neighbour_candidate_pairs_arrow')
+
+    # Same columns and scores as sql/4_insert_into_location_comparison.sql, pairs already compared are skipped
+    conn.execute('INSTALL spatial; LOAD spatial;')
+    inserted = conn.execute('''
+        INSERT INTO location_comparison (
+            duplicateid,
+            contentid1,
+            contentid2,
+            titles,
+            h3_index_8_1,
+            point1,
+            point2,
+            descriptions,
+            similarity_score,
+            similarity_score_2,
+            distance_in_meters
+        )
+        SELECT Concat(l1.contentid, l2.contentid) AS duplicateid,
+            l1.contentid AS contentid1,
+            l2.contentid AS contentid2,
+            ARRAY [l1.title, l2.title] AS titles,
+            l1.h3_index_8 AS h3_index_8_1,
+            ARRAY [l1.latitude, l1.longitude] AS point1,
+            ARRAY [l2.latitude, l2.longitude] AS point2,
+            ARRAY [l1.description, l2.description] AS descriptions,
+            jaro_winkler_similarity(l1.title, l2.title) AS similarity_score,
+            damerau_levenshtein(l1.title, l2.title) AS similarity_score_2,
+            ST_DISTANCE_SPHEROID(
+                ST_POINT(l1.latitude, l1.longitude),
+                ST_POINT(l2.latitude, l2.longitude)
+            ) AS distance_in_meters
+        FROM neighbour_candidate_pairs p
+        JOIN locations l1 ON CAST(l1.contentid AS VARCHAR) = p.contentid1
+        JOIN locations l2 ON CAST(l2.contentid AS VARCHAR) = p.contentid2
+        LEFT JOIN location_comparison lc ON Concat(l1.contentid, l2.contentid) = lc.duplicateid
+        WHERE lc.duplicateid IS NULL
+    ''').fetchone()[0]
+    print(f"Number of neighbour candidate pairs newly inserted into location_comparison: {inserted}")
+
+    conn.close()
+
+if __name__ == "__main__":
+    insert_neighbour_candidates(DATABASE_PATH)
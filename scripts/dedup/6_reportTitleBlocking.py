@@ -0,0 +1,69 @@
+import duckdb
+import os
+import time
+from candidate_generation import neighbour_candidate_pairs
+from title_blocking import BLOCKING_MODES, BLOCKING_Q, blocked_candidate_pairs, blocking_report, pair_set
+
+# Report how much title blocking shrinks the duplicate search space before switching CANDIDATE_BLOCKING on.
+# The current location_comparison rows are the full pairing, its pairs passing the duplicate rule of
+# 4_seedDuplicateLocationsDuckDB.go are the known duplicates. Every blocking mode and min_shared setting is reported
+# with its reduction ratio (share of the unblocked neighbour pairs within the same radius no longer scored) and recall
+# (share of known duplicates still emitted).
+# input: location db file with locations and a scored location_comparison table
+# output: report printed to stdout
+DATABASE_PATH = 'data/locations.db'
+CANDIDATE_H3_RESOLUTION = int(os.getenv("CANDIDATE_H3_RESOLUTION", 8))
+CANDIDATE_MAX_DISTANCE_M = float(os.getenv("CANDIDATE_MAX_DISTANCE_M", 150))
+BLOCKING_MIN_SHARED_VALUES = [int(value) for value in os.getenv("BLOCKING_MIN_SHARED_VALUES", "1,2,3").split(",")]
+DUPLICATE_SIMILARITY_THRESHOLD = float(os.getenv("DUPLICATE_SIMILARITY_THRESHOLD", 0.85))
+DUPLICATE_SENTENCE_SIMILARITY_THRESHOLD = float(os.getenv("DUPLICATE_SENTENCE_SIMILARITY_THRESHOLD", 0.70))
+DUPLICATE_MAX_DISTANCE_M = float(os.getenv("DUPLICATE_MAX_DISTANCE_M", 50))
+
+def report_title_blocking(db_file_path):
+    conn = duckdb.connect(database=db_file_path, read_only=True)
+    locations = conn.execute('''
+        SELECT CAST(contentid AS VARCHAR) AS contentid, title, latitude, longitude FROM locations
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+    ''').fetchnumpy()
+
+    # sentence_similarity_score only exists once the embedding scripts have run
+    has_sentence_score = conn.execute('''
+        SELECT count(*) FROM duckdb_columns() WHERE table_name = 'location_comparison' AND column_name = 'sentence_similarity_score'
+    ''').fetchone()[0] > 0
+    title_rule = f"similarity_score > {DUPLICATE_SIMILARITY_THRESHOLD}"
+    if has_sentence_score:
+        title_rule = f"({title_rule} OR sentence_similarity_score > {DUPLICATE_SENTENCE_SIMILARITY_THRESHOLD})"
+    comparison = conn.execute(f'''
+        SELECT CAST(contentid1 AS VARCHAR) AS contentid1, CAST(contentid2 AS VARCHAR) AS contentid2,
+            COALESCE({title_rule} AND distance_in_meters <= {DUPLICATE_MAX_DISTANCE_M}, false) AS is_duplicate
+        FROM location_comparison
+    ''').fetchnumpy()
+    conn.close()
+
+    full_pairs = pair_set(comparison['contentid1'], comparison['contentid2'])
+    duplicates = comparison['is_duplicate']
+    duplicate_pairs = pair_set(comparison['contentid1'][duplicates], comparison['contentid2'][duplicates])
+    print(f"Full pairing: {len(full_pairs)} location_comparison pairs, {len(duplicate_pairs)} pass the duplicate rule {title_rule} AND distance_in_meters <= {DUPLICATE_MAX_DISTANCE_M}")
+    # Blocking is measured against the pairs CANDIDATE_BLOCKING off would score, distance pruning is not its doing
+    contentids1, contentids2, _, _ = neighbour_candidate_pairs(locations['contentid'], locations['latitude'], locations['longitude'],
+                                                               resolution=CANDIDATE_H3_RESOLUTION, max_distance_m=CANDIDATE_MAX_DISTANCE_M)
+    candidate_pairs = pair_set(contentids1, contentids2)
+    print(f"Unblocked neighbour pairing: {len(candidate_pairs)} pairs within {CANDIDATE_MAX_DISTANCE_M} m")
+
+    print(f"{'mode':<6} {'min_shared':>10} {'pairs':>10} {'reduction':>9} {'recall':>7} {'missed':>7} {'seconds':>7}")
+    titles = locations['title'].tolist()
+    for mode in BLOCKING_MODES:
+        for min_shared in BLOCKING_MIN_SHARED_VALUES:
+            started = time.perf_counter()
+            contentids1, contentids2, _, _ = blocked_candidate_pairs(
+                locations['contentid'], titles, locations['latitude'], locations['longitude'],
+                mode=mode, q=BLOCKING_Q, min_shared=min_shared,
+                resolution=CANDIDATE_H3_RESOLUTION, max_distance_m=CANDIDATE_MAX_DISTANCE_M
+            )
+            elapsed = time.perf_counter() - started
+            report = blocking_report(pair_set(contentids1, contentids2), candidate_pairs, duplicate_pairs)
+            print(f"{mode:<6} {min_shared:>10} {report['blocked_pairs']:>10} {report['reduction_ratio']:>9.1%} {report['recall']:>7.1%} "
+                  f"{report['duplicate_pairs'] - report['duplicates_kept']:>7} {elapsed:>7.1f}")
+
+if __name__ == "__main__":
+    report_title_blocking(DATABASE_PATH)
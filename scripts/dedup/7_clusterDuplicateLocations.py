@@ -0,0 +1,93 @@
+import duckdb
+import json
+import os
+import time
+import pyarrow as pa
+from duplicate_classifier import DUPLICATE_CLASSIFIER_PATH, DuplicateClassifier
+from duplicate_clustering import DUPLICATE_RULE_SETS, cluster_duplicates, match_rules, validate_rules
+
+# Cluster duplicate locations from the scored location_comparison pairs in one pass, replacing the five scenario
+# INSERTs of ArchiveAndRemoveDuplicateLocations in 4_seedDuplicateLocationsDuckDB.go. Pairs are read once, matched
+# against the configured rule set and merged transitively, so A~B and B~C put A, B and C in one cluster.
+# input: location db file with a scored location_comparison table
+# output: locations.cluster_id and locations.canonical_contentid for every clustered location, and duplicate_locations
+#         rebuilt with the non-canonical members tagged with the colour of the rule that matched them
+DATABASE_PATH = 'data/locations.db'
+DUPLICATE_RULE_SET = os.getenv("DUPLICATE_RULE_SET", "scenario1")  # One of DUPLICATE_RULE_SETS or classifier
+DUPLICATE_RULES = os.getenv("DUPLICATE_RULES")  # JSON list of rules, overrides DUPLICATE_RULE_SET
+
+def load_rules():
+    if DUPLICATE_RULES:
+        return validate_rules(json.loads(DUPLICATE_RULES))
+    # dup_probability at or above the threshold the classifier was tuned to when it was trained
+    if DUPLICATE_RULE_SET == "classifier":
+        return [{"tag": "red", "dup_probability": DuplicateClassifier.load(DUPLICATE_CLASSIFIER_PATH).threshold}]
+    if DUPLICATE_RULE_SET not in DUPLICATE_RULE_SETS:
+        raise ValueError(f"Unknown DUPLICATE_RULE_SET {DUPLICATE_RULE_SET}, expected one of {sorted(DUPLICATE_RULE_SETS)}")
+    return DUPLICATE_RULE_SETS[DUPLICATE_RULE_SET]
+
+def comparison_columns(conn):
+    return {row[0] for row in conn.execute("SELECT column_name FROM duckdb_columns() WHERE table_name = 'location_comparison'").fetchall()}
+
+def cluster_duplicate_locations(db_file_path):
+    rules = load_rules()
+    conn = duckdb.connect(database=db_file_path)
+
+    # sentence_similarity_score only exists once the embedding scripts have run, dup_probability once the classifier
+    # has scored the pairs, soft_deleted once sql/5 has
+    columns = comparison_columns(conn)
+    sentence_similarity = "sentence_similarity_score" if "sentence_similarity_score" in columns else "CAST(NULL AS FLOAT)"
+    dup_probability = "dup_probability" if "dup_probability" in columns else "CAST(NULL AS FLOAT)"
+    live = "WHERE NOT COALESCE(soft_deleted, false)" if "soft_deleted" in columns else ""
+    started = time.perf_counter()
+    pairs = conn.execute(f'''
+        SELECT CAST(contentid1 AS VARCHAR) AS contentid1, CAST(contentid2 AS VARCHAR) AS contentid2,
+            similarity_score, {sentence_similarity} AS sentence_similarity_score, distance_in_meters, {dup_probability} AS dup_probability
+        FROM location_comparison
+        {live}
+    ''').fetchnumpy()
+    matched = match_rules(rules, pairs['similarity_score'], pairs['sentence_similarity_score'], pairs['distance_in_meters'], pairs['dup_probability'])
+    contentids, cluster_ids, canonical_contentids, tags = cluster_duplicates(pairs['contentid1'], pairs['contentid2'], matched, rules)
+    print(f"Clustered {len(contentids)} locations into {cluster_ids.max() + 1 if len(cluster_ids) else 0} clusters from "
+          f"{int((matched >= 0).sum())}/{len(matched)} matching pairs in {time.perf_counter() - started:.1f}s")
+
+    conn.register('location_clusters_arrow', pa.table({
+        "contentid": pa.array(contentids.tolist(), type=pa.string()),
+        "cluster_id": pa.array(cluster_ids.tolist(), type=pa.int64()),
+        "canonical_contentid": pa.array(canonical_contentids.tolist(), type=pa.string()),
+        "tag": pa.array(tags.tolist(), type=pa.string())
+    }))
+    conn.execute('''
+        CREATE OR REPLACE TEMP TABLE location_clusters AS
+        SELECT CAST(contentid AS UUID) AS contentid, cluster_id, CAST(canonical_contentid AS UUID) AS canonical_contentid, tag
+        FROM location_clusters_arrow
+    ''')
+    conn.unregister('location_clusters_arrow')
+
+    conn.execute('ALTER TABLE locations ADD COLUMN IF NOT EXISTS cluster_id BIGINT')
+    conn.execute('ALTER TABLE locations ADD COLUMN IF NOT EXISTS canonical_contentid UUID')
+    conn.execute('BEGIN TRANSACTION')
+    conn.execute('UPDATE locations SET cluster_id = NULL, canonical_contentid = NULL WHERE cluster_id IS NOT NULL')
+    conn.execute('''
+        UPDATE locations
+        SET cluster_id = location_clusters.cluster_id, canonical_contentid = location_clusters.canonical_contentid
+        FROM location_clusters
+        WHERE locations.contentid = location_clusters.contentid
+    ''')
+    # Every non-canonical member is a duplicate of its cluster's canonical location
+    duplicates = conn.execute('''
+        CREATE OR REPLACE TABLE duplicate_locations AS
+        SELECT l.* REPLACE (c.tag AS tag)
+        FROM locations l
+        JOIN location_clusters c ON l.contentid = c.contentid
+        WHERE c.contentid <> c.canonical_contentid
+    ''').fetchone()[0]
+    conn.execute('COMMIT')
+    print(f"Number of duplicate locations inserted into duplicate_locations with rule set {'DUPLICATE_RULES' if DUPLICATE_RULES else DUPLICATE_RULE_SET}: {duplicates}")
+    for tag, count in conn.execute('SELECT tag, count(*) FROM duplicate_locations GROUP BY tag ORDER BY tag').fetchall():
+        print(f"{tag}: {count}")
+
+    conn.close()
+
+if __name__ == "__main__":
+    cluster_duplicate_locations(DATABASE_PATH)
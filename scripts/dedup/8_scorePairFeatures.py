@@ -0,0 +1,53 @@
+import duckdb
+import os
+import time
+from pair_features import PairLocations, ensure_feature_columns, write_pair_features
+
+# Score every pending location_comparison pair in one stage: title Jaro-Winkler and Damerau-Levenshtein, distance,
+# description cosine similarity and address / phone / zipcode equality. Pending pairs are streamed in chunks and the
+# locations each chunk references are read with one scan per chunk, replacing the per-score joins of
+# CompareLocationsInsertSimilarityScore and CompareLocationsWithHaversineDistance in
+# scripts/seed/3_seedLocationComparisonTable.go and the separate pass of
+# embedding/3_addDescriptionSimilarityScoreToLocationComparison.py.
+# input: location db file with locations (embedding optional) and location_comparison candidate pairs
+# output: location_comparison rows with a complete feature row and features_scored = true
+DATABASE_PATH = 'data/locations.db'
+PAIR_FEATURE_CHUNK_SIZE = int(os.getenv("PAIR_FEATURE_CHUNK_SIZE", 250000))  # Pairs featurized and written back per chunk
+RESCORE_PAIR_FEATURES = os.environ.get("RESCORE_PAIR_FEATURES") == 'true'  # Rescore pairs that already have features
+
+def score_pair_features(db_file_path):
+    conn = duckdb.connect(database=db_file_path)
+    ensure_feature_columns(conn)
+    pending = "true" if RESCORE_PAIR_FEATURES else "NOT COALESCE(features_scored, false)"
+    total = conn.execute(f'SELECT count(*) FROM location_comparison WHERE {pending}').fetchone()[0]
+    print(f"Scoring {total} pending pairs in chunks of {PAIR_FEATURE_CHUNK_SIZE}")
+
+    # Pending pairs are streamed on their own cursor a chunk at a time while the chunks are written back through conn,
+    # so memory is bounded by PAIR_FEATURE_CHUNK_SIZE pairs and the locations they reference, not by the whole table
+    reader = conn.cursor()
+    batches = reader.execute(f'''
+        SELECT duplicateid, CAST(contentid1 AS VARCHAR) AS contentid1, CAST(contentid2 AS VARCHAR) AS contentid2
+        FROM location_comparison
+        WHERE {pending}
+    ''').fetch_record_batch(PAIR_FEATURE_CHUNK_SIZE)
+
+    started = time.perf_counter()
+    scored = 0
+    for batch in batches:
+        conn.register('pair_feature_chunk', batch)
+        locations = PairLocations.load(conn, '''
+            SELECT CAST(contentid1 AS UUID) FROM pair_feature_chunk
+            UNION
+            SELECT CAST(contentid2 AS UUID) FROM pair_feature_chunk
+        ''')
+        conn.unregister('pair_feature_chunk')
+        column = lambda name: batch.column(name).to_numpy(zero_copy_only=False)
+        write_pair_features(conn, locations.pair_features(column('duplicateid'), column('contentid1'), column('contentid2')))
+        scored += batch.num_rows
+        print(f"Scored {scored}/{total} pairs ({len(locations)} locations in the last chunk) at {scored / (time.perf_counter() - started):.1f} pairs/sec")
+
+    reader.close()
+    conn.close()
+
+if __name__ == "__main__":
+    score_pair_features(DATABASE_PATH)
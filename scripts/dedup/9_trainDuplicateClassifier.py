@@ -0,0 +1,75 @@
+import duckdb
+import os
+import time
+import numpy as np
+from duplicate_classifier import DUPLICATE_CLASSIFIER_PATH, FEATURE_COLUMNS, FEATURE_NAMES, LABEL_COLUMN, DuplicateClassifier, feature_matrix, precision_recall, precision_threshold, recall_threshold
+from duplicate_clustering import DUPLICATE_RULE_SETS, NO_RULE, float_column, match_rules
+
+# Train the duplicate classifier on reviewed location_comparison pairs and compare it with the hand-set rules.
+# The saved model is fit on every label. Its thresholds come from out-of-fold probabilities of DUP_CV_FOLDS models
+# trained the same way on the other folds: the threshold reaching DUP_TARGET_PRECISION and the lower review threshold
+# keeping DUP_REVIEW_RECALL of the duplicates. Every pair is scored by a model that never saw it, so the report and the
+# thresholds describe the saved model rather than one fit on part of the labels.
+# input: location db file with pair features (8_scorePairFeatures.py) and is_duplicate_label set on reviewed pairs
+#        (11_labelDuplicatePairs.py exports pairs to review and imports the labelled CSV)
+# output: DUPLICATE_CLASSIFIER_PATH and a precision report printed to stdout
+DATABASE_PATH = 'data/locations.db'
+DUP_TARGET_PRECISION = float(os.getenv("DUP_TARGET_PRECISION", 0.95))
+DUP_REVIEW_RECALL = float(os.getenv("DUP_REVIEW_RECALL", 0.99))
+DUP_CV_FOLDS = int(os.getenv("DUP_CV_FOLDS", 5))
+DUP_L2 = float(os.getenv("DUP_L2", 1.0))
+DUP_SEED = int(os.getenv("DUP_SEED", 7))
+
+def print_rows(name, rows, threshold=None):
+    for row in rows:
+        print(f"{name:<24} {threshold or format(row['threshold'], '.3f'):>9} {row['flagged']:>8} {row['precision']:>9.1%} {row['recall']:>7.1%}")
+
+# Probability of every pair from a model fit on the folds it is not in, folds are assigned at random with DUP_SEED
+def out_of_fold_probabilities(features, labels, folds, l2):
+    fold = np.random.default_rng(DUP_SEED).permutation(len(labels)) % folds
+    probabilities = np.zeros(len(labels))
+    for current in range(folds):
+        held_out = fold == current
+        if labels[~held_out].all() or not labels[~held_out].any():
+            raise ValueError(f"Fold {current} leaves only one class to train on, label more pairs or lower DUP_CV_FOLDS")
+        probabilities[held_out] = DuplicateClassifier.fit(features[~held_out], labels[~held_out], l2=l2).predict_proba(features[held_out])
+    return probabilities
+
+def train_duplicate_classifier(db_file_path):
+    conn = duckdb.connect(database=db_file_path)
+    conn.execute(f'ALTER TABLE location_comparison ADD COLUMN IF NOT EXISTS {LABEL_COLUMN} BOOLEAN')
+    columns = conn.execute(f'''
+        SELECT {', '.join(FEATURE_COLUMNS)}, {LABEL_COLUMN}
+        FROM location_comparison
+        WHERE {LABEL_COLUMN} IS NOT NULL
+    ''').fetchnumpy()
+    conn.close()
+    labels = float_column(columns[LABEL_COLUMN]) == 1
+    if labels.all() or not labels.any():
+        raise ValueError(f"Training needs both duplicate and distinct pairs in location_comparison.{LABEL_COLUMN}, found {int(labels.sum())}/{len(labels)} duplicates, label pairs with 11_labelDuplicatePairs.py")
+    features = feature_matrix(columns)
+    print(f"Loaded {len(labels)} labelled pairs, {int(labels.sum())} duplicates")
+
+    started = time.perf_counter()
+    probabilities = out_of_fold_probabilities(features, labels, DUP_CV_FOLDS, DUP_L2)
+    threshold = precision_threshold(labels, probabilities, DUP_TARGET_PRECISION)
+    review_threshold = min(recall_threshold(labels, probabilities, DUP_REVIEW_RECALL), threshold)
+    model = DuplicateClassifier.fit(features, labels, l2=DUP_L2)
+    model.threshold, model.review_threshold = threshold, review_threshold
+    print(f"Trained {DUP_CV_FOLDS} cross-validation folds and the final model on {len(labels)} pairs in {time.perf_counter() - started:.2f}s")
+
+    # The hand-set rules flag a pair outright, so they are reported as a single operating point
+    print(f"{'':<24} {'threshold':>9} {'flagged':>8} {'precision':>9} {'recall':>7}")
+    print_rows("classifier", precision_recall(labels, probabilities, sorted({0.5, review_threshold, threshold})))
+    for name, rules in DUPLICATE_RULE_SETS.items():
+        matched = match_rules(rules, *(float_column(columns[column]) for column in ("similarity_score", "sentence_similarity_score", "distance_in_meters"))) != NO_RULE
+        print_rows(f"rules {name}", precision_recall(labels, matched.astype(np.float64), [1.0]), threshold="rule")
+    in_review = (probabilities >= review_threshold) & (probabilities < threshold)
+    print(f"Out-of-fold pairs for manual review between {review_threshold:.3f} and {threshold:.3f}: {int(in_review.sum())}/{len(labels)}")
+
+    model.save(DUPLICATE_CLASSIFIER_PATH)
+    print("Weights: " + ", ".join(f"{name} {weight:+.3f}" for name, weight in zip(FEATURE_NAMES, model.weights)))
+    print(f"Saved duplicate classifier to {DUPLICATE_CLASSIFIER_PATH}")
+
+if __name__ == "__main__":
+    train_duplicate_classifier(DATABASE_PATH)
@@ -0,0 +1,73 @@
+import math
+import h3
+import numpy as np
+
+# Spatial candidate generation for location_comparison. Locations are bucketed by H3 cell and every cell is compared
+# with the cells of its grid_disk, so two copies of a venue on either side of a cell edge still meet. The ring size k
+# is picked from the radius, each ring only adds about one (smallest) edge length of guaranteed reach.
+# Each bucket pair is pruned by haversine distance in NumPy before anything is scored, which keeps the candidate set
+# proportional to the number of locations instead of the square of the busiest cell.
+EARTH_RADIUS_M = 6371008.8
+CANDIDATE_H3_RESOLUTION = 8
+CANDIDATE_MAX_DISTANCE_M = 150.0
+CANDIDATE_CHUNK_SIZE = 2048  # Rows of a bucket compared at once, bounds the distance matrix to chunk x neighbour bucket
+# H3 hexagons of one resolution vary in size, the smallest edges are about this share of the average edge length
+H3_MIN_EDGE_SHARE = 0.6
+
+# Great circle distance in meters between coordinate arrays
+def haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+# Smallest grid_disk ring size reaching max_distance_m from every point of a cell. A point on a vertex of its cell is
+# only one edge length away from the outside of the k=1 disk, so every ring is counted as one edge, shrunk by
+# H3_MIN_EDGE_SHARE for the smallest hexagons of the resolution.
+def ring_size(resolution, max_distance_m):
+    return max(1, math.ceil(max_distance_m / (H3_MIN_EDGE_SHARE * h3.average_hexagon_edge_length(resolution, unit='m'))))
+
+# Positions of the locations in each cell, keyed by the cell as an integer
+def bucket_by_cell(latitudes, longitudes, resolution):
+    cells = np.array([h3.str_to_int(h3.latlng_to_cell(lat, lng, resolution)) for lat, lng in zip(latitudes, longitudes)], dtype=np.uint64)
+    order = np.argsort(cells, kind='stable')
+    unique_cells, starts, counts = np.unique(cells[order], return_index=True, return_counts=True)
+    return cells, {int(cell): order[start:start + count] for cell, start, count in zip(unique_cells, starts, counts)}
+
+# Pairs of locations within max_distance_m of each other in the same or nearby cells. Returns (contentids1,
+# contentids2, meters, cross_cell) with contentid1 < contentid2 as in sql/4_insert_into_location_comparison.sql.
+# Locations without coordinates are skipped.
+def neighbour_candidate_pairs(contentids, latitudes, longitudes, resolution=CANDIDATE_H3_RESOLUTION, max_distance_m=CANDIDATE_MAX_DISTANCE_M, chunk_size=CANDIDATE_CHUNK_SIZE):
+    k = ring_size(resolution, max_distance_m)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    valid = np.isfinite(latitudes) & np.isfinite(longitudes)
+    contentids = np.asarray(contentids).astype(str)[valid]
+    latitudes, longitudes = latitudes[valid], longitudes[valid]
+    cells, buckets = bucket_by_cell(latitudes, longitudes, resolution)
+
+    left_parts, right_parts, meter_parts = [], [], []
+    for cell, members in buckets.items():
+        for neighbour in h3.grid_disk(h3.int_to_str(cell), k):
+            neighbour = h3.str_to_int(neighbour)
+            # Every unordered bucket pair is visited once, from its lower cell
+            if neighbour < cell or neighbour not in buckets:
+                continue
+            others = buckets[neighbour]
+            for start in range(0, len(members), chunk_size):
+                chunk = members[start:start + chunk_size]
+                meters = haversine_m(latitudes[chunk][:, None], longitudes[chunk][:, None], latitudes[others][None, :], longitudes[others][None, :])
+                keep = meters <= max_distance_m
+                if neighbour == cell:
+                    keep &= chunk[:, None] < others[None, :]
+                rows, columns = np.nonzero(keep)
+                left_parts.append(chunk[rows])
+                right_parts.append(others[columns])
+                meter_parts.append(meters[rows, columns])
+
+    if not left_parts:
+        empty = np.array([], dtype=str)
+        return empty, empty, np.array([], dtype=np.float64), np.array([], dtype=bool)
+    left, right, meters = np.concatenate(left_parts), np.concatenate(right_parts), np.concatenate(meter_parts)
+    swap = contentids[left] > contentids[right]
+    left, right = np.where(swap, right, left), np.where(swap, left, right)
+    return contentids[left], contentids[right], meters, cells[left] != cells[right]
@@ -0,0 +1,120 @@
+import numpy as np
+from duplicate_clustering import float_column
+
+# Logistic regression duplicate classifier over the location_comparison pair features written by
+# 8_scorePairFeatures.py. Trained with Newton's method in NumPy on reviewed pairs (is_duplicate_label), saved as a
+# small .npz of weights and standardization so loading it is a single np.load. Pairs scoring at or above the
+# threshold are duplicates, pairs in [review_threshold, threshold) go to manual review, the rest are distinct.
+DUPLICATE_CLASSIFIER_PATH = 'data/duplicate_classifier.npz'
+LABEL_COLUMN = 'is_duplicate_label'
+FEATURE_COLUMNS = ["similarity_score", "similarity_score_2", "distance_in_meters", "sentence_similarity_score", "address_match", "phone_match", "zipcode_match"]
+FEATURE_NAMES = ["similarity_score", "log_similarity_score_2", "log_distance_in_meters", "sentence_similarity_score",
+                 "sentence_similarity_missing", "address_match", "phone_match", "zipcode_match"]
+DEFAULT_L2 = 1.0
+NEWTON_ITERATIONS = 50
+NEWTON_TOLERANCE = 1e-8
+
+# Feature matrix from location_comparison columns. Missing scores are imputed (with an indicator for the embedding
+# score, which is missing whenever a description was never embedded), matches are +1 / -1 and 0 when unknown.
+def feature_matrix(columns):
+    def numeric(name):
+        return float_column(columns[name])
+
+    def match(name):
+        values = float_column(columns[name])
+        return np.where(np.isnan(values), 0.0, 2 * values - 1)
+
+    sentence = numeric("sentence_similarity_score")
+    distance = numeric("distance_in_meters")
+    return np.column_stack([
+        np.nan_to_num(numeric("similarity_score")),
+        np.log1p(np.nan_to_num(numeric("similarity_score_2"))),
+        # Unknown distance counts as far apart
+        np.log1p(np.where(np.isnan(distance), 1e4, distance)),
+        np.nan_to_num(sentence),
+        np.isnan(sentence).astype(np.float64),
+        match("address_match"),
+        match("phone_match"),
+        match("zipcode_match")
+    ])
+
+def sigmoid(values):
+    return 0.5 * (1 + np.tanh(0.5 * values))
+
+class DuplicateClassifier:
+    def __init__(self, weights, bias, mean, scale, threshold=0.5, review_threshold=0.5):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.threshold = float(threshold)
+        self.review_threshold = float(review_threshold)
+
+    # L2 regularized logistic regression on standardized features, the bias is not regularized
+    @classmethod
+    def fit(cls, features, labels, l2=DEFAULT_L2, iterations=NEWTON_ITERATIONS):
+        labels = np.asarray(labels, dtype=np.float64)
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0
+        design = np.column_stack([(features - mean) / scale, np.ones(len(features))])
+        penalty = np.full(design.shape[1], l2)
+        penalty[-1] = 0.0
+        coefficients = np.zeros(design.shape[1])
+        for _ in range(iterations):
+            probabilities = sigmoid(design @ coefficients)
+            gradient = design.T @ (probabilities - labels) + penalty * coefficients
+            hessian = (design * (probabilities * (1 - probabilities))[:, None]).T @ design + np.diag(penalty) + 1e-9 * np.eye(design.shape[1])
+            step = np.linalg.solve(hessian, gradient)
+            coefficients -= step
+            if np.abs(step).max() < NEWTON_TOLERANCE:
+                break
+        return cls(coefficients[:-1], coefficients[-1], mean, scale)
+
+    def predict_proba(self, features):
+        return sigmoid(((features - self.mean) / self.scale) @ self.weights + self.bias)
+
+    def save(self, path=DUPLICATE_CLASSIFIER_PATH):
+        np.savez(path, weights=self.weights, bias=self.bias, mean=self.mean, scale=self.scale, threshold=self.threshold,
+                 review_threshold=self.review_threshold, feature_names=np.array(FEATURE_NAMES))
+
+    @classmethod
+    def load(cls, path=DUPLICATE_CLASSIFIER_PATH):
+        with np.load(path) as artifact:
+            if list(artifact['feature_names']) != FEATURE_NAMES:
+                raise ValueError(f"{path} was trained on features {list(artifact['feature_names'])}, expected {FEATURE_NAMES}, retrain it")
+            return cls(artifact['weights'], artifact['bias'], artifact['mean'], artifact['scale'], artifact['threshold'], artifact['review_threshold'])
+
+# Precision and recall of flagging every pair at or above each threshold
+def precision_recall(labels, probabilities, thresholds):
+    labels = np.asarray(labels, dtype=bool)
+    rows = []
+    for threshold in thresholds:
+        flagged = probabilities >= threshold
+        true_positives = int((flagged & labels).sum())
+        rows.append({
+            "threshold": float(threshold),
+            "flagged": int(flagged.sum()),
+            "precision": true_positives / flagged.sum() if flagged.any() else 1.0,
+            "recall": true_positives / labels.sum() if labels.any() else 1.0
+        })
+    return rows
+
+# Lowest threshold whose precision reaches target_precision, so as many duplicates as possible are accepted unseen.
+# Pairs are ranked once and precision is read off cumulative true positives at the last pair of every tie.
+def precision_threshold(labels, probabilities, target_precision):
+    order = np.argsort(-probabilities, kind='stable')
+    ranked = probabilities[order]
+    precision = np.cumsum(np.asarray(labels, dtype=bool)[order]) / np.arange(1, len(ranked) + 1)
+    tie_ends = np.r_[ranked[1:] != ranked[:-1], True] if len(ranked) else np.array([], dtype=bool)
+    reached = np.nonzero(tie_ends & (precision >= target_precision))[0]
+    return float(ranked[reached[-1]]) if len(reached) else 1.0
+
+# Highest threshold that still recalls target_recall of the duplicates, pairs between it and the precision threshold
+# are the ones worth a manual look
+def recall_threshold(labels, probabilities, target_recall):
+    labels = np.asarray(labels, dtype=bool)
+    positives = np.sort(probabilities[labels])[::-1]
+    if not len(positives):
+        return 0.0
+    return float(positives[min(int(np.ceil(target_recall * len(positives))), len(positives)) - 1])
@@ -0,0 +1,134 @@
+import numpy as np
+
+# Transitive duplicate clustering over scored location_comparison pairs. A pair is a duplicate when it matches any
+# rule of the active rule set, matched pairs are merged with an array-backed union-find and every cluster keeps its
+# lowest contentid as the canonical location (the same side 4_seedDuplicateLocationsDuckDB.go keeps as contentid1).
+# A rule is a dict of thresholds, all of them optional:
+#   similarity / sentence_similarity: the title (Jaro-Winkler) / description embedding score must be above it,
+#     "match": "all" needs both scores above their thresholds, "any" needs one of them
+#   max_distance_m / min_distance_m: distance_in_meters must be at most / above it
+#   dup_probability: the classifier probability (10_scoreDuplicateProbability.py) must be at least it
+# and a tag, the marker colour the old scenario of that rule used in 10_filterNYLocations.py.
+# Missing scores never pass a threshold, like the NULL comparisons in SQL.
+DUPLICATE_RULE_SETS = {
+    "scenario1": [
+        {"tag": "red", "similarity": 0.85, "max_distance_m": 50}
+    ],
+    "scenario2": [
+        {"tag": "lightred", "similarity": 0.85, "sentence_similarity": 0.70, "match": "all", "max_distance_m": 50}
+    ],
+    "scenario3": [
+        {"tag": "darkred", "similarity": 0.85, "sentence_similarity": 0.70, "match": "any", "max_distance_m": 50}
+    ],
+    "scenario4": [
+        {"tag": "pink", "similarity": 0.85, "sentence_similarity": 0.70, "match": "any", "min_distance_m": 50}
+    ],
+    "scenario5": [
+        {"tag": "purple", "similarity": 0.70, "sentence_similarity": 0.60, "match": "any", "max_distance_m": 50},
+        {"tag": "purple", "similarity": 0.85, "sentence_similarity": 0.70, "match": "any", "min_distance_m": 50}
+    ]
+}
+RULE_KEYS = {"tag", "similarity", "sentence_similarity", "dup_probability", "match", "max_distance_m", "min_distance_m"}
+NO_RULE = -1
+
+def validate_rules(rules):
+    if not rules:
+        raise ValueError("A duplicate rule set needs at least one rule")
+    for rule in rules:
+        unknown = set(rule) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"Unknown duplicate rule keys {sorted(unknown)} in {rule}, expected {sorted(RULE_KEYS)}")
+        if all(rule.get(score) is None for score in ("similarity", "sentence_similarity", "dup_probability")):
+            raise ValueError(f"Duplicate rule {rule} needs a similarity, sentence_similarity or dup_probability threshold")
+        if rule.get("match", "all") not in ("all", "any"):
+            raise ValueError(f"Duplicate rule {rule} has match {rule['match']}, expected all or any")
+    return rules
+
+# Boolean mask of the pairs passing one rule
+def rule_mask(rule, similarity, sentence_similarity, distance_m, dup_probability):
+    with np.errstate(invalid='ignore'):
+        scores = []
+        if rule.get("similarity") is not None:
+            scores.append(similarity > rule["similarity"])
+        if rule.get("sentence_similarity") is not None:
+            scores.append(sentence_similarity > rule["sentence_similarity"])
+        if rule.get("dup_probability") is not None:
+            scores.append(dup_probability >= rule["dup_probability"])
+        mask = np.logical_or.reduce(scores) if rule.get("match", "all") == "any" else np.logical_and.reduce(scores)
+        if rule.get("max_distance_m") is not None:
+            mask &= distance_m <= rule["max_distance_m"]
+        if rule.get("min_distance_m") is not None:
+            mask &= distance_m > rule["min_distance_m"]
+    return mask
+
+# float64 copy of a fetchnumpy column with NULLs as NaN. fetchnumpy returns masked arrays for nullable columns and
+# np.asarray drops the mask, which would turn every NULL into whatever value sits under it (0 for the match columns)
+def float_column(values):
+    return np.ma.filled(np.ma.asarray(values, dtype=np.float64), np.nan)
+
+# Index of the first rule each pair passes, NO_RULE for pairs that are not duplicates
+def match_rules(rules, similarity, sentence_similarity, distance_m, dup_probability=None):
+    if dup_probability is None:
+        dup_probability = np.full(len(similarity), np.nan)
+    similarity, sentence_similarity, distance_m, dup_probability = (float_column(values) for values in (similarity, sentence_similarity, distance_m, dup_probability))
+    matched = np.full(len(similarity), NO_RULE, dtype=np.int64)
+    for index, rule in enumerate(validate_rules(rules)):
+        matched[(matched == NO_RULE) & rule_mask(rule, similarity, sentence_similarity, distance_m, dup_probability)] = index
+    return matched
+
+# Disjoint sets over positions 0..size-1 in flat lists, union by size with path halving
+class UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def find(self, position):
+        parent = self.parent
+        while parent[position] != position:
+            parent[position] = parent[parent[position]]
+            position = parent[position]
+        return position
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return first
+        if self.size[first] < self.size[second]:
+            first, second = second, first
+        self.parent[second] = first
+        self.size[first] += self.size[second]
+        return first
+
+    def roots(self):
+        return np.array([self.find(position) for position in range(len(self.parent))], dtype=np.int64)
+
+# Clusters of the locations linked by matched pairs. Returns (contentids, cluster_ids, canonical_contentids, tags)
+# for every location in a cluster of two or more, cluster ids are dense and ordered by canonical contentid. The tag
+# is the one of the first rule that linked the location.
+def cluster_duplicates(contentids1, contentids2, matched_rules, rules):
+    linked = matched_rules != NO_RULE
+    contentids1 = np.asarray(contentids1).astype(str)[linked]
+    contentids2 = np.asarray(contentids2).astype(str)[linked]
+    matched_rules = matched_rules[linked]
+    if not len(contentids1):
+        empty = np.array([], dtype=str)
+        return empty, np.array([], dtype=np.int64), empty, empty
+
+    contentids, positions = np.unique(np.concatenate([contentids1, contentids2]), return_inverse=True)
+    left, right = positions[:len(contentids1)], positions[len(contentids1):]
+    union_find = UnionFind(len(contentids))
+    for first, second in zip(left.tolist(), right.tolist()):
+        union_find.union(first, second)
+    roots = union_find.roots()
+
+    # contentids are sorted, so the first position seen for a root is the lowest contentid of its cluster
+    canonical = np.full(len(contentids), len(contentids), dtype=np.int64)
+    np.minimum.at(canonical, roots, np.arange(len(contentids)))
+    canonical = canonical[roots]
+    _, cluster_ids = np.unique(canonical, return_inverse=True)
+
+    first_rule = np.full(len(contentids), len(rules), dtype=np.int64)
+    np.minimum.at(first_rule, left, matched_rules)
+    np.minimum.at(first_rule, right, matched_rules)
+    tags = np.array([rule.get("tag", "red") for rule in rules], dtype=object)[first_rule]
+    return contentids, cluster_ids, contentids[canonical], tags
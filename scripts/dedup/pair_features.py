@@ -0,0 +1,130 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from candidate_generation import haversine_m
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'embedding'))
+from embedding_store import EMBEDDING_DIM, EMBEDDING_TYPE, arrow_embeddings_to_numpy, get_column_type, normalize_rows
+
+# Fused pair features for location_comparison. Every location referenced by a pair is read once into memory, its
+# address, phone and zipcode normalized once, and pairs are then featurized in chunks by array lookups instead of
+# joining locations twice per score. Title string metrics are left to DuckDB's jaro_winkler_similarity and
+# damerau_levenshtein over the chunk, so they match the scores sql/4_insert_into_location_comparison.sql produced.
+FEATURE_COLUMNS = {
+    "similarity_score": "FLOAT",
+    "similarity_score_2": "FLOAT",
+    "distance_in_meters": "FLOAT",
+    "sentence_similarity_score": "FLOAT",
+    "address_match": "BOOLEAN",
+    "phone_match": "BOOLEAN",
+    "zipcode_match": "BOOLEAN",
+    "features_scored": "BOOLEAN"
+}
+PHONE_DIGITS = 10  # Country codes and trunk prefixes are dropped by keeping the last 10 digits
+ZIPCODE_DIGITS = 5
+
+# Lowercase alphanumeric words of an address, None when nothing is left
+def normalize_addresses(values):
+    normalized = pd.Series(values, dtype=object).fillna('').astype(str).str.lower().str.replace(r'[^0-9a-z]+', ' ', regex=True).str.strip()
+    return normalized.where(normalized != '', None).to_numpy(dtype=object)
+
+# Last PHONE_DIGITS digits of a phone number, None for anything shorter
+def normalize_phones(values):
+    digits = pd.Series(values, dtype=object).fillna('').astype(str).str.replace(r'\D+', '', regex=True)
+    return digits.str[-PHONE_DIGITS:].where(digits.str.len() >= PHONE_DIGITS, None).to_numpy(dtype=object)
+
+# First ZIPCODE_DIGITS digits of a zipcode (ZIP+4 collapses to ZIP), None for anything shorter
+def normalize_zipcodes(values):
+    digits = pd.Series(values, dtype=object).fillna('').astype(str).str.replace(r'\D+', '', regex=True)
+    return digits.str[:ZIPCODE_DIGITS].where(digits.str.len() >= ZIPCODE_DIGITS, None).to_numpy(dtype=object)
+
+# Equality of two normalized value arrays as an arrow boolean array, null when either side is missing
+def equality_array(first, second):
+    missing = pd.isna(first) | pd.isna(second)
+    return pa.array(np.equal(first, second, where=~missing, out=np.zeros(len(first), dtype=bool)), mask=missing, type=pa.bool_())
+
+# The columns of every location a pair needs, loaded with a single scan of locations
+class PairLocations:
+    def __init__(self, contentids, titles, descriptions, latitudes, longitudes, addresses, phones, zipcodes, embeddings):
+        self.index = pd.Index(contentids)
+        self.titles = titles
+        self.descriptions = descriptions
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.addresses = normalize_addresses(addresses)
+        self.phones = normalize_phones(phones)
+        self.zipcodes = normalize_zipcodes(zipcodes)
+        self.embeddings = embeddings
+
+    def __len__(self):
+        return len(self.index)
+
+    # Locations whose contentid is returned by contentid_query, embeddings are only read when the column has the
+    # FLOAT[384] type written by the embedding scripts
+    @classmethod
+    def load(cls, conn, contentid_query):
+        has_embeddings = get_column_type(conn, 'locations', 'embedding') == EMBEDDING_TYPE
+        table = conn.execute(f'''
+            SELECT CAST(contentid AS VARCHAR) AS contentid, title, description, latitude, longitude, address, phone, zipcode,
+                {'embedding' if has_embeddings else 'NULL'} AS embedding
+            FROM locations
+            WHERE contentid IN ({contentid_query})
+        ''').fetch_arrow_table()
+        if has_embeddings:
+            embeddings = arrow_embeddings_to_numpy(table.column('embedding'))
+        else:
+            embeddings = np.zeros((table.num_rows, EMBEDDING_DIM), dtype=np.float32)
+        column = lambda name: table.column(name).to_numpy(zero_copy_only=False)
+        return cls(
+            column('contentid'), column('title'), column('description'),
+            table.column('latitude').to_numpy(zero_copy_only=False).astype(np.float64),
+            table.column('longitude').to_numpy(zero_copy_only=False).astype(np.float64),
+            column('address'), column('phone'), column('zipcode'), normalize_rows(embeddings)
+        )
+
+    # Arrow table with a complete feature row per pair. Title metrics are not computed here: title1 and title2 are
+    # passed through for the SQL that writes the chunk. Pairs with a location that was not loaded get null features.
+    def pair_features(self, duplicateids, contentids1, contentids2):
+        rows1, rows2 = self.index.get_indexer(contentids1), self.index.get_indexer(contentids2)
+        known = (rows1 >= 0) & (rows2 >= 0)
+        rows1, rows2 = np.where(known, rows1, 0), np.where(known, rows2, 0)
+        meters = haversine_m(self.latitudes[rows1], self.longitudes[rows1], self.latitudes[rows2], self.longitudes[rows2])
+        # Row-wise dot product of unit vectors is the cosine similarity, a zero vector means no embedding
+        cosine = np.einsum('ij,ij->i', self.embeddings[rows1], self.embeddings[rows2])
+        embedded = self.embeddings[rows1].any(axis=1) & self.embeddings[rows2].any(axis=1)
+        unknown = ~known
+        return pa.table({
+            "duplicateid": pa.array(duplicateids, type=pa.string()),
+            "title1": pa.array(self.titles[rows1], mask=unknown, type=pa.string()),
+            "title2": pa.array(self.titles[rows2], mask=unknown, type=pa.string()),
+            "distance_in_meters": pa.array(meters, mask=unknown | ~np.isfinite(meters), type=pa.float32()),
+            "sentence_similarity_score": pa.array(cosine, mask=unknown | ~embedded, type=pa.float32()),
+            "address_match": equality_array(np.where(known, self.addresses[rows1], None), self.addresses[rows2]),
+            "phone_match": equality_array(np.where(known, self.phones[rows1], None), self.phones[rows2]),
+            "zipcode_match": equality_array(np.where(known, self.zipcodes[rows1], None), self.zipcodes[rows2])
+        })
+
+def ensure_feature_columns(conn):
+    for column, column_type in FEATURE_COLUMNS.items():
+        conn.execute(f'ALTER TABLE location_comparison ADD COLUMN IF NOT EXISTS {column} {column_type}')
+
+# Write one chunk of features with a single UPDATE, the title metrics are computed from the chunk's own titles
+def write_pair_features(conn, features):
+    conn.register('pair_features_arrow', features)
+    conn.execute('CREATE OR REPLACE TEMP TABLE pair_features AS SELECT * FROM pair_features_arrow')
+    conn.unregister('pair_features_arrow')
+    conn.execute('''
+        UPDATE location_comparison
+        SET similarity_score = jaro_winkler_similarity(pair_features.title1, pair_features.title2),
+            similarity_score_2 = damerau_levenshtein(pair_features.title1, pair_features.title2),
+            distance_in_meters = pair_features.distance_in_meters,
+            sentence_similarity_score = pair_features.sentence_similarity_score,
+            address_match = pair_features.address_match,
+            phone_match = pair_features.phone_match,
+            zipcode_match = pair_features.zipcode_match,
+            features_scored = true
+        FROM pair_features
+        WHERE location_comparison.duplicateid = pair_features.duplicateid
+    ''')
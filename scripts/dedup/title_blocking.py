@@ -0,0 +1,125 @@
+import re
+import unicodedata
+from collections import defaultdict
+import h3
+import numpy as np
+from candidate_generation import CANDIDATE_H3_RESOLUTION, CANDIDATE_MAX_DISTANCE_M, bucket_by_cell, haversine_m, ring_size
+
+# Title blocking for location_comparison. Titles are normalized (case, accents, punctuation, stop words) and cut into
+# word tokens or character q-grams. An inverted index keyed by (H3 cell, key) then only pairs locations that share
+# at least min_shared keys inside the same or a nearby cell, so busy cells no longer score every pair.
+# Keys held by more than max_key_frequency locations of one cell say nothing about identity and are skipped.
+TITLE_STOP_WORDS = frozenset({"a", "an", "and", "at", "by", "for", "in", "of", "on", "the", "to", "museum", "nyc"})
+BLOCKING_MODES = ("token", "qgram")
+BLOCKING_Q = 3
+BLOCKING_MIN_SHARED = 1
+BLOCKING_MAX_KEY_FREQUENCY = 200
+NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+# Lowercase ASCII words without punctuation and stop words. A title made only of stop words keeps its words.
+def normalize_title(title, stop_words=TITLE_STOP_WORDS):
+    text = unicodedata.normalize('NFKD', title or '').encode('ascii', 'ignore').decode('ascii').lower()
+    words = NON_ALPHANUMERIC.sub(' ', text).split()
+    kept = [word for word in words if word not in stop_words]
+    return ' '.join(kept or words)
+
+# Distinct blocking keys of a normalized title, word tokens or padded character q-grams
+def title_keys(normalized_title, mode='token', q=BLOCKING_Q):
+    if mode == 'token':
+        return set(normalized_title.split())
+    if mode == 'qgram':
+        padded = f"#{normalized_title}#"
+        return {padded[start:start + q] for start in range(max(len(padded) - q + 1, 1))} if normalized_title else set()
+    raise ValueError(f"Unknown blocking mode {mode}, expected one of {BLOCKING_MODES}")
+
+# Positions of the locations holding each key, per cell
+def build_inverted_index(cells, keys_per_location):
+    postings = defaultdict(lambda: defaultdict(list))
+    for position, (cell, keys) in enumerate(zip(cells, keys_per_location)):
+        for key in keys:
+            postings[int(cell)][key].append(position)
+    return {cell: {key: np.array(positions, dtype=np.int64) for key, positions in keys.items()} for cell, keys in postings.items()}
+
+# Pairs of positions sharing a key between two cell indexes, one entry per shared key
+def shared_key_pairs(index, other_index, same_cell, max_key_frequency):
+    left_parts, right_parts = [], []
+    smaller, larger = (index, other_index) if len(index) <= len(other_index) else (other_index, index)
+    for key, members in smaller.items():
+        others = larger.get(key)
+        if others is None or len(members) > max_key_frequency or len(others) > max_key_frequency:
+            continue
+        if same_cell:
+            rows, columns = np.triu_indices(len(members), 1)
+            left_parts.append(members[rows])
+            right_parts.append(members[columns])
+        else:
+            left_parts.append(np.repeat(members, len(others)))
+            right_parts.append(np.tile(others, len(members)))
+    return left_parts, right_parts
+
+# Pairs sharing at least min_shared title keys within max_distance_m in the same or nearby cells. Returns
+# (contentids1, contentids2, meters, shared_keys) with contentid1 < contentid2, like neighbour_candidate_pairs.
+# Shared keys are counted one cell neighbourhood at a time, which bounds memory by the busiest neighbourhood.
+def blocked_candidate_pairs(contentids, titles, latitudes, longitudes, mode='token', q=BLOCKING_Q, min_shared=BLOCKING_MIN_SHARED,
+                            resolution=CANDIDATE_H3_RESOLUTION, max_distance_m=CANDIDATE_MAX_DISTANCE_M, max_key_frequency=BLOCKING_MAX_KEY_FREQUENCY,
+                            stop_words=TITLE_STOP_WORDS):
+    k = ring_size(resolution, max_distance_m)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    valid = np.isfinite(latitudes) & np.isfinite(longitudes)
+    contentids = np.asarray(contentids).astype(str)[valid]
+    titles = [title for title, keep in zip(titles, valid) if keep]
+    latitudes, longitudes = latitudes[valid], longitudes[valid]
+    cells, _ = bucket_by_cell(latitudes, longitudes, resolution)
+    postings = build_inverted_index(cells, [title_keys(normalize_title(title, stop_words), mode, q) for title in titles])
+
+    left_parts, right_parts, meter_parts, shared_parts = [], [], [], []
+    for cell, index in postings.items():
+        cell_left, cell_right = [], []
+        for neighbour in h3.grid_disk(h3.int_to_str(cell), k):
+            neighbour = h3.str_to_int(neighbour)
+            # Every unordered cell pair is visited once, from its lower cell
+            if neighbour < cell or neighbour not in postings:
+                continue
+            pair_left, pair_right = shared_key_pairs(index, postings[neighbour], neighbour == cell, max_key_frequency)
+            cell_left += pair_left
+            cell_right += pair_right
+        if not cell_left:
+            continue
+        left, right = np.concatenate(cell_left), np.concatenate(cell_right)
+        low, high = np.minimum(left, right), np.maximum(left, right)
+        # One entry per shared key, counting the codes gives the number of keys each pair shares
+        codes, shared = np.unique(low * len(contentids) + high, return_counts=True)
+        keep = shared >= min_shared
+        left, right, shared = codes[keep] // len(contentids), codes[keep] % len(contentids), shared[keep]
+        meters = haversine_m(latitudes[left], longitudes[left], latitudes[right], longitudes[right])
+        keep = meters <= max_distance_m
+        left_parts.append(left[keep])
+        right_parts.append(right[keep])
+        meter_parts.append(meters[keep])
+        shared_parts.append(shared[keep])
+
+    if not left_parts:
+        empty = np.array([], dtype=str)
+        return empty, empty, np.array([], dtype=np.float64), np.array([], dtype=np.int64)
+    left, right = np.concatenate(left_parts), np.concatenate(right_parts)
+    swap = contentids[left] > contentids[right]
+    left, right = np.where(swap, right, left), np.where(swap, left, right)
+    return contentids[left], contentids[right], np.concatenate(meter_parts), np.concatenate(shared_parts)
+
+def pair_set(contentids1, contentids2):
+    return {(min(first, second), max(first, second)) for first, second in zip(map(str, contentids1), map(str, contentids2))}
+
+# Reduction ratio (share of the unblocked candidate pairs no longer compared) and recall (share of known duplicate pairs
+# still emitted) of a blocked pairing. candidate_pairs has to be the neighbour_candidate_pairs of the same resolution and
+# radius, so the ratio measures the title blocking alone and not the distance pruning both pairings share.
+def blocking_report(blocked_pairs, candidate_pairs, duplicate_pairs):
+    kept_duplicates = len(duplicate_pairs & blocked_pairs)
+    return {
+        "candidate_pairs": len(candidate_pairs),
+        "blocked_pairs": len(blocked_pairs),
+        "duplicate_pairs": len(duplicate_pairs),
+        "duplicates_kept": kept_duplicates,
+        "reduction_ratio": 1 - len(blocked_pairs) / len(candidate_pairs) if candidate_pairs else 0.0,
+        "recall": kept_duplicates / len(duplicate_pairs) if duplicate_pairs else 1.0
+    }
@@ -0,0 +1,37 @@
+import duckdb
+from embedding_store import EMBEDDING_DIM, EMBEDDING_TYPE, get_column_type
+
+# One time migration of locations.embedding from JSON text to a native FLOAT[384] array
+# input: location db file with the embedding JSON column written by older runs of 2_addDescriptionEmbeddingsToLocationDescription.py
+# output: embedding column of type FLOAT[384], unused legacy embeddings JSON column dropped
+DATABASE_PATH = 'data/locations.db'
+
+def migrate_json_embeddings(db_file_path):
+    conn = duckdb.connect(database=db_file_path)
+    column_type = get_column_type(conn, 'locations', 'embedding')
+    if column_type == EMBEDDING_TYPE:
+        print(f"locations.embedding is already {EMBEDDING_TYPE}, nothing to migrate")
+    else:
+        conn.execute(f'ALTER TABLE locations ADD COLUMN IF NOT EXISTS embedding_vector {EMBEDDING_TYPE}')
+        if column_type is not None:
+            # Rows holding empty or malformed JSON are left null so they get re-encoded
+            conn.execute(f'''
+                UPDATE locations
+                SET embedding_vector = CAST(CAST(embedding AS FLOAT[]) AS {EMBEDDING_TYPE})
+                WHERE embedding IS NOT NULL
+                AND json_valid(embedding)
+                AND json_type(embedding) = 'ARRAY'
+                AND json_array_length(embedding) = {EMBEDDING_DIM}
+            ''')
+            conn.execute('ALTER TABLE locations DROP COLUMN embedding')
+        conn.execute('ALTER TABLE locations RENAME COLUMN embedding_vector TO embedding')
+        migrated = conn.execute('SELECT count(*) FROM locations WHERE embedding IS NOT NULL').fetchone()[0]
+        print(f"Migrated {migrated} embeddings to {EMBEDDING_TYPE}")
+    if get_column_type(conn, 'locations', 'embeddings') is not None:
+        conn.execute('ALTER TABLE locations DROP COLUMN embeddings')
+        print("Dropped legacy embeddings column")
+    conn.execute('CHECKPOINT')
+    conn.close()
+
+if __name__ == "__main__":
+    migrate_json_embeddings(DATABASE_PATH)
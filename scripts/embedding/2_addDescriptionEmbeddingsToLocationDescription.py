@@ -1,15 +1,25 @@
 from sentence_transformers import SentenceTransformer
 import duckdb
-import json
+import os
+import time
+import numpy as np
 from bs4 import BeautifulSoup
 import nltk
 # from nltk.corpus import stopwords
 import re
+from embedding_store import EMBEDDING_DIM, ensure_embedding_column, write_embeddings
+from embedding_cache import description_hash, ensure_embedding_cache_table, lookup_cached_embeddings, store_cached_embeddings
 
 # Download NLTK stopwords
 # nltk.download('stopwords')
 # stop_words = set(stopwords.words('english'))
 
+MODEL_NAME = 'all-MiniLM-L6-v2'
+DATABASE_PATH = 'data/locations.db'
+EMBEDDING_CHUNK_SIZE = int(os.getenv("EMBEDDING_CHUNK_SIZE", 2048))  # Descriptions encoded and written back per chunk
+EMBEDDING_ENCODE_BATCH_SIZE = int(os.getenv("EMBEDDING_ENCODE_BATCH_SIZE", 64))  # Batch size passed to model.encode
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", 0))  # CPU worker processes, 0 or 1 encodes in this process
+
 # Function to preprocess text
 def preprocess_text(text):
     # Remove HTML tags
@@ -23,45 +33,77 @@ def preprocess_text(text):
         # text = ' '.join(word for word in text.split() if word not in stop_words)
     return text
 
-# Load model
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Encode a chunk of preprocessed descriptions, fanning out over the process pool when one is running
+def encode_descriptions(model, descriptions, pool=None):
+    if pool is not None:
+        return model.encode_multi_process(descriptions, pool, batch_size=EMBEDDING_ENCODE_BATCH_SIZE)
+    return model.encode(descriptions, batch_size=EMBEDDING_ENCODE_BATCH_SIZE, show_progress_bar=False)
+
+# Embed a chunk of preprocessed descriptions, only descriptions missing from the embedding cache are sent to the model
+def embed_with_cache(conn, model, descriptions, pool=None):
+    hashes = [description_hash(MODEL_NAME, description) for description in descriptions]
+    embeddings = np.zeros((len(descriptions), EMBEDDING_DIM), dtype=np.float32)
+    cached_hashes, cached_embeddings = lookup_cached_embeddings(conn, list(set(hashes)))
+    by_hash = dict(zip(cached_hashes, cached_embeddings))
+    missing = {}
+    for description, content_hash in zip(descriptions, hashes):
+        if content_hash not in by_hash:
+            missing[content_hash] = description
+    if missing:
+        encoded = encode_descriptions(model, list(missing.values()), pool)
+        store_cached_embeddings(conn, MODEL_NAME, list(missing.keys()), encoded)
+        by_hash.update(zip(missing.keys(), encoded))
+    for row, content_hash in enumerate(hashes):
+        embeddings[row] = by_hash[content_hash]
+    return embeddings, len(missing)
+
+def add_description_embeddings(db_file_path):
+    # Load model
+    model = SentenceTransformer(MODEL_NAME)
 
-# Connect to DuckDB (assuming you have a 'locations' table with 'id' and 'description' columns)
-conn = duckdb.connect(database='data/locations.db')
+    # Connect to DuckDB (assuming you have a 'locations' table with 'id' and 'description' columns)
+    conn = duckdb.connect(database=db_file_path)
 
-# Add a new column for embeddings if it doesn't exist
-conn.execute('ALTER TABLE locations ADD COLUMN IF NOT EXISTS embedding JSON')
+    # Add a new FLOAT[384] column for embeddings if it doesn't exist
+    ensure_embedding_column(conn)
+    ensure_embedding_cache_table(conn)
 
-# Query all descriptions from the locations table
-descriptions = conn.execute('SELECT contentid, description FROM locations where embedding is null').fetchall()
+    # Query all descriptions from the locations table
+    descriptions = conn.execute('SELECT contentid, description FROM locations where embedding is null').fetchall()
+    #print number of descriptions
+    print(len(descriptions))
 
-# Iterate through the descriptions, preprocess, and generate embeddings
-#print number of descriptions
-print(len(descriptions))
-for row in descriptions:
-    location_id = row[0]
-    description = row[1]
-    preprocessed_description = preprocess_text(description)
-    #encode the preprocessed description to get the embedding of the description and make it comparable using cosine similarity
-    if preprocessed_description is None:
-        continue
-    embedding = model.encode(preprocessed_description).tolist()
-    # embedding = model.encode(preprocessed_description, convert_to_tensor=True, show_progress_bar=True, normalize_embeddings=True).tolist()
-    # print(embedding.count)
-    # embedding = model.encode(preprocessed_description).tolist()
-    embedding_json = json.dumps(embedding)
+    # Preprocess up front, rows without a usable description are skipped
+    rows = []
+    for location_id, description in descriptions:
+        preprocessed_description = preprocess_text(description)
+        if preprocessed_description is None:
+            continue
+        rows.append((str(location_id), preprocessed_description))
 
-    # Update the table with the embedding
-    conn.execute('''
-        UPDATE locations
-        SET embedding = ?
-        WHERE contentid = ?
-    ''', (embedding_json, location_id))
+    pool = None
+    if EMBEDDING_WORKERS > 1:
+        pool = model.start_multi_process_pool(target_devices=['cpu'] * EMBEDDING_WORKERS)
+    try:
+        started = time.perf_counter()
+        total_rows = 0
+        total_encoded = 0
+        for start in range(0, len(rows), EMBEDDING_CHUNK_SIZE):
+            chunk = rows[start:start + EMBEDDING_CHUNK_SIZE]
+            contentids = [row[0] for row in chunk]
+            #encode the preprocessed descriptions to get the embeddings of the descriptions and make them comparable using cosine similarity
+            embeddings, encoded = embed_with_cache(conn, model, [row[1] for row in chunk], pool)
+            write_embeddings(conn, contentids, embeddings)
+            total_rows += len(chunk)
+            total_encoded += encoded
+            elapsed = time.perf_counter() - started
+            print(f"Embedded {total_rows}/{len(rows)} descriptions ({total_encoded} encoded, {total_rows - total_encoded} reused from the embedding cache) at {total_rows / elapsed:.1f} rows/sec")
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
 
-# Verify the update
-# result = conn.execute('SELECT id, description, embedding FROM locations').fetchall()
-# for row in result:
-#     print(row)
+    # Close the connection
+    conn.close()
 
-# Close the connection
-conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    add_description_embeddings(DATABASE_PATH)
@@ -1,57 +1,80 @@
-from sentence_transformers import SentenceTransformer, util
 import duckdb
-import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from embedding_store import fetch_embeddings, normalize_rows
 
 # join location and location_comparison table and compare the embedding of the two content_id1 and content_id2 and return the similarity score of the two embeddings
 # input: location db file which has locations(contentid as unique identifier) and location_comparison table(contentid1, contentid2)
 # output: similarity score of the two embeddings and update location_comparison table with the similarity score
+DATABASE_PATH = 'data/locations.db'
+PAIR_CHUNK_SIZE = int(os.getenv("SIMILARITY_PAIR_CHUNK_SIZE", 250000))  # Pairs scored and written back per chunk
+
+# Write a chunk of scores back with one statement through a temp table keyed on duplicateid
+def write_similarity_scores(conn, duplicateids, scores):
+    conn.register('similarity_batch_arrow', pa.table({
+        "duplicateid": pa.array(duplicateids, type=pa.string()),
+        "sentence_similarity_score": pa.array(scores, type=pa.float32())
+    }))
+    conn.execute('CREATE OR REPLACE TEMP TABLE similarity_batch AS SELECT * FROM similarity_batch_arrow')
+    conn.unregister('similarity_batch_arrow')
+    conn.execute('''
+        UPDATE location_comparison
+        SET sentence_similarity_score = similarity_batch.sentence_similarity_score
+        FROM similarity_batch
+        WHERE location_comparison.duplicateid = similarity_batch.duplicateid
+    ''')
 
 def compare_embeddings(location_db_file):
 
-    # Load model
-    model = SentenceTransformer('all-MiniLM-L6-v2')
     conn = duckdb.connect(database=location_db_file)
     conn.execute('ALTER TABLE location_comparison ADD COLUMN IF NOT EXISTS sentence_similarity_score FLOAT')
 
-    # Query all contentid1 and contentid2 from the location_comparison table
-    content_ids = conn.execute("SELECT contentid1, contentid2 FROM location_comparison lc join locations l on contentid1 = l.contentid where lc.sentence_similarity_score is null").fetchall()
-    # print no of content_ids
-    print(len(content_ids))
-
-    for row in content_ids:
-        content_id1 = row[0]
-        content_id2 = row[1]
-
-        # Query the embeddings of the two content ids
-        tuple1 = conn.execute('SELECT embedding FROM locations WHERE contentid = ?', (content_id1,)).fetchone()
-        tuple2 = conn.execute('SELECT embedding FROM locations WHERE contentid = ?', (content_id2,)).fetchone()
-        if tuple1 is not None and tuple2 is not None:
-            embedding1 = tuple1[0]
-            embedding2 = tuple2[0]
-
-            if isinstance(embedding1, str):
-                embedding1 = json.loads(embedding1)
-            if isinstance(embedding2, str):
-                embedding2 = json.loads(embedding2)
-
-            # Calculate the similarity score
-            if embedding1 is not None and embedding2 is not None:
-                # embedding1 = json.loads(embedding1)
-                # embedding2 = json.loads(embedding2)
-                
-                if embedding1 and embedding2:  # Check if embeddings are not empty
-                    similarity_score = util.cos_sim(embedding1, embedding2).item()
-                else:
-                    similarity_score = 0.0  # Set similarity score to 0 if embeddings are empty
-                
-                # Update the table with the similarity score
-                if content_id1 is not None and content_id2 is not None:
-                    conn.execute('''
-                        UPDATE location_comparison
-                        SET sentence_similarity_score = ?
-                        WHERE contentid1 = ? AND contentid2 = ?
-                    ''', (similarity_score, content_id1, content_id2))
+    # Query all pending pairs from the location_comparison table
+    pairs = conn.execute('''
+        SELECT lc.duplicateid, CAST(lc.contentid1 AS VARCHAR) AS contentid1, CAST(lc.contentid2 AS VARCHAR) AS contentid2
+        FROM location_comparison lc
+        JOIN locations l ON lc.contentid1 = l.contentid
+        WHERE lc.sentence_similarity_score IS NULL
+    ''').fetchdf()
+    # print no of pairs
+    print(len(pairs))
+
+    # Load every embedding referenced by a pending pair once, as a single normalized matrix
+    contentids, embeddings = fetch_embeddings(conn, '''
+        SELECT contentid, embedding FROM locations
+        WHERE embedding IS NOT NULL
+        AND contentid IN (
+            SELECT contentid1 FROM location_comparison WHERE sentence_similarity_score IS NULL
+            UNION
+            SELECT contentid2 FROM location_comparison WHERE sentence_similarity_score IS NULL
+        )
+    ''')
+    embeddings = normalize_rows(embeddings)
+    print(f"Loaded {len(contentids)} embeddings")
+
+    # Pairs where either side has no embedding are left unscored
+    index = pd.Index(contentids)
+    rows1 = index.get_indexer(pairs['contentid1'])
+    rows2 = index.get_indexer(pairs['contentid2'])
+    scorable = (rows1 >= 0) & (rows2 >= 0)
+    duplicateids = pairs['duplicateid'].to_numpy()[scorable]
+    rows1 = rows1[scorable]
+    rows2 = rows2[scorable]
+
+    started = time.perf_counter()
+    for start in range(0, len(duplicateids), PAIR_CHUNK_SIZE):
+        end = start + PAIR_CHUNK_SIZE
+        # Row-wise dot product of unit vectors is the cosine similarity of each pair
+        scores = np.einsum('ij,ij->i', embeddings[rows1[start:end]], embeddings[rows2[start:end]])
+        write_similarity_scores(conn, duplicateids[start:end].tolist(), scores)
+        scored = min(end, len(duplicateids))
+        print(f"Scored {scored}/{len(duplicateids)} pairs at {scored / (time.perf_counter() - started):.1f} pairs/sec")
 
     # Close the connection
     conn.close()
-compare_embeddings('data/locations.db')
\ No newline at end of file
+
+if __name__ == "__main__":
+    compare_embeddings(DATABASE_PATH)
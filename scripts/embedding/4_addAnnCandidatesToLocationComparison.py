@@ -0,0 +1,92 @@
+import duckdb
+import os
+import time
+import pyarrow as pa
+from description_ann_index import ANN_INDEX_PATH, DescriptionAnnIndex
+
+# Build (or load) the HNSW index over description embeddings and add semantically similar, nearby locations
+# to location_comparison as duplicate candidates, including pairs that fall in different h3_index_8 cells
+# input: location db file with locations.embedding populated by 2_addDescriptionEmbeddingsToLocationDescription.py
+# output: new location_comparison rows scored the same way as sql/4_insert_into_location_comparison.sql
+DATABASE_PATH = 'data/locations.db'
+ANN_TOP_K = int(os.getenv("ANN_TOP_K", 10))  # Neighbours considered per location
+ANN_MAX_DISTANCE_M = float(os.getenv("ANN_MAX_DISTANCE_M", 200))  # Candidates further apart than this are dropped
+ANN_MIN_SIMILARITY = float(os.getenv("ANN_MIN_SIMILARITY", 0.6))  # Minimum description cosine similarity for a candidate
+REBUILD_ANN_INDEX = os.environ.get("REBUILD_ANN_INDEX") == 'true'  # A saved index is also rebuilt when the locations changed since
+
+def insert_ann_candidates(db_file_path):
+    conn = duckdb.connect(database=db_file_path)
+
+    started = time.perf_counter()
+    index = None
+    if not REBUILD_ANN_INDEX and os.path.exists(ANN_INDEX_PATH):
+        index = DescriptionAnnIndex.load(ANN_INDEX_PATH)
+        # Locations, embeddings or coordinates changed since the index was saved
+        if index.is_stale(conn):
+            print(f"ANN index at {ANN_INDEX_PATH} is out of date with the locations table, rebuilding it")
+            index = None
+        else:
+            print(f"Loaded ANN index over {len(index)} embeddings from {ANN_INDEX_PATH}")
+    if index is None:
+        started = time.perf_counter()
+        index = DescriptionAnnIndex.build(conn)
+        index.save(ANN_INDEX_PATH)
+        print(f"Built ANN index over {len(index)} embeddings in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    contentids1, contentids2, similarity, _ = index.candidate_pairs(k=ANN_TOP_K, max_distance_m=ANN_MAX_DISTANCE_M, min_similarity=ANN_MIN_SIMILARITY)
+    print(f"Found {len(contentids1)} candidate pairs in {time.perf_counter() - started:.1f}s")
+
+    conn.register('ann_candidate_pairs_arrow', pa.table({
+        "contentid1": pa.array(contentids1.tolist(), type=pa.string()),
+        "contentid2": pa.array(contentids2.tolist(), type=pa.string()),
+        "sentence_similarity_score": pa.array(similarity, type=pa.float32())
+    }))
+    conn.execute('CREATE OR REPLACE TEMP TABLE ann_candidate_pairs AS SELECT * FROM ann_candidate_pairs_arrow')
+    conn.unregister('ann_candidate_pairs_arrow')
+
+    # Same columns and scores as sql/4_insert_into_location_comparison.sql, pairs already compared are skipped
+    conn.execute('INSTALL spatial; LOAD spatial;')
+    conn.execute('ALTER TABLE location_comparison ADD COLUMN IF NOT EXISTS sentence_similarity_score FLOAT')
+    inserted = conn.execute('''
+        INSERT INTO location_comparison (
+            duplicateid,
+            contentid1,
+            contentid2,
+            titles,
+            h3_index_8_1,
+            point1,
+            point2,
+            descriptions,
+            similarity_score,
+            similarity_score_2,
+            distance_in_meters,
+            sentence_similarity_score
+        )
+        SELECT Concat(l1.contentid, l2.contentid) AS duplicateid,
+            l1.contentid AS contentid1,
+            l2.contentid AS contentid2,
+            ARRAY [l1.title, l2.title] AS titles,
+            l1.h3_index_8 AS h3_index_8_1,
+            ARRAY [l1.latitude, l1.longitude] AS point1,
+            ARRAY [l2.latitude, l2.longitude] AS point2,
+            ARRAY [l1.description, l2.description] AS descriptions,
+            jaro_winkler_similarity(l1.title, l2.title) AS similarity_score,
+            damerau_levenshtein(l1.title, l2.title) AS similarity_score_2,
+            ST_DISTANCE_SPHEROID(
+                ST_POINT(l1.latitude, l1.longitude),
+                ST_POINT(l2.latitude, l2.longitude)
+            ) AS distance_in_meters,
+            p.sentence_similarity_score
+        FROM ann_candidate_pairs p
+        JOIN locations l1 ON CAST(l1.contentid AS VARCHAR) = p.contentid1
+        JOIN locations l2 ON CAST(l2.contentid AS VARCHAR) = p.contentid2
+        LEFT JOIN location_comparison lc ON Concat(l1.contentid, l2.contentid) = lc.duplicateid
+        WHERE lc.duplicateid IS NULL
+    ''').fetchone()[0]
+    print(f"Number of ANN candidate pairs newly inserted into location_comparison: {inserted}")
+
+    conn.close()
+
+if __name__ == "__main__":
+    insert_ann_candidates(DATABASE_PATH)
@@ -0,0 +1,125 @@
+import hnswlib
+import numpy as np
+from embedding_store import EMBEDDING_DIM, fetch_embeddings, normalize_rows
+
+# Approximate nearest neighbour (HNSW) index over locations.embedding, built locally on CPU with hnswlib.
+# Queries cost O(log n) instead of comparing every location inside an h3 cell, and are not bounded by cell borders.
+EARTH_RADIUS_M = 6371008.8
+ANN_INDEX_PATH = 'data/description_ann.hnsw'
+ANN_OVERSAMPLE = 4  # Neighbours fetched per requested result before the distance filter is applied
+INDEXED_LOCATIONS = "embedding IS NOT NULL AND latitude IS NOT NULL AND longitude IS NOT NULL"
+
+# Great circle distance in meters between coordinate arrays
+def haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+# Row count, highest contentid and an order independent checksum of the indexed rows, a saved index whose fingerprint
+# differs from the current one was built from other embeddings or coordinates and has to be rebuilt
+def locations_fingerprint(conn):
+    count, max_contentid, checksum = conn.execute(f'''
+        SELECT count(*), CAST(max(contentid) AS VARCHAR), bit_xor(hash(contentid, embedding, latitude, longitude))
+        FROM locations
+        WHERE {INDEXED_LOCATIONS}
+    ''').fetchone()
+    return f"{count}:{max_contentid}:{checksum}"
+
+class DescriptionAnnIndex:
+    def __init__(self, index, contentids, latitudes, longitudes, ef_search=128, fingerprint=None):
+        self.index = index
+        self.ef_search = ef_search
+        self.fingerprint = fingerprint
+        self.contentids = np.asarray(contentids)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.positions = {contentid: position for position, contentid in enumerate(self.contentids)}
+
+    # Build the index from every location that has an embedding and coordinates
+    @classmethod
+    def build(cls, conn, m=16, ef_construction=200, ef_search=128, num_threads=-1):
+        fingerprint = locations_fingerprint(conn)
+        contentids, embeddings = fetch_embeddings(conn, f'''
+            SELECT contentid, embedding FROM locations
+            WHERE {INDEXED_LOCATIONS}
+            ORDER BY contentid
+        ''')
+        coordinates = conn.execute(f'''
+            SELECT latitude, longitude FROM locations
+            WHERE {INDEXED_LOCATIONS}
+            ORDER BY contentid
+        ''').fetchnumpy()
+        index = hnswlib.Index(space='cosine', dim=EMBEDDING_DIM)
+        index.init_index(max_elements=max(len(contentids), 1), ef_construction=ef_construction, M=m)
+        if contentids:
+            index.add_items(normalize_rows(embeddings), np.arange(len(contentids)), num_threads=num_threads)
+        return cls(index, contentids, coordinates['latitude'], coordinates['longitude'], ef_search, fingerprint)
+
+    def save(self, path=ANN_INDEX_PATH):
+        self.index.save_index(path)
+        np.savez(f"{path}.npz", contentids=self.contentids, latitudes=self.latitudes, longitudes=self.longitudes, fingerprint=self.fingerprint or "")
+
+    @classmethod
+    def load(cls, path=ANN_INDEX_PATH, ef_search=128):
+        sidecar = np.load(f"{path}.npz")
+        index = hnswlib.Index(space='cosine', dim=EMBEDDING_DIM)
+        index.load_index(path, max_elements=len(sidecar['contentids']))
+        # Sidecars saved before fingerprints were stored never match, so those indexes are rebuilt once
+        fingerprint = str(sidecar['fingerprint']) if 'fingerprint' in sidecar else None
+        return cls(index, sidecar['contentids'], sidecar['latitudes'], sidecar['longitudes'], ef_search, fingerprint or None)
+
+    def is_stale(self, conn):
+        return self.fingerprint != locations_fingerprint(conn)
+
+    # hnswlib needs ef >= k to return k neighbours per query
+    def _query(self, vectors, k, num_threads=-1):
+        self.index.set_ef(max(self.ef_search, k))
+        return self.index.knn_query(vectors, k=k, num_threads=num_threads)
+
+    def __len__(self):
+        return len(self.contentids)
+
+    # Return up to k (contentid, cosine similarity, distance in meters) tuples most similar to the given location,
+    # optionally limited to locations within max_distance_m of it. The distance filter only sees the (k + 1) *
+    # ANN_OVERSAMPLE nearest descriptions, so fewer than k results come back when most of them are far away, widening
+    # the search until k were found would end up scanning the whole index for isolated locations.
+    def top_k_similar(self, contentid, k=10, max_distance_m=None):
+        position = self.positions.get(contentid)
+        if position is None or len(self) < 2:
+            return []
+        vector = self.index.get_items([position], return_type='numpy')
+        fetch = min(len(self), (k + 1) * (ANN_OVERSAMPLE if max_distance_m is not None else 1))
+        labels, distances = self._query(vector, fetch)
+        labels, distances = labels[0], distances[0]
+        keep = labels != position
+        labels, distances = labels[keep], distances[keep]
+        meters = haversine_m(self.latitudes[position], self.longitudes[position], self.latitudes[labels], self.longitudes[labels])
+        if max_distance_m is not None:
+            within = meters <= max_distance_m
+            labels, distances, meters = labels[within], distances[within], meters[within]
+        return [(str(self.contentids[label]), 1.0 - float(distance), float(meter)) for label, distance, meter in zip(labels[:k], distances[:k], meters[:k])]
+
+    # Query every indexed location in one batch and return candidate pairs as arrays
+    # (contentid1, contentid2, cosine similarity, distance in meters) with contentid1 < contentid2 and no repeats
+    def candidate_pairs(self, k=10, max_distance_m=None, min_similarity=0.0, num_threads=-1):
+        if len(self) < 2:
+            empty = np.array([], dtype=self.contentids.dtype)
+            return empty, empty, np.array([], dtype=np.float32), np.array([], dtype=np.float64)
+        fetch = min(len(self), (k + 1) * (ANN_OVERSAMPLE if max_distance_m is not None else 1))
+        vectors = self.index.get_items(np.arange(len(self)), return_type='numpy')
+        labels, distances = self._query(vectors, fetch, num_threads)
+        left = np.repeat(np.arange(len(self)), fetch)
+        right = labels.reshape(-1).astype(np.int64)
+        similarity = 1.0 - distances.reshape(-1)
+        keep = (left != right) & (similarity >= min_similarity)
+        left, right, similarity = left[keep], right[keep], similarity[keep]
+        meters = haversine_m(self.latitudes[left], self.longitudes[left], self.latitudes[right], self.longitudes[right])
+        if max_distance_m is not None:
+            within = meters <= max_distance_m
+            left, right, similarity, meters = left[within], right[within], similarity[within], meters[within]
+        # contentids are sorted at build time, so ordering positions orders the contentids
+        first = np.minimum(left, right)
+        second = np.maximum(left, right)
+        _, unique = np.unique(first * len(self) + second, return_index=True)
+        first, second, similarity, meters = first[unique], second[unique], similarity[unique], meters[unique]
+        return self.contentids[first], self.contentids[second], similarity, meters
@@ -0,0 +1,41 @@
+import hashlib
+import pyarrow as pa
+from embedding_store import EMBEDDING_TYPE, arrow_embeddings_to_numpy, embeddings_to_arrow
+
+# Persistent cache of description embeddings keyed by a hash of the model name and the preprocessed description.
+# It lives in its own table so it survives the locations table being dropped and re-seeded.
+
+# Hash of the model name plus preprocessed text, a different model or changed description gets a new key
+def description_hash(model_name, preprocessed_description):
+    return hashlib.sha256(f"{model_name}\n{preprocessed_description}".encode('utf-8')).hexdigest()
+
+def ensure_embedding_cache_table(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            content_hash TEXT PRIMARY KEY,
+            model_name TEXT,
+            embedding {EMBEDDING_TYPE},
+            created_at TIMESTAMP DEFAULT current_timestamp
+        )
+    ''')
+
+# Look up a list of hashes and return the ones found together with their embedding matrix in the same order
+def lookup_cached_embeddings(conn, hashes):
+    conn.register('embedding_cache_lookup', pa.table({"content_hash": pa.array(hashes, type=pa.string())}))
+    table = conn.execute('''
+        SELECT ec.content_hash, ec.embedding
+        FROM embedding_cache ec
+        JOIN embedding_cache_lookup lookup ON ec.content_hash = lookup.content_hash
+    ''').fetch_arrow_table()
+    conn.unregister('embedding_cache_lookup')
+    return table.column(0).to_pylist(), arrow_embeddings_to_numpy(table.column(1))
+
+# Store freshly encoded embeddings, hashes already present are left untouched
+def store_cached_embeddings(conn, model_name, hashes, embeddings):
+    conn.register('embedding_cache_batch', embeddings_to_arrow(hashes, embeddings, key_column='content_hash'))
+    conn.execute(f'''
+        INSERT INTO embedding_cache (content_hash, model_name, embedding)
+        SELECT content_hash, ?, CAST(embedding AS {EMBEDDING_TYPE}) FROM embedding_cache_batch
+        ON CONFLICT (content_hash) DO NOTHING
+    ''', (model_name,))
+    conn.unregister('embedding_cache_batch')
@@ -0,0 +1,71 @@
+import numpy as np
+import pyarrow as pa
+
+# Shared storage helpers for description embeddings kept in locations.embedding as a fixed-width FLOAT[384] array
+# (all-MiniLM-L6-v2 produces 384 dimensional vectors)
+EMBEDDING_DIM = 384
+EMBEDDING_TYPE = f'FLOAT[{EMBEDDING_DIM}]'
+
+# Return the declared type of a column or None when the column does not exist
+def get_column_type(conn, table_name, column_name):
+    row = conn.execute('''
+        SELECT data_type FROM information_schema.columns
+        WHERE table_name = ? AND column_name = ?
+    ''', (table_name, column_name)).fetchone()
+    return row[0] if row else None
+
+# Add the embedding column if it doesn't exist, a JSON column left over from older runs has to be migrated first
+def ensure_embedding_column(conn):
+    column_type = get_column_type(conn, 'locations', 'embedding')
+    if column_type is None:
+        conn.execute(f'ALTER TABLE locations ADD COLUMN embedding {EMBEDDING_TYPE}')
+    elif column_type != EMBEDDING_TYPE:
+        raise ValueError(f"locations.embedding is {column_type}, run 1_migrateJsonEmbeddingsToFloatArray.py first")
+
+# Turn an arrow FLOAT[384] column into a (rows, 384) float32 matrix, the flattened values are viewed without a copy when
+# the column has no nulls. flatten skips null embeddings, so with nulls the values are scattered into their rows and the
+# null rows stay zero, keeping the matrix aligned with the other columns of the query.
+def arrow_embeddings_to_numpy(column):
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if len(column) == 0:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    if column.null_count == 0:
+        return column.flatten().to_numpy(zero_copy_only=True).reshape(-1, EMBEDDING_DIM)
+    embeddings = np.zeros((len(column), EMBEDDING_DIM), dtype=np.float32)
+    valid = column.is_valid().to_numpy(zero_copy_only=False)
+    embeddings[valid] = column.flatten().to_numpy(zero_copy_only=False).reshape(-1, EMBEDDING_DIM)
+    return embeddings
+
+# Run a query returning (contentid, embedding) and hand back the contentids as strings together with the embedding matrix
+def fetch_embeddings(conn, query, params=None):
+    table = conn.execute(query, params or []).fetch_arrow_table()
+    contentids = [str(contentid) for contentid in table.column(0).to_pylist()]
+    return contentids, arrow_embeddings_to_numpy(table.column(1))
+
+# Build an arrow table of string keys (contentids by default) and FLOAT[384] embeddings that DuckDB can scan directly
+def embeddings_to_arrow(keys, embeddings, key_column='contentid'):
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    values = pa.array(embeddings.reshape(-1))
+    return pa.table({
+        key_column: pa.array(keys, type=pa.string()),
+        "embedding": pa.FixedSizeListArray.from_arrays(values, EMBEDDING_DIM)
+    })
+
+# Write embeddings back with one statement: load them into a temp table and join it against locations
+def write_embeddings(conn, contentids, embeddings):
+    conn.register('embedding_batch_arrow', embeddings_to_arrow(contentids, embeddings))
+    conn.execute(f'CREATE OR REPLACE TEMP TABLE embedding_batch AS SELECT contentid, CAST(embedding AS {EMBEDDING_TYPE}) AS embedding FROM embedding_batch_arrow')
+    conn.unregister('embedding_batch_arrow')
+    conn.execute('''
+        UPDATE locations
+        SET embedding = embedding_batch.embedding
+        FROM embedding_batch
+        WHERE CAST(locations.contentid AS VARCHAR) = embedding_batch.contentid
+    ''')
+
+# Scale every row to unit length so cosine similarity becomes a plain dot product, zero rows stay zero
+def normalize_rows(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
@@ -0,0 +1,91 @@
+import json
+import pandas as pd
+
+# Normalization of Google address_components in two vectorized steps: explode every component into a long
+# (row, position, type, long_text, short_text) frame, then pivot it into one column per component type.
+# Handles both the Places v1 (longText / shortText) and the Geocoding API (long_name / short_name) key styles, so
+# the stored place_address_components and fresh geocoding results go through the same code.
+LOCATIONS_ADDRESS_COMPONENTS_TABLE = 'locations_address_components'
+ADDRESS_COMPONENT_TYPES = [
+    "street_number",
+    "route",
+    "neighborhood",
+    "sublocality_level_1",
+    "administrative_area_level_2",
+    "administrative_area_level_1",
+    "colloquial_area",
+    "sublocality",
+    "natural_feature",
+    "airport",
+    "park",
+    "premise",
+    "subpremise",
+    "landmark",
+    "postal_town",
+    "administrative_area_level_3",
+    "administrative_area_level_4",
+    "administrative_area_level_5",
+    "administrative_area_level_6",
+    "room",
+    "floor",
+    "street_address",
+    "intersection",
+    "bus_station",
+    "train_station",
+    "transit_station",
+    "country",
+    "postal_code",
+    "locality",
+    "point_of_interest"
+]
+LONG_FORM_COLUMNS = ["row", "position", "type", "long_text", "short_text"]
+
+# One row per (component, type) of each input, row is the position of the input list. Inputs may be lists or JSON
+# strings, anything else counts as no components.
+def explode_address_components(address_components_lists):
+    records = []
+    for row, components in enumerate(address_components_lists):
+        if isinstance(components, str):
+            try:
+                components = json.loads(components)
+            except json.JSONDecodeError:
+                continue
+        if not isinstance(components, list):
+            continue
+        for position, component in enumerate(components):
+            long_text = component.get("longText", component.get("long_name"))
+            short_text = component.get("shortText", component.get("short_name"))
+            records.extend((row, position, component_type, long_text, short_text) for component_type in component.get("types", []))
+    return pd.DataFrame.from_records(records, columns=LONG_FORM_COLUMNS)
+
+# Wide frame with one row per input (in input order) and a column per ADDRESS_COMPONENT_TYPES entry, plus state (the
+# short text of administrative_area_level_1) and formatted_address (the long texts in component order). When a type
+# appears twice the first, most specific, component wins. Missing values are None.
+def pivot_address_components(long_df, row_count):
+    long_df = long_df[long_df["type"].isin(ADDRESS_COMPONENT_TYPES)]
+    first = long_df.drop_duplicates(["row", "type"], keep="first")
+    wide = first.pivot(index="row", columns="type", values="long_text").reindex(index=range(row_count), columns=ADDRESS_COMPONENT_TYPES)
+    state = first[first["type"] == "administrative_area_level_1"].set_index("row")["short_text"]
+    wide["state"] = state.reindex(range(row_count))
+    components = long_df.drop_duplicates(["row", "position"]).dropna(subset=["long_text"])
+    components = components[components["long_text"] != ""].sort_values(["row", "position"])
+    separated = (components["long_text"].astype(object) + ", ").groupby(components["row"]).sum()
+    wide["formatted_address"] = separated.str[:-2].reindex(range(row_count))
+    wide.columns.name = None
+    return wide.astype(object).where(wide.notna(), None).reset_index(drop=True)
+
+def normalize_address_components(address_components_lists):
+    address_components_lists = list(address_components_lists)
+    return pivot_address_components(explode_address_components(address_components_lists), len(address_components_lists))
+
+# Normalize the address components of every location and replace locations_address_components in one statement,
+# optionally exporting the table to Parquet as well
+def save_address_components(conn, contentids, address_components_lists, parquet_path=None, table_name=LOCATIONS_ADDRESS_COMPONENTS_TABLE):
+    wide = normalize_address_components(address_components_lists)
+    wide.insert(0, "contentid", [str(contentid) for contentid in contentids])
+    conn.register('address_components_frame', wide.astype("string"))
+    conn.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM address_components_frame")
+    conn.unregister('address_components_frame')
+    if parquet_path:
+        conn.execute(f"COPY {table_name} TO '{parquet_path}' (FORMAT PARQUET)")
+    return len(wide)
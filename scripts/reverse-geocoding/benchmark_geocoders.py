@@ -0,0 +1,141 @@
+import contextlib
+import importlib.util
+import io
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from mock_maps_server import start_mock_server
+
+# Benchmark of the reverse-geocode.py request paths against mock_maps_server.py. Every mode runs over the same
+# synthetic NYC locations with an empty response cache and reports requests/sec, p50/p99 request latency and quota
+# efficiency (locations resolved per billable request, throttled, failed and INVALID_REQUEST page-token requests are not billed).
+# Fault injection and latency come from the MOCK_* settings of the mock server.
+BENCHMARK_LOCATIONS = int(os.getenv("BENCHMARK_LOCATIONS", 500))
+BENCHMARK_OSM_LOCATIONS = int(os.getenv("BENCHMARK_OSM_LOCATIONS", 50))
+BENCHMARK_CLUSTERS = int(os.getenv("BENCHMARK_CLUSTERS", 60))  # Locations are drawn around this many centres
+BENCHMARK_COALESCE_RESOLUTION = int(os.getenv("BENCHMARK_COALESCE_RESOLUTION", 9))
+BENCHMARK_MODES = os.getenv("BENCHMARK_MODES", "geocode,geocode_coalesced,geocode_cached,place_id,place_details,osm").split(",")
+BENCHMARK_SEED = int(os.getenv("BENCHMARK_SEED", 7))
+NYC_BBOX = (-74.26, 40.49, -73.70, 40.92)
+REVERSE_GEOCODE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reverse-geocode.py")
+
+# Load reverse-geocode.py as a module with every base URL pointed at the mock server and a throwaway response cache
+def load_reverse_geocode(base_url, cache_path):
+    os.environ["GOOGLE_MAPS_BASE_URL"] = base_url
+    os.environ["GOOGLE_PLACES_BASE_URL"] = base_url
+    os.environ["NOMINATIM_BASE_URL"] = base_url
+    os.environ["API_CACHE_PATH"] = cache_path
+    os.environ["GM_SAVI"] = "mock-key"
+    os.environ.setdefault("NOMINATIM_QPS", "50")
+    spec = importlib.util.spec_from_file_location("reverse_geocode", REVERSE_GEOCODE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# (lat, lng, contentid) tuples clustered around random NYC centres, so coalescing has neighbours to merge
+def synthetic_locations(count, clusters, seed):
+    rng = np.random.default_rng(seed)
+    min_lng, min_lat, max_lng, max_lat = NYC_BBOX
+    centres = np.column_stack([rng.uniform(min_lat, max_lat, clusters), rng.uniform(min_lng, max_lng, clusters)])
+    picks = centres[rng.integers(0, clusters, count)] + rng.normal(0, 0.0005, (count, 2))
+    return [(float(lat), float(lng), f"benchmark-{index}") for index, (lat, lng) in enumerate(picks)]
+
+# Wraps engine.get_json to record the latency of every logical request, retries and backoff included
+class LatencyRecorder:
+    def __init__(self, *engines):
+        self.lock = threading.Lock()
+        self.latencies = []
+        for engine in engines:
+            engine.get_json = self.timed(engine.get_json)
+
+    def timed(self, get_json):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return get_json(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.latencies.append(time.perf_counter() - started)
+        return wrapper
+
+    def reset(self):
+        with self.lock:
+            self.latencies = []
+
+def run_geocode(rg, locations):
+    return sum(result is not None for result in rg.geocode_batch(locations))
+
+def run_geocode_coalesced(rg, locations):
+    representatives, members = rg.coalesce_by_h3_cell(locations, BENCHMARK_COALESCE_RESOLUTION)
+    results = rg.geocode_batch(representatives)
+    return sum(len(members[key]) for (_, _, key), result in zip(representatives, results) if result is not None)
+
+def run_place_id(rg, locations):
+    return sum(place_id is not None for place_id in rg.google_engine.map(lambda location: rg.get_place_id(f"Place {location[2]}", *location), locations))
+
+def run_place_details(rg, locations):
+    return sum(details is not None for details in rg.google_engine.map(lambda location: rg.get_place_details(f"mock-{location[2]}"), locations))
+
+def run_osm(rg, locations):
+    results = rg.nominatim_engine.map(lambda location: rg.get_place_details_os(location[2], location[0], location[1]), locations[:BENCHMARK_OSM_LOCATIONS])
+    return sum("error" not in result for result in results)
+
+MODES = {
+    "geocode": run_geocode,
+    "geocode_coalesced": run_geocode_coalesced,
+    "geocode_cached": run_geocode,  # Second pass over a warm cache
+    "place_id": run_place_id,
+    "place_details": run_place_details,
+    "osm": run_osm
+}
+
+def benchmark_mode(rg, server, recorder, mode, locations):
+    rg.api_cache.conn.execute("DELETE FROM api_response_cache")
+    if mode == "geocode_cached":
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_geocode(rg, locations)
+    server.reset_stats()
+    recorder.reset()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resolved = MODES[mode](rg, locations)
+    elapsed = time.perf_counter() - started
+    stats = dict(server.stats)
+    latencies = np.array(recorder.latencies) * 1000
+    return {
+        "mode": mode,
+        "locations": BENCHMARK_OSM_LOCATIONS if mode == "osm" else len(locations),
+        "resolved": resolved,
+        "requests": stats["requests"],
+        "billable": stats["ok"],
+        "throttled": stats["over_query_limit"],
+        "errors": stats["server_errors"],
+        "seconds": elapsed,
+        "requests_per_sec": stats["requests"] / elapsed if elapsed else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        "locations_per_billable_request": resolved / stats["ok"] if stats["ok"] else (float("inf") if resolved else 0.0)
+    }
+
+def print_report(rows):
+    print(f"{'mode':<18} {'locations':>9} {'resolved':>8} {'requests':>8} {'billable':>8} {'throttled':>9} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'loc/billable':>12}")
+    for row in rows:
+        print(f"{row['mode']:<18} {row['locations']:>9} {row['resolved']:>8} {row['requests']:>8} {row['billable']:>8} {row['throttled']:>9} {row['errors']:>6} "
+              f"{row['requests_per_sec']:>8.1f} {row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['locations_per_billable_request']:>12.2f}")
+
+if __name__ == "__main__":
+    server, base_url = start_mock_server(port=0, seed=BENCHMARK_SEED)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        rg = load_reverse_geocode(base_url, os.path.join(cache_dir, "api_cache.db"))
+        recorder = LatencyRecorder(rg.google_engine, rg.nominatim_engine)
+        locations = synthetic_locations(BENCHMARK_LOCATIONS, BENCHMARK_CLUSTERS, BENCHMARK_SEED)
+        print(f"Benchmarking {', '.join(BENCHMARK_MODES)} over {len(locations)} locations against {base_url} "
+              f"(concurrency {rg.GEOCODING_CONCURRENCY}, {rg.GEOCODING_QPS} qps)")
+        rows = [benchmark_mode(rg, server, recorder, mode.strip(), locations) for mode in BENCHMARK_MODES if mode.strip()]
+        print_report(rows)
+        rg.api_cache.close()
+        rg.google_engine.close()
+        rg.nominatim_engine.close()
+    server.shutdown()
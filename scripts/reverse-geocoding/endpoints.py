@@ -0,0 +1,14 @@
+import os
+
+# Base URLs of the map APIs the geocoding scripts call. Point them at mock_maps_server.py (or any other stand-in) to
+# run the scripts offline, e.g. GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8765 for every Google Maps web service.
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com").rstrip("/")
+GOOGLE_PLACES_BASE_URL = os.getenv("GOOGLE_PLACES_BASE_URL", "https://places.googleapis.com").rstrip("/")
+NOMINATIM_BASE_URL = os.getenv("NOMINATIM_BASE_URL", "https://nominatim.openstreetmap.org").rstrip("/")
+
+GOOGLE_GEOCODE_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/geocode/json"
+GOOGLE_FIND_PLACE_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/findplacefromtext/json"
+GOOGLE_NEARBY_SEARCH_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/nearbysearch/json"
+GOOGLE_TEXT_SEARCH_URL = f"{GOOGLE_MAPS_BASE_URL}/maps/api/place/textsearch/json"
+GOOGLE_PLACE_DETAILS_URL = f"{GOOGLE_PLACES_BASE_URL}/v1/places"
+NOMINATIM_REVERSE_URL = f"{NOMINATIM_BASE_URL}/reverse"
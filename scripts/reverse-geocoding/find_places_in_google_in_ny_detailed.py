@@ -5,6 +5,8 @@ from dotenv import load_dotenv
 import duckdb
 import time
 import geopy.distance
+from google_poi_store import ensure_google_poi_table, upsert_places
+from endpoints import GOOGLE_NEARBY_SEARCH_URL
 load_dotenv()
 import os
 
@@ -181,7 +183,7 @@ PLACE_TYPES = ["tourist_attraction", "museum", "park", "point_of_interest"]
 # SHOPPING_PLACES = ["shopping mall", "shopping center", "shopping district", "shopping street", "shopping plaza", "shopping village", "shopping complex", "shopping arcade", "shopping gallery", "shopping square"]
 
 # Google Places API URL
-PLACES_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+PLACES_URL = GOOGLE_NEARBY_SEARCH_URL
 
 def get_places_for_location(lat, lng, radius=1000):
     """
@@ -195,6 +197,7 @@ def get_places_for_location(lat, lng, radius=1000):
     all_places = []
     place_types = []
     con = duckdb.connect('data/locations.db')
+    ensure_google_poi_table(con)
     # place_types.append(HISTORIC_PLACES)
     # place_types.append(ART_PLACES)
     # place_types.append(GARDEN_PLACES_ESSENTIAL)
@@ -242,11 +245,9 @@ def get_places_for_location(lat, lng, radius=1000):
                         "user_ratings_total": place.get("user_ratings_total"),
                         "types": place.get("types")
                     }
-                    print("Inserting into db")
-                    con.execute("ALTER TABLE google_poi ADD COLUMN IF NOT EXISTS place_id STRING")
-                    con.execute("INSERT INTO google_poi VALUES (?, ?, ?, ?)",
-                                    (json.dumps(place), lat, lng, place.get("place_id")))
                     all_places.append(place_info)
+                print("Inserting into db")
+                upsert_places(con, data["results"])
 
             # Handle pagination
             next_page_token = data.get("next_page_token")
@@ -254,11 +255,8 @@ def get_places_for_location(lat, lng, radius=1000):
                 break  # No more pages, exit loop
 
             print("Fetching next page... with token", next_page_token)
-            data_count = con.execute("select count(*) from google_poi").fetchall()
-            count_places = [row[0] for row in data_count]
-            unique_data_count = con.execute("select count(distinct place_id) from google_poi").fetchall()
-            unique_places = [row[0] for row in unique_data_count]
-            print(f"So far inserted into google_poi - {count_places} and unique - {unique_places}")
+            unique_places = con.execute("select count(*) from google_poi").fetchone()[0]
+            print(f"So far stored in google_poi - {unique_places} unique places")
             time.sleep(2)  # Delay to avoid quota issues
             params["pagetoken"] = next_page_token
     con.close()
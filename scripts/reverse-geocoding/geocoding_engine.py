@@ -0,0 +1,102 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Thread-pool HTTP engine for the geocoding scripts: a bounded number of requests in flight, a token bucket that keeps
+# the request rate at the API quota, one shared keep-alive session, and jittered exponential backoff per request so a
+# throttled or failing request waits on its own instead of stalling the whole batch.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Token bucket shared by every worker thread, acquire() blocks until a request may be sent
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+class RequestEngine:
+    def __init__(self, concurrency=8, qps=50, max_retries=3, max_throttled_retries=8, backoff_base=1.0, backoff_cap=60.0, timeout=30, headers=None):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.max_throttled_retries = max_throttled_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.bucket = TokenBucket(qps)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    def _count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    # Full jitter: sleep a random time up to the exponential backoff for this attempt
+    def _backoff(self, attempt):
+        time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)))
+
+    # GET a url and return the decoded JSON, or None once retries are exhausted. retry_on(data) returning True marks
+    # an API level throttle (e.g. Google's OVER_QUERY_LIMIT status) that is retried with its own larger budget.
+    def get_json(self, url, params=None, headers=None, retry_on=None):
+        errors = 0
+        throttles = 0
+        while True:
+            self.bucket.acquire()
+            self._count("requests")
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                response.raise_for_status()
+                data = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # Client errors other than 429 won't succeed on a retry
+                response = getattr(e, "response", None)
+                retryable = response is None or response.status_code in RETRYABLE_STATUS_CODES
+                if not retryable or errors >= self.max_retries:
+                    print(f"Request error for {url}: {e}")
+                    self._count("failures")
+                    return None
+                errors += 1
+                self._count("retries")
+                self._backoff(errors)
+                continue
+            if retry_on is not None and retry_on(data):
+                if throttles >= self.max_throttled_retries:
+                    print(f"Still throttled after {self.max_throttled_retries} retries for {url}")
+                    self._count("failures")
+                    return None
+                throttles += 1
+                self._count("throttled")
+                self._backoff(throttles)
+                continue
+            return data
+
+    # Run fn over items on the worker pool and return the results in input order
+    def map(self, fn, items):
+        return list(self.executor.map(fn, items))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
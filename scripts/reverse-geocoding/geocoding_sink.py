@@ -0,0 +1,85 @@
+import json
+import pyarrow as pa
+
+# Buffered writer for geocoding results. The target columns are added once when the sink is created, results are
+# collected in memory and each flush writes the whole buffer with one UPDATE ... FROM join against a staging table,
+# so values travel as typed data instead of being quoted into SQL strings.
+GEOCODING_RESULT_COLUMNS = {
+    "formatted_address": "TEXT",
+    "city": "TEXT",
+    "state": "TEXT",
+    "country": "TEXT",
+    "postcode": "TEXT",
+    "neighborhood": "TEXT",
+    "sublocality": "TEXT",
+    "place_id": "TEXT",
+    "plus_code": "TEXT",
+    "is_geo_coded": "BOOLEAN",
+    "complete_result": "JSON"
+}
+ALT_PLACE_COLUMNS = {
+    "alt_place_id": "TEXT",
+    "alt_place_details": "JSON",
+    "is_place_id_same": "BOOLEAN"
+}
+ARROW_TYPES = {"BOOLEAN": pa.bool_(), "DOUBLE": pa.float64(), "INTEGER": pa.int32(), "BIGINT": pa.int64()}
+SINK_FLUSH_SIZE = 500
+
+class LocationResultSink:
+    def __init__(self, conn, columns, table_name='locations', key_column='contentid', flush_size=SINK_FLUSH_SIZE):
+        self.conn = conn
+        self.columns = columns
+        self.table_name = table_name
+        self.key_column = key_column
+        self.flush_size = flush_size
+        self.rows = []
+        self.written = 0
+        for column_name, column_type in columns.items():
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {column_name} {column_type}")
+
+    # Buffer one result, columns left out (or None) keep their current value.
+    # With flush_size=None nothing is written until flush() is called, e.g. inside a work queue transaction.
+    def add(self, key, **values):
+        unknown = set(values) - set(self.columns)
+        if unknown:
+            raise ValueError(f"Unknown result columns: {sorted(unknown)}")
+        self.rows.append((str(key), values))
+        if self.flush_size and len(self.rows) >= self.flush_size:
+            self.flush()
+
+    def _arrow_column(self, column_name, column_type):
+        values = [values.get(column_name) for _, values in self.rows]
+        if column_type == "JSON":
+            values = [json.dumps(value) if value is not None else None for value in values]
+        return pa.array(values, type=ARROW_TYPES.get(column_type, pa.string()))
+
+    # Write the buffered results in one statement and return how many rows were written
+    def flush(self):
+        if not self.rows:
+            return 0
+        # A key buffered twice is written once, later values win
+        merged = {}
+        for key, values in self.rows:
+            merged.setdefault(key, {}).update({name: value for name, value in values.items() if value is not None})
+        self.rows = list(merged.items())
+        batch = pa.table({
+            self.key_column: pa.array([key for key, _ in self.rows], type=pa.string()),
+            **{column_name: self._arrow_column(column_name, column_type) for column_name, column_type in self.columns.items()}
+        })
+        self.conn.register('location_result_batch_arrow', batch)
+        self.conn.execute('CREATE OR REPLACE TEMP TABLE location_result_batch AS SELECT * FROM location_result_batch_arrow')
+        self.conn.unregister('location_result_batch_arrow')
+        assignments = ",\n".join(
+            f"{column_name} = COALESCE(CAST(location_result_batch.{column_name} AS {column_type}), {self.table_name}.{column_name})"
+            for column_name, column_type in self.columns.items()
+        )
+        self.conn.execute(f'''
+            UPDATE {self.table_name}
+            SET {assignments}
+            FROM location_result_batch
+            WHERE CAST({self.table_name}.{self.key_column} AS VARCHAR) = location_result_batch.{self.key_column}
+        ''')
+        flushed = len(self.rows)
+        self.written += flushed
+        self.rows = []
+        return flushed
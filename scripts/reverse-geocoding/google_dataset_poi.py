@@ -1,14 +1,17 @@
 import os
+import sys
 import requests
-import json
 from dotenv import load_dotenv
 import duckdb
 import time
 import folium
 import geopandas as gpd
 import pandas as pd
-from shapely.geometry import shape
 from folium.plugins import MarkerCluster
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from boundary_store import load_nyc_boundary
+from google_poi_store import ensure_google_poi_table, upsert_places
+from endpoints import GOOGLE_TEXT_SEARCH_URL
 load_dotenv()
 # write a method that downloads all the poi data from google apis for new york
 # and saves it to duckdb as a table
@@ -22,15 +25,14 @@ if not API_KEY:
     raise ValueError("Error: API key not found. Please set the GOOGLE_MAPS_API_KEY environment variable.")
 def download_google_poi_data():
     api_key = API_KEY
-    url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+    url = GOOGLE_TEXT_SEARCH_URL
     params = {
         "query": "new+york+tourist+attractions",
         "key": api_key
     }
     headers = {"X-Goog-FieldMask": "*"}
-    place_ids = set()
     conn = duckdb.connect('data/locations.db')
-    conn.execute("CREATE TABLE IF NOT EXISTS google_poi (json_data JSON, lat DOUBLE, lon DOUBLE)")
+    ensure_google_poi_table(conn)
 
     total_calls = 0
     retries = 0
@@ -44,14 +46,7 @@ def download_google_poi_data():
                 response = requests.get(url, params=params, headers=headers)
                 response.raise_for_status()
                 data = response.json()
-                for result in data.get("results", []):
-                    pid = result.get("place_id")
-                    if pid and pid not in place_ids:
-                        place_ids.add(pid)
-                        lat = float(result["geometry"]["location"]["lat"])
-                        lng = float(result["geometry"]["location"]["lng"])
-                        conn.execute("INSERT INTO google_poi VALUES (?, ?, ?)",
-                                     (json.dumps(result), lat, lng))
+                upsert_places(conn, data.get("results", []))
 
                 next_page_token = data.get("next_page_token")
                 total_calls += 1
@@ -129,23 +124,10 @@ def create_h3_map(dataframe, lat_column, lon_column, output_file, add_neighbourh
     # Save the map to an HTML file
     nyc_map.save(output_file)
     print(f"Map saved to {output_file}.")
-def load_nyc_boundary():
-    url = "https://raw.githubusercontent.com/generalpiston/geojson-us-city-boundaries/master/cities/ny/new-york.json"
-    response = requests.get(url)
-    nyc_boundary_geojson = response.json()
-    nyc_boundary = shape(nyc_boundary_geojson['features'][0]['geometry'])
-    return nyc_boundary
 if __name__ == "__main__":
     # download_google_poi_data()
     conn = duckdb.connect('data/locations.db')
-    data = conn.execute("SELECT * FROM google_poi where place_id in (select distinct place_id from google_poi)").fetchall()
+    ensure_google_poi_table(conn)
+    result = conn.execute("SELECT place_id, name, lat, lon FROM google_poi").fetchdf()
     conn.close()
-    result = pd.DataFrame(data, columns=["json_data", "lat", "long", "place_id"])
-    for index, row in result.iterrows():
-        print(row)
-        result.loc[index, "name"] = json.loads(row["json_data"])["name"]
-        result.loc[index, "place_id"] = row["place_id"]
-        result.loc[index, "lat"] = float(json.loads(row["json_data"])["geometry"]["location"]["lat"])
-        result.loc[index, "lon"] = float(json.loads(row["json_data"])["geometry"]["location"]["lng"])
-        print(result.loc[index])
     create_h3_map(result, "lat", "lon", "google_poi.html", add_neighbourhood=True, neighbourhood_boundary=load_nyc_boundary())
\ No newline at end of file
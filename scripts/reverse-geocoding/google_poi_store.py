@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timezone
+import pyarrow as pa
+
+# google_poi keyed on place_id. Name, coordinates and types are typed columns filled at ingest, so readers scan
+# columns instead of decoding json_data. Writes are upserts: a place seen again replaces the stored row only when its
+# payload is at least as fresh. Tables from before the key (json_data, lat, lon[, place_id]) are migrated in place.
+GOOGLE_POI_TABLE = 'google_poi'
+
+def google_poi_has_key(conn):
+    return conn.execute(f'''
+        SELECT count(*) FROM duckdb_constraints()
+        WHERE table_name = '{GOOGLE_POI_TABLE}' AND constraint_type = 'PRIMARY KEY'
+    ''').fetchone()[0] > 0
+
+def create_google_poi_table(conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {GOOGLE_POI_TABLE} (
+            place_id TEXT PRIMARY KEY,
+            name TEXT,
+            lat DOUBLE,
+            lon DOUBLE,
+            types VARCHAR[],
+            json_data JSON,
+            fetched_at TIMESTAMP
+        )
+    ''')
+
+# Create google_poi, or rebuild a legacy one with one row per place_id taken from its json_data. Legacy rows have no
+# fetch time and are stamped with the epoch, so any later fetch replaces them.
+def ensure_google_poi_table(conn):
+    exists = conn.execute(f"SELECT count(*) FROM information_schema.tables WHERE table_name = '{GOOGLE_POI_TABLE}'").fetchone()[0] > 0
+    if exists and google_poi_has_key(conn):
+        return
+    if not exists:
+        create_google_poi_table(conn)
+        return
+    conn.execute(f"ALTER TABLE {GOOGLE_POI_TABLE} RENAME TO {GOOGLE_POI_TABLE}_legacy")
+    create_google_poi_table(conn)
+    migrated = conn.execute(f'''
+        INSERT INTO {GOOGLE_POI_TABLE}
+        SELECT
+            json_data->>'$.place_id',
+            json_data->>'$.name',
+            COALESCE(TRY_CAST(json_data->>'$.geometry.location.lat' AS DOUBLE), lat),
+            COALESCE(TRY_CAST(json_data->>'$.geometry.location.lng' AS DOUBLE), lon),
+            json_extract_string(json_data, '$.types[*]'),
+            json_data,
+            TIMESTAMP '1970-01-01'
+        FROM {GOOGLE_POI_TABLE}_legacy
+        WHERE json_data->>'$.place_id' IS NOT NULL
+        QUALIFY row_number() OVER (PARTITION BY json_data->>'$.place_id') = 1
+    ''').fetchone()[0]
+    conn.execute(f"DROP TABLE {GOOGLE_POI_TABLE}_legacy")
+    print(f"Migrated {migrated} distinct places into the keyed {GOOGLE_POI_TABLE} table")
+
+# Upsert Places API results (textsearch / nearbysearch shape) and return how many rows were inserted or refreshed
+def upsert_places(conn, places, fetched_at=None):
+    fetched_at = fetched_at or datetime.now(timezone.utc).replace(tzinfo=None)
+    # ON CONFLICT can't touch one key twice in a statement, the last copy of a place wins
+    places = list({place["place_id"]: place for place in places if place.get("place_id")}.values())
+    if not places:
+        return 0
+    conn.register('google_poi_batch', pa.table({
+        "place_id": pa.array([place["place_id"] for place in places], type=pa.string()),
+        "name": pa.array([place.get("name") for place in places], type=pa.string()),
+        "lat": pa.array([place.get("geometry", {}).get("location", {}).get("lat") for place in places], type=pa.float64()),
+        "lon": pa.array([place.get("geometry", {}).get("location", {}).get("lng") for place in places], type=pa.float64()),
+        "types": pa.array([place.get("types") for place in places], type=pa.list_(pa.string())),
+        "json_data": pa.array([json.dumps(place) for place in places], type=pa.string())
+    }))
+    upserted = conn.execute(f'''
+        INSERT INTO {GOOGLE_POI_TABLE} (place_id, name, lat, lon, types, json_data, fetched_at)
+        SELECT place_id, name, lat, lon, types, CAST(json_data AS JSON), ? FROM google_poi_batch
+        ON CONFLICT (place_id) DO UPDATE SET
+            name = EXCLUDED.name,
+            lat = EXCLUDED.lat,
+            lon = EXCLUDED.lon,
+            types = EXCLUDED.types,
+            json_data = EXCLUDED.json_data,
+            fetched_at = EXCLUDED.fetched_at
+        WHERE EXCLUDED.fetched_at >= {GOOGLE_POI_TABLE}.fetched_at
+    ''', (fetched_at,)).fetchone()[0]
+    conn.unregister('google_poi_batch')
+    return upserted
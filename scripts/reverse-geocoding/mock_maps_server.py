@@ -0,0 +1,242 @@
+import duckdb
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+from response_cache import normalize_params
+
+# Local stand-in for the Google Maps web services, Places (v1) details and Nominatim reverse geocoding, for running
+# the geocoding scripts offline. Point GOOGLE_MAPS_BASE_URL, GOOGLE_PLACES_BASE_URL and NOMINATIM_BASE_URL at it.
+# Responses are replayed from an api_cache.db when MOCK_REPLAY_CACHE_PATH is set and synthesized deterministically
+# otherwise. Latency, next_page_token pagination, OVER_QUERY_LIMIT and 5xx errors are simulated.
+# GET /__stats returns the request counters, GET /__stats/reset clears them.
+MOCK_MAPS_HOST = os.getenv("MOCK_MAPS_HOST", "127.0.0.1")
+MOCK_MAPS_PORT = int(os.getenv("MOCK_MAPS_PORT", 8765))
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", 50))
+MOCK_LATENCY_JITTER_MS = float(os.getenv("MOCK_LATENCY_JITTER_MS", 20))
+MOCK_OVER_QUERY_LIMIT_RATE = float(os.getenv("MOCK_OVER_QUERY_LIMIT_RATE", 0.0))  # Share of requests throttled
+MOCK_SERVER_ERROR_RATE = float(os.getenv("MOCK_SERVER_ERROR_RATE", 0.0))  # Share of requests answered with a 503
+MOCK_PAGE_TOKEN_DELAY = float(os.getenv("MOCK_PAGE_TOKEN_DELAY", 2))  # Seconds before a next_page_token is valid
+MOCK_RESULTS_PER_SEARCH = int(os.getenv("MOCK_RESULTS_PER_SEARCH", 45))  # Nearby / text search results, max 60
+MOCK_REPLAY_CACHE_PATH = os.getenv("MOCK_REPLAY_CACHE_PATH")
+SEARCH_PAGE_SIZE = 20
+BILLABLE_STATUSES = ("OK", "ZERO_RESULTS")  # Maps web-service body statuses counted as ok
+
+# Recorded responses by (path, normalized params) from the api_response_cache table of a ResponseCache database
+def load_recordings(cache_path):
+    conn = duckdb.connect(cache_path, read_only=True)
+    rows = conn.execute("SELECT endpoint, params, response FROM api_response_cache").fetchall()
+    conn.close()
+    return {recording_key(urlparse(endpoint).path, json.loads(params)): json.loads(response) for endpoint, params, response in rows}
+
+def recording_key(path, params):
+    return path, json.dumps(normalize_params(params), sort_keys=True)
+
+def stable_id(prefix, *parts):
+    return f"{prefix}-{hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:16]}"
+
+def parse_point(value):
+    lat, lng = value.split(":")[-1].split(",")
+    return float(lat), float(lng)
+
+def geocode_response(params):
+    lat, lng = parse_point(params.get("latlng", "0,0"))
+    block = f"{abs(lat):.3f}{abs(lng):.3f}"
+    return {
+        "status": "OK",
+        "results": [{
+            "place_id": stable_id("mock-geocode", f"{lat:.5f}", f"{lng:.5f}"),
+            "formatted_address": f"{int(block[-3:])} Mock Street, New York, NY 10001, USA",
+            "geometry": {"location": {"lat": lat, "lng": lng}},
+            "plus_code": {"global_code": stable_id("87G8", f"{lat:.4f}", f"{lng:.4f}")[-8:]},
+            "address_components": [
+                {"long_name": str(int(block[-3:])), "short_name": str(int(block[-3:])), "types": ["street_number"]},
+                {"long_name": "Mock Street", "short_name": "Mock St", "types": ["route"]},
+                {"long_name": "Midtown", "short_name": "Midtown", "types": ["neighborhood", "political"]},
+                {"long_name": "Manhattan", "short_name": "Manhattan", "types": ["sublocality_level_1", "sublocality", "political"]},
+                {"long_name": "New York", "short_name": "New York", "types": ["locality", "political"]},
+                {"long_name": "New York", "short_name": "NY", "types": ["administrative_area_level_1", "political"]},
+                {"long_name": "United States", "short_name": "US", "types": ["country", "political"]},
+                {"long_name": "10001", "short_name": "10001", "types": ["postal_code"]}
+            ]
+        }]
+    }
+
+def find_place_response(params):
+    name = params.get("input", "")
+    return {"status": "OK", "candidates": [{"place_id": stable_id("mock-place", name, params.get("locationbias", "")), "name": name}]}
+
+def place_details_response(place_id):
+    return {
+        "name": f"places/{place_id}",
+        "id": place_id,
+        "types": ["point_of_interest", "establishment"],
+        "formattedAddress": "1 Mock Street, New York, NY 10001, USA",
+        "addressComponents": [
+            {"longText": "1", "shortText": "1", "types": ["street_number"]},
+            {"longText": "Mock Street", "shortText": "Mock St", "types": ["route"]},
+            {"longText": "New York", "shortText": "New York", "types": ["locality", "political"]},
+            {"longText": "New York", "shortText": "NY", "types": ["administrative_area_level_1", "political"]},
+            {"longText": "10001", "shortText": "10001", "types": ["postal_code"]}
+        ],
+        "location": {"latitude": 40.75, "longitude": -73.99},
+        "displayName": {"text": f"Mock place {place_id[-6:]}", "languageCode": "en"},
+        "rating": 4.2,
+        "userRatingCount": 100,
+        "businessStatus": "OPERATIONAL"
+    }
+
+def search_results(params, count):
+    lat, lng = parse_point(params.get("location", "40.75,-73.99"))
+    seed = params.get("query") or params.get("type") or ""
+    return [{
+        "place_id": stable_id("mock-poi", seed, f"{lat:.4f}", f"{lng:.4f}", index),
+        "name": f"Mock {seed} {index}",
+        "vicinity": "Mock Street, New York",
+        "geometry": {"location": {"lat": lat + (index - count / 2) * 1e-4, "lng": lng}},
+        "types": [params.get("type") or "point_of_interest"],
+        "rating": 4.0
+    } for index in range(count)]
+
+def nominatim_response(params):
+    lat, lng = float(params.get("lat", 0)), float(params.get("lon", 0))
+    return {
+        "place_id": int(stable_id("", f"{lat:.4f}", f"{lng:.4f}")[1:9], 16),
+        "lat": str(lat),
+        "lon": str(lng),
+        "display_name": "Mock Street, Manhattan, New York, 10001, United States",
+        "address": {"road": "Mock Street", "suburb": "Manhattan", "city": "New York", "state": "New York", "postcode": "10001", "country": "United States", "country_code": "us"}
+    }
+
+class MockMapsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=MOCK_LATENCY_MS, jitter_ms=MOCK_LATENCY_JITTER_MS, over_query_limit_rate=MOCK_OVER_QUERY_LIMIT_RATE,
+                 server_error_rate=MOCK_SERVER_ERROR_RATE, page_token_delay=MOCK_PAGE_TOKEN_DELAY, results_per_search=MOCK_RESULTS_PER_SEARCH,
+                 replay_cache_path=MOCK_REPLAY_CACHE_PATH, seed=None):
+        super().__init__(address, MockMapsHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.over_query_limit_rate = over_query_limit_rate
+        self.server_error_rate = server_error_rate
+        self.page_token_delay = page_token_delay
+        self.results_per_search = min(results_per_search, 3 * SEARCH_PAGE_SIZE)
+        self.recordings = load_recordings(replay_cache_path) if replay_cache_path else {}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.page_tokens = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"requests": 0, "ok": 0, "over_query_limit": 0, "server_errors": 0, "invalid_page_tokens": 0, "replayed": 0, "synthesized": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def draw(self):
+        with self.lock:
+            return self.random.random(), self.random.uniform(-1, 1)
+
+    # First page of a search, the rest is parked behind a next_page_token
+    def paginate(self, results):
+        page = {"status": "OK" if results else "ZERO_RESULTS", "results": results[:SEARCH_PAGE_SIZE]}
+        if len(results) > SEARCH_PAGE_SIZE:
+            token = stable_id("mock-token", time.time(), self.random.random())
+            with self.lock:
+                self.page_tokens[token] = (time.monotonic() + self.page_token_delay, results[SEARCH_PAGE_SIZE:])
+            page["next_page_token"] = token
+        return page
+
+    def next_page(self, token):
+        with self.lock:
+            valid_from, results = self.page_tokens.get(token, (None, None))
+            if valid_from is None or time.monotonic() < valid_from:
+                self.stats["invalid_page_tokens"] += 1
+                return {"status": "INVALID_REQUEST", "results": []}
+            del self.page_tokens[token]
+        return self.paginate(results)
+
+    # (HTTP status, body) for a request that passed fault injection
+    def respond(self, path, params):
+        recorded = self.recordings.get(recording_key(path, params))
+        if recorded is not None:
+            self.count("replayed")
+            return 200, recorded
+        self.count("synthesized")
+        if path.endswith("/geocode/json"):
+            return 200, geocode_response(params)
+        if path.endswith("/findplacefromtext/json"):
+            return 200, find_place_response(params)
+        if path.endswith("/nearbysearch/json") or path.endswith("/textsearch/json"):
+            if "pagetoken" in params:
+                return 200, self.next_page(params["pagetoken"])
+            return 200, self.paginate(search_results(params, self.results_per_search))
+        if path.startswith("/v1/places/"):
+            return 200, place_details_response(path.rsplit("/", 1)[-1])
+        if path.endswith("/reverse"):
+            return 200, nominatim_response(params)
+        return 404, {"error": f"No mock for {path}"}
+
+class MockMapsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+        if url.path == "/__stats":
+            return self.send_json(200, server.stats)
+        if url.path == "/__stats/reset":
+            server.reset_stats()
+            return self.send_json(200, server.stats)
+
+        server.count("requests")
+        fault, jitter = server.draw()
+        time.sleep(max(0.0, server.latency_ms + jitter * server.jitter_ms) / 1000)
+        if fault < server.server_error_rate:
+            server.count("server_errors")
+            return self.send_json(503, {"error": "mock server error"})
+        if fault < server.server_error_rate + server.over_query_limit_rate:
+            server.count("over_query_limit")
+            # The Maps web services report throttling in the body, Places v1 and Nominatim with a 429
+            if url.path.startswith("/maps/api/"):
+                return self.send_json(200, {"status": "OVER_QUERY_LIMIT", "results": []})
+            return self.send_json(429, {"error": "rate limited"})
+        status, body = server.respond(url.path, params)
+        # Maps web services answer errors such as an early next_page_token with a 200 and an error status in the body,
+        # only OK and ZERO_RESULTS are billed
+        if status == 200 and (not url.path.startswith("/maps/api/") or body.get("status") in BILLABLE_STATUSES):
+            server.count("ok")
+        self.send_json(status, body)
+
+# Start a server on a background thread and return it with its base URL, port 0 picks a free port
+def start_mock_server(host=MOCK_MAPS_HOST, port=MOCK_MAPS_PORT, **settings):
+    server = MockMapsServer((host, port), **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    server = MockMapsServer((MOCK_MAPS_HOST, MOCK_MAPS_PORT))
+    print(f"Mock maps server on http://{MOCK_MAPS_HOST}:{MOCK_MAPS_PORT}, {len(server.recordings)} recorded responses, latency {MOCK_LATENCY_MS}±{MOCK_LATENCY_JITTER_MS} ms, "
+          f"{MOCK_OVER_QUERY_LIMIT_RATE:.1%} OVER_QUERY_LIMIT, {MOCK_SERVER_ERROR_RATE:.1%} 5xx")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,268 @@
+import os
+import sys
+import threading
+import time
+import duckdb
+import h3
+from dotenv import load_dotenv
+from geocoding_engine import RequestEngine
+from google_poi_store import ensure_google_poi_table, upsert_places
+from find_places_in_google_in_ny_detailed import (
+    AUTOMOTIVE_TYPE, BUSINESS_TYPE, CULTURE_TYPE, EDUCATION_TYPE, ENTERTAINMENT_AND_RECREATION_TYPE, FACILITIES_TYPE,
+    FINANCE_TYPE, FOOD_AND_DRINK_TYPE, GEOGRAPHICAL_AREAS_TYPE, GOVERNMENT_TYPE, HEALTH_AND_WELLNESS_TYPE, HOUSING_TYPE,
+    LODGING_TYPE, NATURAL_FEATURES_TYPE, PLACES_OF_WORSHIP_TYPE, SERVICES_TYPE, SHOPPING_TYPE, SPORTS_TYPE,
+    TRANSPORTATION_TYPE, PLACES_URL
+)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from boundary_store import load_nyc_boundary
+from boundary_h3_index import polyfill_boundary
+load_dotenv()
+
+# Nearby search crawler for google_poi. The boundary is tiled with H3 cells and every (tile, place type) pair is one
+# job searched with the tile's circumscribed radius. Jobs run on the engine's bounded worker pool under one token
+# bucket, and a job whose search hits the 60 result cap of nearby search is replaced by jobs for the tile's children,
+# so dense areas are crawled finer without spending requests on empty ones. Places are upserted into the keyed
+# google_poi table in batches.
+# The jobs are checkpointed in nearby_search_jobs together with every batch of places, and the requests sent per day in
+# nearby_search_requests. A run stops once CRAWL_MAX_REQUESTS or the day's CRAWL_DAILY_REQUEST_BUDGET is spent and
+# the next run resumes from the jobs still pending.
+API_KEY = os.getenv("GM_SAVI")
+DATABASE_PATH = 'data/locations.db'
+CRAWL_H3_RESOLUTION = int(os.getenv("CRAWL_H3_RESOLUTION", 7))  # Planned tile size, res 7 is about 1.2 km across
+CRAWL_MAX_H3_RESOLUTION = int(os.getenv("CRAWL_MAX_H3_RESOLUTION", 10))  # Capped tiles are not split beyond this
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 8))
+CRAWL_QPS = float(os.getenv("CRAWL_QPS", 10))
+NEARBY_SEARCH_RESULT_CAP = 60  # 3 pages of 20, nearby search never returns more
+NEXT_PAGE_TOKEN_DELAY = 2  # Seconds before a next_page_token becomes valid
+POI_INSERT_BATCH_SIZE = 500
+CRAWL_MAX_REQUESTS = int(os.getenv("CRAWL_MAX_REQUESTS", 0))  # Requests one run may send, 0 for no cap
+CRAWL_DAILY_REQUEST_BUDGET = int(os.getenv("CRAWL_DAILY_REQUEST_BUDGET", 0))  # Requests per UTC day over all runs, 0 for no cap
+CRAWL_MAX_JOB_ATTEMPTS = 3
+RESTART_CRAWL = os.environ.get("RESTART_CRAWL") == 'true'  # Plan the tiles again even when a finished crawl is checkpointed
+BUDGET_EXHAUSTED = "request budget exhausted"
+CRAWL_PLACE_TYPES = sorted({place_type for place_types in [
+    AUTOMOTIVE_TYPE, BUSINESS_TYPE, CULTURE_TYPE, EDUCATION_TYPE, ENTERTAINMENT_AND_RECREATION_TYPE, FACILITIES_TYPE,
+    FINANCE_TYPE, FOOD_AND_DRINK_TYPE, GEOGRAPHICAL_AREAS_TYPE, GOVERNMENT_TYPE, HEALTH_AND_WELLNESS_TYPE, HOUSING_TYPE,
+    LODGING_TYPE, NATURAL_FEATURES_TYPE, PLACES_OF_WORSHIP_TYPE, SERVICES_TYPE, SHOPPING_TYPE, SPORTS_TYPE,
+    TRANSPORTATION_TYPE
+] for place_type in place_types})
+
+# A next_page_token requested too early answers INVALID_REQUEST, it is retried like a throttle
+def is_retryable_nearby_status(data):
+    return data.get("status") in ("OVER_QUERY_LIMIT", "INVALID_REQUEST")
+
+def is_over_query_limit(data):
+    return data.get("status") == "OVER_QUERY_LIMIT"
+
+# H3 tiles covering the boundary at the resolution, interior and border cells alike
+def plan_tiles(boundary, resolution=CRAWL_H3_RESOLUTION):
+    interior, border = polyfill_boundary(boundary, resolution)
+    return sorted(set(h3.uncompact_cells(interior, resolution)) | set(border))
+
+# Centre of the tile and the radius in meters of the circle through its vertices
+def tile_search_circle(tile):
+    lat, lng = h3.cell_to_latlng(tile)
+    radius = max(h3.great_circle_distance((lat, lng), vertex, unit='m') for vertex in h3.cell_to_boundary(tile))
+    return lat, lng, radius
+
+# Request allowance shared by the crawl's worker threads, None for no cap
+class RequestBudget:
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.spent = 0
+        self.lock = threading.Lock()
+
+    def spend(self):
+        with self.lock:
+            if self.limit is not None and self.spent >= self.limit:
+                return False
+            self.spent += 1
+            return True
+
+    def exhausted(self):
+        with self.lock:
+            return self.limit is not None and self.spent >= self.limit
+
+def ensure_crawl_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS nearby_search_jobs (
+            tile TEXT,
+            place_type TEXT,
+            wave INTEGER,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            results INTEGER,
+            last_error TEXT,
+            updated_at TIMESTAMP DEFAULT current_timestamp,
+            PRIMARY KEY (tile, place_type)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS nearby_search_requests (
+            day DATE PRIMARY KEY,
+            requests BIGINT
+        )
+    ''')
+
+# Requests this run may still send: the smaller of CRAWL_MAX_REQUESTS and what is left of today's budget
+def load_request_budget(conn, max_requests=CRAWL_MAX_REQUESTS, daily_budget=CRAWL_DAILY_REQUEST_BUDGET):
+    limits = [max_requests] if max_requests else []
+    if daily_budget:
+        spent_today = conn.execute("SELECT COALESCE(sum(requests), 0) FROM nearby_search_requests WHERE day = CAST(timezone('UTC', now()) AS DATE)").fetchone()[0]
+        limits.append(max(daily_budget - spent_today, 0))
+    return RequestBudget(min(limits) if limits else None)
+
+# Buffered google_poi writer, a batch holds each place_id once
+class PoiBatchWriter:
+    def __init__(self, conn, batch_size=POI_INSERT_BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.places = {}
+        self.written = 0
+        ensure_google_poi_table(conn)
+
+    def add(self, places):
+        for place in places:
+            if place.get("place_id"):
+                self.places[place["place_id"]] = place
+        if len(self.places) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        written = upsert_places(self.conn, self.places.values())
+        self.written += written
+        self.places = {}
+        return written
+
+class NearbySearchCrawler:
+    def __init__(self, writer, place_types=CRAWL_PLACE_TYPES, max_resolution=CRAWL_MAX_H3_RESOLUTION, url=PLACES_URL, engine=None, budget=None,
+                 max_attempts=CRAWL_MAX_JOB_ATTEMPTS):
+        self.writer = writer
+        self.conn = writer.conn
+        self.place_types = place_types
+        self.max_resolution = max_resolution
+        self.url = url
+        self.engine = engine or RequestEngine(concurrency=CRAWL_CONCURRENCY, qps=CRAWL_QPS)
+        self.budget = budget or RequestBudget()
+        self.max_attempts = max_attempts
+        self.stats = {"jobs": 0, "subdivided": 0, "failed": 0, "results": 0}
+        ensure_crawl_tables(self.conn)
+
+    # All pages of one nearby search as (results, error). A failed page or a spent budget stops the pagination, the
+    # pages fetched before it are still returned together with the error.
+    def search(self, lat, lng, radius, place_type):
+        params = {"location": f"{lat},{lng}", "radius": radius, "type": place_type, "key": API_KEY}
+        results = []
+        page = 1
+        while True:
+            if not self.budget.spend():
+                return results, BUDGET_EXHAUSTED
+            data = self.engine.get_json(self.url, params=params, retry_on=is_retryable_nearby_status if "pagetoken" in params else is_over_query_limit)
+            if data is None:
+                return results, f"page {page} failed after retries"
+            if data.get("status") not in ("OK", "ZERO_RESULTS"):
+                return results, f"page {page} answered {data.get('status')}"
+            results.extend(data.get("results", []))
+            next_page_token = data.get("next_page_token")
+            if not next_page_token:
+                return results, None
+            time.sleep(NEXT_PAGE_TOKEN_DELAY)
+            params = {"pagetoken": next_page_token, "key": API_KEY}
+            page += 1
+
+    # Run one (tile, type) job and return (places, child jobs, error), a capped tile is split into its children
+    def run_job(self, job):
+        tile, place_type = job
+        lat, lng, radius = tile_search_circle(tile)
+        places, error = self.search(lat, lng, min(radius, 50000), place_type)
+        if error is None and len(places) >= NEARBY_SEARCH_RESULT_CAP and h3.get_resolution(tile) < self.max_resolution:
+            return places, [(child, place_type) for child in h3.cell_to_children(tile)], None
+        return places, [], error
+
+    # Queue every (tile, type) job unless an unfinished crawl is checkpointed, a finished one is only planned again
+    # with RESTART_CRAWL
+    def plan(self, tiles, restart=RESTART_CRAWL):
+        checkpointed = dict(self.conn.execute("SELECT status, count(*) FROM nearby_search_jobs GROUP BY status").fetchall())
+        if checkpointed and not restart:
+            print(f"Resuming the checkpointed crawl: {checkpointed}")
+            return
+        self.conn.execute("DELETE FROM nearby_search_jobs")
+        self.conn.executemany("INSERT INTO nearby_search_jobs (tile, place_type, wave) VALUES (?, ?, 0)",
+                              [(tile, place_type) for tile in tiles for place_type in self.place_types])
+
+    # Next jobs to run, wave by wave, failed jobs with attempts left once nothing else is pending
+    def claim(self, batch_size):
+        return self.conn.execute('''
+            SELECT tile, place_type, wave FROM nearby_search_jobs
+            WHERE status = 'pending' OR (status = 'failed' AND attempts < ?)
+            ORDER BY status = 'failed', wave, tile, place_type
+            LIMIT ?
+        ''', (self.max_attempts, batch_size)).fetchall()
+
+    # Write a batch's places, job outcomes, child jobs and spent requests in one transaction. Jobs cut short by the budget
+    # stay pending without using an attempt, their partial places are kept either way.
+    def checkpoint(self, jobs, outcomes, requests):
+        self.conn.execute('BEGIN TRANSACTION')
+        try:
+            for (tile, place_type, wave), (places, children, error) in zip(jobs, outcomes):
+                self.writer.add(places)
+                if error == BUDGET_EXHAUSTED:
+                    continue
+                self.conn.execute('''
+                    UPDATE nearby_search_jobs
+                    SET status = ?, attempts = attempts + 1, results = ?, last_error = ?, updated_at = current_timestamp
+                    WHERE tile = ? AND place_type = ?
+                ''', ('failed' if error else 'done', len(places), error, tile, place_type))
+                if children:
+                    self.conn.executemany('''
+                        INSERT INTO nearby_search_jobs (tile, place_type, wave) VALUES (?, ?, ?)
+                        ON CONFLICT (tile, place_type) DO NOTHING
+                    ''', [(child, child_type, wave + 1) for child, child_type in children])
+            self.writer.flush()
+            self.conn.execute('''
+                INSERT INTO nearby_search_requests VALUES (CAST(timezone('UTC', now()) AS DATE), ?)
+                ON CONFLICT (day) DO UPDATE SET requests = nearby_search_requests.requests + EXCLUDED.requests
+            ''', (requests,))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    # Crawl the tiles wave by wave, each wave being the children of the capped jobs of the previous one, until no job is
+    # left or the request budget is spent
+    def crawl(self, tiles):
+        self.plan(tiles)
+        while not self.budget.exhausted():
+            jobs = self.claim(POI_INSERT_BATCH_SIZE)
+            if not jobs:
+                break
+            spent = self.budget.spent
+            outcomes = self.engine.map(self.run_job, [(tile, place_type) for tile, place_type, _ in jobs])
+            for places, children, error in outcomes:
+                self.stats["results"] += len(places)
+                if error == BUDGET_EXHAUSTED:
+                    continue
+                self.stats["jobs"] += 1
+                self.stats["failed"] += 1 if error else 0
+                self.stats["subdivided"] += 1 if children else 0
+            self.checkpoint(jobs, outcomes, self.budget.spent - spent)
+            print(f"Crawl: {self.stats}, {self.writer.written} places upserted into google_poi")
+        left = dict(self.conn.execute("SELECT status, count(*) FROM nearby_search_jobs GROUP BY status").fetchall())
+        if self.budget.exhausted():
+            print(f"Request budget of {self.budget.limit} spent, the next run resumes from the checkpointed jobs: {left}")
+        else:
+            print(f"Crawl finished: {left}")
+        return self.stats
+
+if __name__ == "__main__":
+    if not API_KEY:
+        raise ValueError("Error: API key not found. Please set the GM_SAVI environment variable.")
+    tiles = plan_tiles(load_nyc_boundary())
+    print(f"Planned {len(tiles)} tiles at resolution {CRAWL_H3_RESOLUTION} for {len(CRAWL_PLACE_TYPES)} place types")
+    conn = duckdb.connect(DATABASE_PATH)
+    ensure_crawl_tables(conn)
+    crawler = NearbySearchCrawler(PoiBatchWriter(conn), budget=load_request_budget(conn))
+    crawler.crawl(tiles)
+    print(f"Google requests: {crawler.engine.stats}")
+    crawler.engine.close()
+    conn.close()
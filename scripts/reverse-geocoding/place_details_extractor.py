@@ -0,0 +1,99 @@
+import json
+import time
+import pyarrow as pa
+
+# Set-based extraction of the Google Places (v1) responses stored in locations.place_details and
+# locations.alt_place_details. Both columns are unnested into one row per (contentid, source) and every field is read
+# with DuckDB's JSON functions in a single CREATE TABLE ... AS, so the whole NYC set is parsed without a Python loop.
+# Blobs DuckDB can't read as a JSON object (double encoded strings from older runs) are decoded in Python and pushed
+# through the same expressions.
+LOCATION_PLACE_DETAILS_TABLE = 'location_place_details'
+PLACE_DETAILS_SOURCES = ("place_details", "alt_place_details")
+
+# column -> (type, JSON path)
+PLACE_DETAIL_FIELDS = {
+    "place_id": ("VARCHAR", "$.id"),
+    "place_name": ("VARCHAR", "$.displayName.text"),
+    "formatted_address": ("VARCHAR", "$.formattedAddress"),
+    "short_formatted_address": ("VARCHAR", "$.shortFormattedAddress"),
+    "latitude": ("DOUBLE", "$.location.latitude"),
+    "longitude": ("DOUBLE", "$.location.longitude"),
+    "types": ("VARCHAR[]", "$.types[*]"),
+    "primary_type": ("VARCHAR", "$.primaryType"),
+    "primary_type_display_name": ("VARCHAR", "$.primaryTypeDisplayName.text"),
+    "rating": ("DOUBLE", "$.rating"),
+    "user_rating_count": ("INTEGER", "$.userRatingCount"),
+    "business_status": ("VARCHAR", "$.businessStatus"),
+    "phone_number": ("VARCHAR", "$.nationalPhoneNumber"),
+    "website_uri": ("VARCHAR", "$.websiteUri"),
+    "google_maps_uri": ("VARCHAR", "$.googleMapsUri"),
+    "utc_offset_minutes": ("INTEGER", "$.utcOffsetMinutes"),
+    "adr_format_address": ("VARCHAR", "$.adrFormatAddress"),
+    "good_for_children": ("BOOLEAN", "$.goodForChildren"),
+    "pure_service_area_business": ("BOOLEAN", "$.pureServiceAreaBusiness"),
+    "landmark_names": ("VARCHAR[]", "$.addressDescriptor.landmarks[*].displayName.text"),
+    "area_names": ("VARCHAR[]", "$.addressDescriptor.areas[*].displayName.text"),
+    "viewport": ("JSON", "$.viewport"),
+    "google_maps_links": ("JSON", "$.googleMapsLinks"),
+    "address_components": ("JSON", "$.addressComponents"),
+    "current_opening_hours": ("JSON", "$.currentOpeningHours"),
+    "reviews": ("JSON", "$.reviews"),
+    "photos": ("JSON", "$.photos"),
+    "accessibility_options": ("JSON", "$.accessibilityOptions"),
+    "generative_summary": ("JSON", "$.generativeSummary")
+}
+
+def field_expression(column_type, path, details='details'):
+    if column_type == "JSON":
+        return f"json_extract({details}, '{path}')"
+    if column_type == "VARCHAR[]":
+        return f"json_extract_string({details}, '{path}')"
+    return f"TRY_CAST(json_extract_string({details}, '{path}') AS {column_type})"
+
+def select_place_details(relation):
+    fields = ",\n".join(f"{field_expression(column_type, path)} AS {column}" for column, (column_type, path) in PLACE_DETAIL_FIELDS.items())
+    return f"SELECT contentid, source, {fields} FROM {relation} WHERE json_type(details) = 'OBJECT'"
+
+# Decode a blob the SQL path couldn't read, unwrapping JSON that was stored as a JSON string. Returns None if it
+# still isn't an object.
+def decode_place_details(blob):
+    data = blob
+    try:
+        while isinstance(data, str):
+            data = json.loads(data)
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+# (Re)build location_place_details from both JSON columns and return (rows from SQL, rows from the Python fallback)
+def build_location_place_details(conn, fallback_parser=decode_place_details, table_name=LOCATION_PLACE_DETAILS_TABLE):
+    started = time.perf_counter()
+    for source in PLACE_DETAILS_SOURCES:
+        conn.execute(f"ALTER TABLE locations ADD COLUMN IF NOT EXISTS {source} JSON")
+    sources = ", ".join(f"{{'source': '{source}', 'details': TRY_CAST({source} AS JSON)}}" for source in PLACE_DETAILS_SOURCES)
+    conn.execute(f'''
+        CREATE OR REPLACE TEMP VIEW place_details_blobs AS
+        SELECT CAST(contentid AS VARCHAR) AS contentid, blob.source, blob.details
+        FROM (SELECT contentid, UNNEST([{sources}]) AS blob FROM locations)
+        WHERE blob.details IS NOT NULL
+    ''')
+    conn.execute(f"CREATE OR REPLACE TABLE {table_name} AS {select_place_details('place_details_blobs')}")
+    extracted = conn.execute(f"SELECT count(*) FROM {table_name}").fetchone()[0]
+
+    # Python fallback for everything that isn't a JSON object to DuckDB
+    leftovers = conn.execute("SELECT contentid, source, CAST(details AS VARCHAR) FROM place_details_blobs WHERE json_type(details) <> 'OBJECT'").fetchall()
+    repaired = [(contentid, source, fallback_parser(details)) for contentid, source, details in leftovers]
+    repaired = [(contentid, source, data) for contentid, source, data in repaired if data is not None]
+    if repaired:
+        conn.register('place_details_repaired_arrow', pa.table({
+            "contentid": pa.array([row[0] for row in repaired], type=pa.string()),
+            "source": pa.array([row[1] for row in repaired], type=pa.string()),
+            "details": pa.array([json.dumps(row[2]) for row in repaired], type=pa.string())
+        }))
+        conn.execute("CREATE OR REPLACE TEMP VIEW place_details_repaired AS SELECT contentid, source, CAST(details AS JSON) AS details FROM place_details_repaired_arrow")
+        conn.execute(f"INSERT INTO {table_name} {select_place_details('place_details_repaired')}")
+        conn.execute("DROP VIEW place_details_repaired")
+        conn.unregister('place_details_repaired_arrow')
+    conn.execute("DROP VIEW place_details_blobs")
+    print(f"Extracted {extracted} place details with SQL and {len(repaired)} with the Python fallback ({len(leftovers) - len(repaired)} unreadable) into {table_name} in {time.perf_counter() - started:.1f}s")
+    return extracted, len(repaired)
@@ -0,0 +1,120 @@
+import duckdb
+import hashlib
+import json
+import os
+import re
+import threading
+
+# Disk-backed cache of Google and Nominatim responses in data/api_cache.db next to this script (ignored by git), kept
+# out of locations.db so re-seeding never throws it away. Keys are the endpoint plus normalized parameters and request
+# headers: the API key is dropped, coordinates are rounded to CACHE_COORD_PRECISION decimals and headers that shape the
+# response (X-Goog-FieldMask, Accept-Language) are kept, so re-runs over the same places are answered without spending quota.
+API_CACHE_PATH = os.getenv("API_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'api_cache.db'))
+API_CACHE_TTL_DAYS = float(os.getenv("API_CACHE_TTL_DAYS", 30))  # Entries older than this are fetched again
+API_CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", 1000000))  # Oldest entries beyond this are evicted
+CACHE_COORD_PRECISION = int(os.getenv("CACHE_COORD_PRECISION", 5))  # 5 decimals is about 1 meter
+IGNORED_PARAMS = {"key"}
+# Credentials and transport headers never change the response body
+IGNORED_HEADERS = {"x-goog-api-key", "authorization", "user-agent", "accept-encoding", "connection"}
+COORDINATE_PARAMS = {"lat", "lon", "lng", "latitude", "longitude"}
+COORDINATE_PAIR = re.compile(r'^(?P<prefix>[a-z]+:)?(?P<lat>-?\d+(\.\d+)?),(?P<lng>-?\d+(\.\d+)?)$')
+
+def round_coordinate(value, precision=CACHE_COORD_PRECISION):
+    return f"{round(float(value), precision):.{precision}f}"
+
+# Parameters without the API key, with coordinates ("lat", "lng", "latlng=a,b", "locationbias=point:a,b") rounded
+def normalize_params(params, precision=CACHE_COORD_PRECISION):
+    normalized = {}
+    for name, value in (params or {}).items():
+        if name in IGNORED_PARAMS:
+            continue
+        if name in COORDINATE_PARAMS:
+            value = round_coordinate(value, precision)
+        elif isinstance(value, str) and (match := COORDINATE_PAIR.match(value)):
+            value = f"{match.group('prefix') or ''}{round_coordinate(match.group('lat'), precision)},{round_coordinate(match.group('lng'), precision)}"
+        normalized[name] = str(value)
+    return normalized
+
+# Header names lowercased, without credentials and transport headers
+def normalize_headers(headers):
+    return {name.lower(): str(value) for name, value in (headers or {}).items() if name.lower() not in IGNORED_HEADERS}
+
+def cache_key(endpoint, params, precision=CACHE_COORD_PRECISION, headers=None):
+    normalized = json.dumps(normalize_params(params, precision), sort_keys=True)
+    # Requests without headers keep the keys they had before headers were part of the key
+    normalized_headers = normalize_headers(headers)
+    if normalized_headers:
+        normalized += "\n" + json.dumps(normalized_headers, sort_keys=True)
+    return hashlib.sha256(f"{endpoint}\n{normalized}".encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    def __init__(self, path=API_CACHE_PATH, ttl_days=API_CACHE_TTL_DAYS, max_entries=API_CACHE_MAX_ENTRIES, precision=CACHE_COORD_PRECISION):
+        self.ttl_seconds = int(ttl_days * 86400)
+        self.max_entries = max_entries
+        self.precision = precision
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = duckdb.connect(path)
+        # One DuckDB connection is shared by the engine's worker threads
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stored": 0}
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS api_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                endpoint TEXT,
+                params JSON,
+                response JSON,
+                fetched_at TIMESTAMP DEFAULT current_timestamp
+            )
+        ''')
+        self.conn.execute('ALTER TABLE api_response_cache ADD COLUMN IF NOT EXISTS headers JSON')
+        self.evict()
+
+    def get(self, endpoint, params, headers=None):
+        key = cache_key(endpoint, params, self.precision, headers)
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT response FROM api_response_cache
+                WHERE cache_key = ? AND fetched_at >= current_timestamp - to_seconds(?)
+            ''', (key, self.ttl_seconds)).fetchone()
+            self.stats["hits" if row else "misses"] += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, endpoint, params, response, headers=None):
+        with self.lock:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO api_response_cache (cache_key, endpoint, params, headers, response, fetched_at)
+                VALUES (?, ?, ?, ?, ?, current_timestamp)
+            ''', (cache_key(endpoint, params, self.precision, headers), endpoint, json.dumps(normalize_params(params, self.precision)),
+                  json.dumps(normalize_headers(headers)), json.dumps(response)))
+            self.stats["stored"] += 1
+
+    # Return the cached response or fetch it with engine.get_json and store it. Failed requests (None) are never
+    # cached, and cacheable(data) can refuse transient answers such as an OVER_QUERY_LIMIT status.
+    def fetch(self, engine, endpoint, params=None, headers=None, retry_on=None, cacheable=None):
+        data = self.get(endpoint, params, headers)
+        if data is not None:
+            return data
+        data = engine.get_json(endpoint, params=params, headers=headers, retry_on=retry_on)
+        if data is not None and (cacheable is None or cacheable(data)):
+            self.put(endpoint, params, data, headers)
+        return data
+
+    # Drop expired entries, then the oldest entries beyond max_entries
+    def evict(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM api_response_cache WHERE fetched_at < current_timestamp - to_seconds(?)", (self.ttl_seconds,))
+            self.conn.execute('''
+                DELETE FROM api_response_cache WHERE cache_key IN (
+                    SELECT cache_key FROM api_response_cache ORDER BY fetched_at DESC OFFSET ?
+                )
+            ''', (self.max_entries,))
+
+    def report(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+        return f"API cache: {self.stats['hits']} hits, {self.stats['misses']} misses ({hit_rate:.1%} hit rate), {self.stats['stored']} stored"
+
+    def close(self):
+        self.evict()
+        with self.lock:
+            self.conn.close()
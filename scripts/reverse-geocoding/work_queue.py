@@ -0,0 +1,119 @@
+import pyarrow as pa
+
+# Durable work queue for the geocoding stages, kept in the geocoding_jobs table next to locations.
+# Every (contentid, stage) pair is enqueued once. Workers claim pending rows in batches, and a batch's results and its
+# completion are committed in one transaction, so a restart resumes at the first unfinished row and never pays for a
+# finished one again. Rows claimed by a run that crashed are handed out again when the next run opens the queue.
+# Jobs can carry a cluster_key (the H3 cell of the location when geocoding is coalesced by cell), pending jobs are
+# claimed in cluster_key order so the locations of one cell land in the same batch.
+GEOCODING_STAGES = ("geocode", "place_id", "place_details", "osm")
+MAX_JOB_ATTEMPTS = 3
+
+def ensure_geocoding_jobs_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS geocoding_jobs (
+            contentid TEXT,
+            stage TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT current_timestamp,
+            updated_at TIMESTAMP DEFAULT current_timestamp,
+            claimed_at TIMESTAMP,
+            cluster_key TEXT,
+            PRIMARY KEY (contentid, stage)
+        )
+    ''')
+    # Tables created before jobs were clustered
+    conn.execute('ALTER TABLE geocoding_jobs ADD COLUMN IF NOT EXISTS cluster_key TEXT')
+
+class WorkQueue:
+    def __init__(self, conn, stage, max_attempts=MAX_JOB_ATTEMPTS):
+        if stage not in GEOCODING_STAGES:
+            raise ValueError(f"Unknown geocoding stage {stage}, expected one of {GEOCODING_STAGES}")
+        self.conn = conn
+        self.stage = stage
+        self.max_attempts = max_attempts
+        ensure_geocoding_jobs_table(conn)
+        released = conn.execute('''
+            UPDATE geocoding_jobs SET status = 'pending', updated_at = current_timestamp
+            WHERE stage = ? AND status = 'in_progress'
+        ''', (stage,)).fetchone()[0]
+        if released:
+            print(f"Released {released} {stage} jobs left in progress by an earlier run")
+
+    # Add contentids to the queue, ones already queued for this stage (in any status) are left alone apart from their
+    # cluster_key, which is refreshed from cluster_keys (one per contentid) for the jobs still to run
+    def enqueue(self, contentids, cluster_keys=None):
+        contentids = [str(contentid) for contentid in contentids]
+        self.conn.register('geocoding_jobs_enqueue', pa.table({
+            "contentid": pa.array(contentids, type=pa.string()),
+            "cluster_key": pa.array(cluster_keys if cluster_keys is not None else [None] * len(contentids), type=pa.string())
+        }))
+        inserted = self.conn.execute('''
+            INSERT INTO geocoding_jobs (contentid, stage, cluster_key)
+            SELECT contentid, ?, any_value(cluster_key) FROM geocoding_jobs_enqueue GROUP BY contentid
+            ON CONFLICT (contentid, stage) DO NOTHING
+        ''', (self.stage,)).fetchone()[0]
+        if cluster_keys is not None:
+            self.conn.execute('''
+                UPDATE geocoding_jobs SET cluster_key = geocoding_jobs_enqueue.cluster_key
+                FROM geocoding_jobs_enqueue
+                WHERE geocoding_jobs.stage = ? AND geocoding_jobs.contentid = geocoding_jobs_enqueue.contentid
+                    AND geocoding_jobs.status <> 'done' AND geocoding_jobs.cluster_key IS DISTINCT FROM geocoding_jobs_enqueue.cluster_key
+            ''', (self.stage,))
+        self.conn.unregister('geocoding_jobs_enqueue')
+        return inserted
+
+    # Mark up to batch_size pending jobs in progress and return their contentids, failed jobs with attempts left are
+    # retried once nothing pending remains. Jobs of one cluster_key are claimed together, jobs without one come last.
+    def claim(self, batch_size):
+        rows = self.conn.execute('''
+            UPDATE geocoding_jobs
+            SET status = 'in_progress', attempts = attempts + 1, claimed_at = current_timestamp, updated_at = current_timestamp
+            WHERE stage = ? AND contentid IN (
+                SELECT contentid FROM geocoding_jobs
+                WHERE stage = ? AND (status = 'pending' OR (status = 'failed' AND attempts < ?))
+                ORDER BY status = 'failed', cluster_key NULLS LAST, created_at, contentid
+                LIMIT ?
+            )
+            RETURNING contentid
+        ''', (self.stage, self.stage, self.max_attempts, batch_size)).fetchall()
+        return [row[0] for row in rows]
+
+    # Flush the sink's buffered results and record which claimed jobs finished or failed, all in one transaction
+    def complete(self, done, failed=None, sink=None):
+        failed = failed or {}
+        self.conn.execute('BEGIN TRANSACTION')
+        try:
+            if sink is not None:
+                sink.flush()
+            if done:
+                self.conn.execute('''
+                    UPDATE geocoding_jobs SET status = 'done', last_error = NULL, updated_at = current_timestamp
+                    WHERE stage = ? AND contentid IN (SELECT UNNEST(?))
+                ''', (self.stage, [str(contentid) for contentid in done]))
+            for contentid, error in failed.items():
+                self.conn.execute('''
+                    UPDATE geocoding_jobs SET status = 'failed', last_error = ?, updated_at = current_timestamp
+                    WHERE stage = ? AND contentid = ?
+                ''', (str(error), self.stage, str(contentid)))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    # Number of jobs per status for this stage
+    def progress(self):
+        return dict(self.conn.execute('SELECT status, count(*) FROM geocoding_jobs WHERE stage = ? GROUP BY status ORDER BY status', (self.stage,)).fetchall())
+
+    # Claim batches until nothing is left. process_batch(contentids) adds results to the sink and returns
+    # (done contentids, {contentid: error}) for the claimed batch.
+    def drain(self, process_batch, batch_size, sink=None):
+        while True:
+            contentids = self.claim(batch_size)
+            if not contentids:
+                break
+            done, failed = process_batch(contentids)
+            self.complete(done, failed, sink)
+            print(f"{self.stage} jobs: {self.progress()}")
@@ -0,0 +1,135 @@
+package seed
+
+import (
+	"database/sql"
+	"fmt"
+	"os"
+	"strings"
+)
+
+// 1. Create the locations and location_comparison tables only if they are missing, so existing rows and their derived columns are kept
+func CreateTablesIfNotExistInDuckDB(dbFilePath string) error {
+	// Open the DuckDB database
+	db, err := sql.Open("duckdb", dbFilePath)
+	if err != nil {
+		return fmt.Errorf("failed to open DuckDB: %w", err)
+	}
+	defer db.Close()
+	for _, queryFilePath := range []string{
+		"sql/6_create_locations_if_not_exists.sql",
+		"sql/7_create_location_comparison_if_not_exists.sql",
+	} {
+		queryBytes, err := os.ReadFile(queryFilePath)
+		if err != nil {
+			return fmt.Errorf("failed to read query file: %w", err)
+		}
+		_, err = db.Exec(string(queryBytes))
+		if err != nil {
+			return fmt.Errorf("failed to run %s: %w", queryFilePath, err)
+		}
+	}
+	fmt.Println("locations and location_comparison tables already exist or were created")
+	return nil
+}
+
+// 2. Upsert only the rows of the t_content raw data JSON files whose source row hash is new or differs from the stored source_hash.
+// The files overlap, so they are merged into one staged set first with the same precedence as the full seed: a later file
+// (and a later line within a file) wins, then that set is diffed against locations once.
+// Changed rows are deleted and inserted again so their derived columns (h3 indexes, embedding, geocoding) are reset,
+// and every location_comparison pair that touches them is removed so it gets compared again
+func UpsertChangedLocationsFromJSON(dbFilePath string, jsonFilePaths []string) error {
+	// Open the DuckDB database
+	db, err := sql.Open("duckdb", dbFilePath)
+	if err != nil {
+		return fmt.Errorf("failed to open DuckDB: %w", err)
+	}
+	defer db.Close()
+	// Read every file into its own location_source_<order> table, each row hashed the way sql/1_insert.sql hashes it
+	queryBytes, err := os.ReadFile("sql/12_stage_location_source.sql")
+	if err != nil {
+		return fmt.Errorf("failed to read query file: %w", err)
+	}
+	sources := make([]string, len(jsonFilePaths))
+	for i, jsonFilePath := range jsonFilePaths {
+		_, err = db.Exec(fmt.Sprintf(string(queryBytes), i, jsonFilePath))
+		if err != nil {
+			return fmt.Errorf("failed to read %s: %w", jsonFilePath, err)
+		}
+		sources[i] = fmt.Sprintf("SELECT * FROM location_source_%d", i)
+	}
+	// Stage the new and changed rows in locations_delta, the files can have different columns so they are unioned by name
+	queryBytes, err = os.ReadFile("sql/8_stage_changed_locations.sql")
+	if err != nil {
+		return fmt.Errorf("failed to read query file: %w", err)
+	}
+	_, err = db.Exec(fmt.Sprintf(string(queryBytes), strings.Join(sources, " UNION ALL BY NAME ")))
+	if err != nil {
+		return fmt.Errorf("failed to stage changed locations: %w", err)
+	}
+	for i := range jsonFilePaths {
+		_, err = db.Exec(fmt.Sprintf("DROP TABLE location_source_%d", i))
+		if err != nil {
+			return fmt.Errorf("failed to drop location_source_%d table: %w", i, err)
+		}
+	}
+	var n int
+	err = db.QueryRow("SELECT count(*) FROM locations_delta").Scan(&n)
+	if err != nil {
+		return fmt.Errorf("failed to count changed locations: %w", err)
+	}
+	fmt.Printf("Number of new or changed locations in %s: %d\n", strings.Join(jsonFilePaths, ", "), n)
+	// The delete has to be committed before the rows are inserted again, DuckDB rejects re-inserting a primary key deleted in the same transaction
+	for _, queryFilePath := range []string{
+		"sql/9_invalidate_changed_locations.sql",
+		"sql/10_insert_changed_locations.sql",
+	} {
+		queryBytes, err = os.ReadFile(queryFilePath)
+		if err != nil {
+			return fmt.Errorf("failed to read query file: %w", err)
+		}
+		_, err = db.Exec(string(queryBytes))
+		if err != nil {
+			return fmt.Errorf("failed to run %s: %w", queryFilePath, err)
+		}
+	}
+	fmt.Println("Changed locations successfully upserted into locations table")
+	return nil
+}
+
+// 3. Insert the location_comparison pairs for the locations changed since the last comparison, only their h3_index_8 cells are joined
+func CompareChangedLocations(dbFilePath string) error {
+	// Open the DuckDB database
+	db, err := sql.Open("duckdb", dbFilePath)
+	if err != nil {
+		return fmt.Errorf("failed to open DuckDB: %w", err)
+	}
+	defer db.Close()
+	var exists bool
+	err = db.QueryRow("SELECT count(*) > 0 FROM information_schema.tables WHERE table_name = 'changed_locations'").Scan(&exists)
+	if err != nil {
+		return fmt.Errorf("failed to check for changed_locations table: %w", err)
+	}
+	if !exists {
+		fmt.Println("No changed locations to compare")
+		return nil
+	}
+	queryBytes, err := os.ReadFile("sql/11_insert_changed_into_location_comparison.sql")
+	if err != nil {
+		return fmt.Errorf("failed to read query file: %w", err)
+	}
+	rows, err := db.Exec(string(queryBytes))
+	if err != nil {
+		return fmt.Errorf("failed to insert changed locations into location_comparison: %w", err)
+	}
+	n, err := rows.RowsAffected()
+	if err != nil {
+		return fmt.Errorf("failed to get number of rows inserted: %w", err)
+	}
+	fmt.Printf("Number of rows inserted into location_comparison for changed locations: %d\n", n)
+	// The changes are compared now, the next run starts from an empty change set
+	_, err = db.Exec("DROP TABLE changed_locations")
+	if err != nil {
+		return fmt.Errorf("failed to drop changed_locations table: %w", err)
+	}
+	return nil
+}
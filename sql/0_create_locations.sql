@@ -30,5 +30,6 @@ CREATE TABLE IF NOT EXISTS locations (
     word_count INT,
     tag TEXT default 'blue',
     is_title_duplicate BOOLEAN,
-    embeddings JSON default '[]',
+    embedding FLOAT[384],
+    source_hash TEXT,
 );
\ No newline at end of file
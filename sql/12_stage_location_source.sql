@@ -0,0 +1,10 @@
+CREATE OR REPLACE TABLE location_source_%[1]d AS
+SELECT src.*,
+    md5(CAST(src AS VARCHAR)) AS source_hash,
+    %[1]d AS source_file_order,
+    row_number() OVER () AS source_row_order
+FROM read_json(
+        '%[2]s',
+        ignore_errors = true
+    ) src
+WHERE src.contentid IS NOT NULL;
@@ -28,9 +28,9 @@ INSERT OR REPLACE INTO locations (
         h3_index_8,
         h3_index_12,
         is_title_duplicate,
-        embeddings,
         word_count,
-        tag
+        tag,
+        source_hash
     )
 SELECT contentid,
     source_id,
@@ -60,10 +60,10 @@ SELECT contentid,
     h3_latlng_to_cell(CAST(latitude AS FLOAT), CAST(longitude AS FLOAT), 8) as h3_index_8,
     h3_latlng_to_cell(CAST(latitude AS FLOAT), CAST(longitude AS FLOAT), 12) as h3_index_12,
     false AS is_title_duplicate,
-    '{}' as embeddings,
     0 as word_count,
-    'blue' as tag
+    'blue' as tag,
+    md5(CAST(src AS VARCHAR)) AS source_hash
 FROM read_json(
         '%s',
         ignore_errors = true
-    )
\ No newline at end of file
+    ) src
\ No newline at end of file
@@ -0,0 +1,14 @@
+CREATE TABLE IF NOT EXISTS location_comparison (
+    duplicateid TEXT PRIMARY KEY,
+    contentid1 UUID,
+    contentid2 UUID,
+    titles TEXT [],
+    h3_index_8_1 UBIGINT,
+    point1 FLOAT [],
+    point2 FLOAT [],
+    descriptions TEXT [],
+    similarity_score FLOAT,
+    similarity_score_2 FLOAT,
+    distance_in_meters FLOAT
+);
+ALTER TABLE location_comparison ADD COLUMN IF NOT EXISTS soft_deleted BOOLEAN default false;
\ No newline at end of file
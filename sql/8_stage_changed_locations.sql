@@ -0,0 +1,15 @@
+DROP TABLE IF EXISTS locations_delta;
+CREATE TABLE locations_delta AS
+SELECT s.* EXCLUDE (source_file_order, source_row_order)
+FROM (
+        SELECT *
+        FROM (%s) src
+        QUALIFY row_number() OVER (
+                PARTITION BY src.contentid
+                ORDER BY src.source_file_order DESC,
+                    src.source_row_order DESC
+            ) = 1
+    ) s
+LEFT JOIN locations l ON l.contentid = CAST(s.contentid AS UUID)
+WHERE l.contentid IS NULL
+    OR l.source_hash IS DISTINCT FROM s.source_hash;
@@ -0,0 +1,5 @@
+DELETE FROM location_comparison
+WHERE contentid1 IN (SELECT CAST(contentid AS UUID) FROM locations_delta)
+    OR contentid2 IN (SELECT CAST(contentid AS UUID) FROM locations_delta);
+DELETE FROM locations
+WHERE contentid IN (SELECT CAST(contentid AS UUID) FROM locations_delta);